@@ -14,13 +14,15 @@ function useApiBase() {
 function App() {
   const { apiBase, setApiBase, originBase } = useApiBase()
   const [docName, setDocName] = useState(null)
+  const [sessionId, setSessionId] = useState(null) // one LLM chat session per uploaded document
   const [pdfUrl, setPdfUrl] = useState(null)
   const [uploading, setUploading] = useState(false)
+  const [uploadStatus, setUploadStatus] = useState('') // ingestion job stage / page progress
   const [queryText, setQueryText] = useState('')
   const [sending, setSending] = useState(false)
   const [messages, setMessages] = useState([]) // {role:'user'|'assistant', text}
   const [annotatedUrl, setAnnotatedUrl] = useState(null)
-  const [scrollTarget, setScrollTarget] = useState(null) // { page: 0-based, bbox: [x0,y0,x1,y1] }
+  const [highlights, setHighlights] = useState([]) // [{ chunk_id, page: 0-based, bbox: [x0,y0,x1,y1], rects: [[x0,y0,x1,y1], ...] }]
   const fileRef = useRef()
 
   const haveDoc = !!docName
@@ -32,16 +34,34 @@ function App() {
     try {
       const fd = new FormData()
       fd.append('file', file, file.name)
-      // Let axios set the multipart boundary header automatically
-      const { data } = await axios.post(`${apiBase}/process-pdf`, fd)
+      // Let axios set the multipart boundary header automatically; ingestion runs as a background job
+      const { data: job } = await axios.post(`${apiBase}/jobs/ingest`, fd)
+      const data = await waitForJob(job.job_id)
       const name = data.document_name || data.filename || file.name
       setDocName(name)
-      setPdfUrl(`${originBase}/pdfs/original/${encodeURIComponent(name)}`)
+      setSessionId(crypto.randomUUID())
+      setHighlights([])
+      setAnnotatedUrl(null)
+      // Content-hash URL (immutable, cached by the browser); plain name as fallback
+      setPdfUrl(`${originBase}${data.pdf_url || `/pdfs/original/${encodeURIComponent(name)}`}`)
     } catch (e) {
       console.error(e)
       alert(e?.response?.data?.detail || e.message)
     } finally {
       setUploading(false)
+      setUploadStatus('')
+    }
+  }
+
+  // Poll an ingestion job until it finishes; resolves with its result
+  async function waitForJob(jobId) {
+    for (;;) {
+      const { data: job } = await axios.get(`${apiBase}/jobs/${jobId}`)
+      if (job.status === 'done') return (await axios.get(`${apiBase}/jobs/${jobId}/result`)).data
+      if (job.status === 'failed' || job.status === 'cancelled') throw new Error(job.error || `Ingestion ${job.status}`)
+      const pages = job.pages_total ? ` ${job.pages_done}/${job.pages_total} pages` : ''
+      setUploadStatus(`${job.stage || job.status}${pages}`)
+      await new Promise((resolve) => setTimeout(resolve, 1000))
     }
   }
 
@@ -50,59 +70,73 @@ function App() {
     const q = queryText.trim()
     if (!q) return
     setSending(true)
-    setMessages((m) => [...m, { role: 'user', text: q }])
+    setMessages((m) => [...m, { role: 'user', text: q }, { role: 'assistant', text: '' }])
+    // Replace the text of the trailing (streaming) assistant message
+    const setAnswer = (update) => setMessages((m) => {
+      const last = m[m.length - 1]
+      return [...m.slice(0, -1), { ...last, text: update(last.text) }]
+    })
     try {
-      const { data } = await axios.post(`${apiBase}/query`, null, { params: { query: q, doc_name: docName, k: 5 } })
-      const answer = data.result || '(no result)'
-      setMessages((m) => [...m, { role: 'assistant', text: answer }])
-      const ev = data.evidence || {}
-      const chunkIds = (ev.chunk_id || []).map((x) => parseInt(x, 10)).filter((n) => Number.isFinite(n))
-      if (chunkIds.length) {
-        await highlightChunks(docName, chunkIds.slice(0, 5))
-      }
+      const params = new URLSearchParams({ query: q, doc_name: docName, k: '5' })
+      if (sessionId) params.set('session_id', sessionId)
+      const resp = await fetch(`${apiBase}/query/stream?${params}`, { method: 'POST' })
+      if (!resp.ok || !resp.body) throw new Error(`HTTP ${resp.status}`)
+      await readSSE(resp.body, (event, data) => {
+        if (event === 'token') setAnswer((t) => t + data.delta)
+        else if (event === 'evidence') {
+          setAnswer(() => data.result || '(no result)')
+          // Geometry comes inline with the answer: draw it without another request
+          setHighlights(Array.isArray(data.highlights) ? data.highlights : [])
+          setAnnotatedUrl(null)
+        } else if (event === 'error') throw new Error(data.detail)
+      })
     } catch (e) {
       console.error(e)
-      setMessages((m) => [...m, { role: 'assistant', text: `Error: ${e?.response?.data?.detail || e.message}` }])
+      setAnswer(() => `Error: ${e?.response?.data?.detail || e.message}`)
     } finally {
       setSending(false)
     }
   }
 
-  async function highlightChunks(docName, chunkIds) {
+  // Minimal server-sent-events reader for fetch() bodies (EventSource only supports GET)
+  async function readSSE(body, onEvent) {
+    const reader = body.pipeThrough(new TextDecoderStream()).getReader()
+    let buffer = ''
+    for (;;) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += value
+      let sep
+      while ((sep = buffer.indexOf('\n\n')) >= 0) {
+        const raw = buffer.slice(0, sep)
+        buffer = buffer.slice(sep + 2)
+        let event = 'message'
+        let data = ''
+        for (const line of raw.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7)
+          else if (line.startsWith('data: ')) data += line.slice(6)
+        }
+        onEvent(event, data ? JSON.parse(data) : {})
+      }
+    }
+  }
+
+  // Annotated PDF copy is only rendered on demand (export)
+  async function exportAnnotated() {
+    const chunkIds = highlights.map((h) => h.chunk_id)
+    if (!docName || !chunkIds.length) return
     try {
-      const payload = { doc_name: docName, chunk_ids: chunkIds, color: [1, 0.85, 0.2], return_pdf: false }
+      // Export only the evidence pages (plus one neighbor each side), marking the lines that match the last answer
+      const answer = [...messages].reverse().find((m) => m.role === 'assistant')?.text
+      const payload = { doc_name: docName, chunk_ids: chunkIds, color: [1, 0.85, 0.2], mode: 'export', pages: 'evidence', neighbor_pages: 1, answer }
       const { data } = await axios.post(`${apiBase}/highlight`, payload)
       if (data.annotated_pdf_url) {
         const url = `${originBase}${data.annotated_pdf_url}`
         setAnnotatedUrl(url)
-        // Determine target page from highlight metadata (backend returns 0-based page)
-        let pageIdx = null
-        const highlights = Array.isArray(data.highlights) ? data.highlights : []
-        if (highlights.length) {
-          const pages = highlights
-            .map(h => (typeof h?.page === 'number' ? h.page : null))
-            .filter(p => Number.isFinite(p))
-          if (pages.length) {
-            pageIdx = Math.min(...pages)
-          }
-        }
-        // Choose a representative bbox (first valid) on that page
-        let bbox = null
-        if (pageIdx != null) {
-          const hOnPage = highlights.find(h => h.page === pageIdx && Array.isArray(h.bbox) && h.bbox.length >= 4)
-          if (hOnPage) bbox = hOnPage.bbox
-        }
-        const ver = Date.now()
-        const withQuery = `${url}?v=${ver}`
-        setPdfUrl(withQuery)
-        if (pageIdx != null && bbox) {
-          setScrollTarget({ page: pageIdx, bbox })
-        } else {
-          setScrollTarget(null)
-        }
+        window.open(url, '_blank', 'noreferrer')
       }
     } catch (e) {
-      console.warn('Highlight error', e)
+      console.warn('Highlight export error', e)
     }
   }
 
@@ -120,11 +154,12 @@ function App() {
           <div className="toolbar">
             <input ref={fileRef} type="file" accept="application/pdf" />
             <button onClick={uploadPDF} disabled={uploading}>{uploading ? 'Uploading…' : 'Upload & Process'}</button>
+            {uploadStatus && <span style={{ color: '#6b7280' }}>{uploadStatus}</span>}
             {haveDoc && <span className="meta" title={docName}>{docName}</span>}
           </div>
           <div className="viewer">
             {pdfUrl ? (
-              <PdfViewer fileUrl={pdfUrl} target={scrollTarget} />
+              <PdfViewer fileUrl={pdfUrl} highlights={highlights} />
             ) : (
               <div style={{ padding: 16, color: '#9ca3af' }}>Upload a PDF to view it here.</div>
             )}
@@ -132,10 +167,12 @@ function App() {
           <div className="links">
             {docName && <>
               <span>Original:</span>
-              <a href={`${originBase}/pdfs/original/${encodeURIComponent(docName)}`} target="_blank" rel="noreferrer">open</a>
+              <a href={pdfUrl} target="_blank" rel="noreferrer">open</a>
               <span>Annotated:</span>
               {annotatedUrl ? (
                 <a href={annotatedUrl} target="_blank" rel="noreferrer">open</a>
+              ) : highlights.length ? (
+                <a href="#" onClick={(e) => { e.preventDefault(); exportAnnotated() }}>export</a>
               ) : (
                 <span style={{ color: '#6b7280' }}>n/a</span>
               )}
@@ -5,7 +5,7 @@ import workerSrc from 'pdfjs-dist/legacy/build/pdf.worker.mjs?worker&url'
 
 GlobalWorkerOptions.workerSrc = workerSrc
 
-export default function PdfViewer({ fileUrl, target }) {
+export default function PdfViewer({ fileUrl, highlights = [] }) {
   const containerRef = useRef(null)
   const [doc, setDoc] = useState(null)
   const [numPages, setNumPages] = useState(0)
@@ -31,6 +31,43 @@ export default function PdfViewer({ fileUrl, target }) {
     return () => { cancelled = true }
   }, [fileUrl])
 
+  const SCALE = 1.5
+  const pageDivsRef = useRef([])
+  const highlightsRef = useRef(highlights)
+  highlightsRef.current = highlights
+
+  // Draw highlight rects (PDF points) on one page's overlay layer: one per line when available
+  const drawOverlays = (pageIdx, pageDiv) => {
+    pageDiv.querySelectorAll('.hl-overlay').forEach((el) => el.remove())
+    const onPage = highlightsRef.current.filter((h) => h.page === pageIdx && Array.isArray(h.bbox) && h.bbox.length >= 4)
+    const rects = onPage.flatMap((h) => (Array.isArray(h.rects) && h.rects.length ? h.rects : [h.bbox]))
+    for (const [x0, y0, x1, y1] of rects) {
+      const overlay = document.createElement('div')
+      overlay.className = 'hl-overlay'
+      overlay.style.position = 'absolute'
+      overlay.style.left = `${x0 * SCALE}px`
+      overlay.style.top = `${y0 * SCALE}px`
+      overlay.style.width = `${(x1 - x0) * SCALE}px`
+      overlay.style.height = `${(y1 - y0) * SCALE}px`
+      overlay.style.background = 'rgba(255, 217, 51, 0.25)'
+      overlay.style.border = '2px solid rgba(255, 217, 51, 0.9)'
+      pageDiv.appendChild(overlay)
+    }
+  }
+
+  // Scroll so the center of the first highlight (lowest page) is visible
+  const scrollToFirst = () => {
+    const container = containerRef.current
+    const first = highlightsRef.current.reduce((best, h) => (best == null || h.page < best.page ? h : best), null)
+    const pageDiv = first && pageDivsRef.current[first.page]
+    if (!container || !pageDiv || !Array.isArray(first.bbox)) return false
+    const [, y0, , y1] = first.bbox
+    const targetY = pageDiv.offsetTop + ((y0 + y1) / 2) * SCALE - container.clientHeight / 2
+    container.scrollTo({ top: Math.max(0, targetY), behavior: 'smooth' })
+    return true
+  }
+
+  // Render the pages once per document; highlights never trigger a re-render
   useEffect(() => {
     if (!doc || !numPages) return
     const container = containerRef.current
@@ -38,16 +75,15 @@ export default function PdfViewer({ fileUrl, target }) {
 
     // Clear previous canvases
     container.innerHTML = ''
-
-    const scale = 1.5
-    const pageDivs = []
+    pageDivsRef.current = []
     let cancelled = false
+    let scrolled = false
 
     const renderPage = async (pageNumber) => {
       try {
         const page = await doc.getPage(pageNumber)
         if (cancelled) return
-        const viewport = page.getViewport({ scale })
+        const viewport = page.getViewport({ scale: SCALE })
         const pageDiv = document.createElement('div')
         pageDiv.style.position = 'relative'
         pageDiv.style.margin = '8px auto'
@@ -61,31 +97,11 @@ export default function PdfViewer({ fileUrl, target }) {
         const ctx = canvas.getContext('2d')
         pageDiv.appendChild(canvas)
         container.appendChild(pageDiv)
-        pageDivs[pageNumber] = pageDiv
+        pageDivsRef.current[pageNumber - 1] = pageDiv
         const renderTask = page.render({ canvasContext: ctx, viewport })
         await renderTask.promise
-
-        // If target is for this page, draw overlay and scroll
-        if (target && target.page === (pageNumber - 1) && Array.isArray(target.bbox)) {
-          const [x0, y0, x1, y1] = target.bbox
-          const rx = x0 * scale
-          const ry = y0 * scale
-          const rw = (x1 - x0) * scale
-          const rh = (y1 - y0) * scale
-          const overlay = document.createElement('div')
-          overlay.style.position = 'absolute'
-          overlay.style.left = `${rx}px`
-          overlay.style.top = `${ry}px`
-          overlay.style.width = `${rw}px`
-          overlay.style.height = `${rh}px`
-          overlay.style.background = 'rgba(255, 217, 51, 0.25)'
-          overlay.style.border = '2px solid rgba(255, 217, 51, 0.9)'
-          pageDiv.appendChild(overlay)
-
-          // Scroll so the center of the rect is visible
-          const targetY = pageDiv.offsetTop + ry + rh / 2 - container.clientHeight / 2
-          container.scrollTo({ top: Math.max(0, targetY), behavior: 'smooth' })
-        }
+        drawOverlays(pageNumber - 1, pageDiv)
+        if (!scrolled) scrolled = scrollToFirst()
       } catch (e) { /* ignore per-page errors */ }
     }
 
@@ -98,7 +114,13 @@ export default function PdfViewer({ fileUrl, target }) {
     })()
 
     return () => { cancelled = true }
-  }, [doc, numPages, target])
+  }, [doc, numPages])
+
+  // New answer: swap the overlay layer only
+  useEffect(() => {
+    pageDivsRef.current.forEach((pageDiv, idx) => pageDiv && drawOverlays(idx, pageDiv))
+    scrollToFirst()
+  }, [highlights])
 
   return (
     <div ref={containerRef} style={{ overflow: 'auto', height: '100%', display: 'flex', flexDirection: 'column', alignItems: 'center', background: '#0a0f1e' }} />
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Compare /query/batch in packed and parallel mode on one document.
+
+Runs BatchQueryRunner (answer cache off) once per mode with the same
+questions and reports wall time, questions per second, LLM calls and the
+prompt tokens sent. With --dry-run no model is called: prompts are built
+and counted, and every question gets an empty answer, so only calls and
+prompt tokens are meaningful (wall time is then retrieval and packing).
+
+Usage (from backend/):
+    python -m benchmarks.batch_query --doc Certificate-BAM-A001.pdf
+    python -m benchmarks.batch_query --pdf ../test_files/Certificate-BAM-A001.pdf --max-concurrency 2 --dry-run
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.context_packing import DEFAULT_QUERIES, ensure_ingested
+from core.assistant import OllamaExtractor, aclose_async_client
+from core.batch_query import BatchQueryRunner
+from core.context_builder import get_token_counter
+from core.vec_db import VecDB
+from settings import settings
+
+DEFAULT_QUESTIONS = DEFAULT_QUERIES + [
+    "What is the certified value of cadmium?",
+    "What is the certified value of copper?",
+    "Which analytical methods were used?",
+    "How was homogeneity assessed?",
+    "What is the intended use of the material?",
+    "How is traceability established?",
+    "What is the minimum sample intake?",
+]
+
+
+class CountingExtractor(OllamaExtractor):
+    """Adds up prompt tokens of every call; with dry_run, answers without calling the model."""
+
+    def __init__(self, dry_run: bool):
+        super().__init__(settings)
+        self.dry_run = dry_run
+        self.count_tokens, _ = get_token_counter(settings.context_tokenizer)
+        self.prompt_tokens = 0
+
+    async def acall_llm(self, prompt: str, response_format: dict = None, context_tokens=None, prefer_backend=None):
+        if not self.dry_run:
+            data = await super().acall_llm(prompt, response_format, context_tokens, prefer_backend)
+            self.prompt_tokens += self.last_llm_stats.get("prompt_tokens") or 0
+            return data
+        self.prompt_tokens += self.count_tokens(prompt)
+        empty = {"result": "", "evidence": {"doc_name": [], "chunk_id": []}}
+        if response_format is self.batch_response_schema:
+            count = prompt.count("\n") + 1  # every question id the prompt could hold
+            return {"answers": [dict(empty, question_id=i) for i in range(count)]}
+        return empty
+
+
+async def run(mode: str, vec_db, doc_name: str, questions, args) -> dict:
+    assistant = CountingExtractor(args.dry_run)
+    runner = BatchQueryRunner(vec_db, assistant, doc_name, k=args.k, pack_size=settings.batch_pack_size,
+                              context_token_budget=settings.batch_context_token_budget)
+    started = time.perf_counter()
+    await runner.run(questions, mode=mode, max_concurrency=args.max_concurrency)
+    wall = time.perf_counter() - started
+    return {"wall_s": wall, "questions_s": len(questions) / wall, "llm_calls": runner.llm_calls,
+            "prompt_tokens": assistant.prompt_tokens}
+
+
+async def main_async(args):
+    vec_db = VecDB(settings=settings)
+    doc_name = ensure_ingested(vec_db, args.pdf) if args.pdf else args.doc
+    questions = args.questions or DEFAULT_QUESTIONS
+    print(f"doc={doc_name} questions={len(questions)} k={args.k} max_concurrency={args.max_concurrency} "
+          f"pack_size={settings.batch_pack_size} budget={settings.batch_context_token_budget} dry_run={args.dry_run}")
+    print(f"{'mode':>9} {'wall s':>8} {'q/s':>7} {'llm calls':>10} {'prompt tokens':>14}")
+    try:
+        rows = {}
+        for mode in ("parallel", "packed"):
+            rows[mode] = r = await run(mode, vec_db, doc_name, questions, args)
+            print(f"{mode:>9} {r['wall_s']:>8.2f} {r['questions_s']:>7.2f} {r['llm_calls']:>10} {r['prompt_tokens']:>14}")
+        packed, parallel = rows["packed"], rows["parallel"]
+        summary = (f"packed vs parallel: {packed['llm_calls']}/{parallel['llm_calls']} calls, "
+                   f"{packed['prompt_tokens']}/{parallel['prompt_tokens']} prompt tokens")
+        if not args.dry_run:
+            summary += f", {packed['questions_s'] / parallel['questions_s']:.2f}x throughput"
+        print(summary)
+    finally:
+        await aclose_async_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doc", help="Name of an already ingested document")
+    parser.add_argument("--pdf", help="PDF to ingest (if needed) and benchmark")
+    parser.add_argument("--k", type=int, default=5, help="Chunks retrieved per question")
+    parser.add_argument("--max-concurrency", type=int, default=settings.batch_max_concurrency)
+    parser.add_argument("--dry-run", action="store_true", help="Count calls and prompt tokens without a model")
+    parser.add_argument("questions", nargs="*")
+    args = parser.parse_args()
+    if not (args.doc or args.pdf):
+        parser.error("pass --doc or --pdf")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
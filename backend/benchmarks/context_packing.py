@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Compare legacy concatenated context against token-budget packed context.
+
+Reports context tokens and the time spent building the context per query
+for both formats and, with --llm, the prompt tokens and prefill
+(prompt_eval) time Ollama reports for each.
+
+Usage (from backend/):
+    python -m benchmarks.context_packing --pdf ../test_files/Certificate-BAM-A001.pdf
+    python -m benchmarks.context_packing --doc Certificate-BAM-A001.pdf --k 10 --budget 1024 --llm
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.assistant import OllamaExtractor
+from core.context_builder import ContextBuilder, get_token_counter
+from core.vec_db import VecDB, concatenate_documents
+from settings import settings
+
+DEFAULT_QUERIES = [
+    "What is the certified value of lead?",
+    "What is the expanded uncertainty of the certified values?",
+    "Until when is the certificate valid?",
+    "How should the material be stored?",
+    "Who issued this certificate?",
+]
+
+
+def ensure_ingested(vec_db: VecDB, pdf_path: str) -> str:
+    from core.doc_ocr import OCRDocProcessor
+    doc_name = os.path.basename(pdf_path)
+    if not vec_db.document_exists(doc_name):
+        _, line_boxes = OCRDocProcessor(settings).get_text_with_boxes(pdf_path)
+        vec_db.add_document(doc_name, line_boxes)
+    return doc_name
+
+
+def run_llm(assistant: OllamaExtractor, query: str, context: str) -> dict:
+    started = time.perf_counter()
+    assistant.call_llm(assistant._format_prompt(query, context), response_format=assistant.response_schema)
+    stats = dict(assistant.last_llm_stats)
+    stats["wall_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doc", help="Name of an already ingested document")
+    parser.add_argument("--pdf", help="PDF to ingest (if needed) and benchmark")
+    parser.add_argument("--k", type=int, default=10, help="Chunks retrieved per query")
+    parser.add_argument("--budget", type=int, default=settings.context_token_budget)
+    parser.add_argument("--tokenizer", default=settings.context_tokenizer)
+    parser.add_argument("--llm", action="store_true", help="Also call Ollama and report prompt eval stats")
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+    args = parser.parse_args()
+    if not (args.doc or args.pdf):
+        parser.error("pass --doc or --pdf")
+
+    vec_db = VecDB(settings=settings)
+    doc_name = ensure_ingested(vec_db, args.pdf) if args.pdf else args.doc
+    count, label = get_token_counter(args.tokenizer)
+    builder = ContextBuilder(args.budget, count, label)
+    assistant = OllamaExtractor(settings) if args.llm else None
+
+    rows = []
+    for query in args.queries:
+        hits = [vec_db.query(doc_name=doc_name, query_embedding=vec_db.get_query_embedding(query), n_results=args.k)]
+        started = time.perf_counter()
+        legacy_context, _ = concatenate_documents(hits)
+        legacy_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        packed_context, _, stats = builder.build(hits)
+        packed_ms = (time.perf_counter() - started) * 1000
+        row = {
+            "query": query,
+            "legacy_tokens": count(legacy_context),
+            "packed_tokens": stats["context_tokens"],
+            "legacy_ms": legacy_ms,
+            "packed_ms": packed_ms,
+            "chunks": f"{stats['chunks_packed']}/{stats['chunks_retrieved']}",
+        }
+        if assistant:
+            row["legacy_llm"] = run_llm(assistant, query, legacy_context)
+            row["packed_llm"] = run_llm(assistant, query, packed_context)
+        rows.append(row)
+
+    print(f"\ndoc={doc_name} k={args.k} budget={args.budget} tokenizer={label}")
+    print(f"{'query':<50} {'legacy':>8} {'packed':>8} {'chunks':>7} {'legacy ms':>10} {'packed ms':>10}")
+    for row in rows:
+        print(f"{row['query'][:50]:<50} {row['legacy_tokens']:>8} {row['packed_tokens']:>8} {row['chunks']:>7} "
+              f"{row['legacy_ms']:>10.2f} {row['packed_ms']:>10.2f}")
+    legacy_total = sum(r["legacy_tokens"] for r in rows)
+    packed_total = sum(r["packed_tokens"] for r in rows)
+    print(f"context tokens: legacy={legacy_total} packed={packed_total} "
+          f"reduction={100 * (1 - packed_total / max(legacy_total, 1)):.1f}%")
+    print(f"context build ms median: legacy={statistics.median(r['legacy_ms'] for r in rows):.2f} "
+          f"packed={statistics.median(r['packed_ms'] for r in rows):.2f}")
+
+    if assistant:
+        for fmt in ("legacy", "packed"):
+            prompt_tokens = [r[f"{fmt}_llm"]["prompt_tokens"] or 0 for r in rows]
+            prefill = [r[f"{fmt}_llm"]["prompt_eval_ms"] or 0 for r in rows]
+            wall = [r[f"{fmt}_llm"]["wall_ms"] for r in rows]
+            print(f"{fmt:>6}: prompt_tokens mean={statistics.mean(prompt_tokens):.0f} "
+                  f"prefill_ms median={statistics.median(prefill):.1f} wall_ms median={statistics.median(wall):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Cold import time of the API app (``import main``) in fresh interpreters.
+
+Each run starts a new ``python -X importtime -c "import main"`` and reports
+the wall time, the slowest top-level imports and whether any of the heavy
+libraries (torch, chromadb, OpenCV, Tesseract, PyMuPDF) was loaded; those
+are meant to load on first use or in the background warmup (core/warmup.py),
+not at import. With ``--max-seconds`` the script exits non-zero when the
+median exceeds the limit or a heavy library is imported, so it can guard
+against regressions in CI.
+
+Usage (from backend/):
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --runs 10 --max-seconds 2
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ("torch", "sentence_transformers", "chromadb", "cv2", "pytesseract", "pymupdf", "PIL")
+
+
+def import_once(module: str = "main") -> dict:
+    """Import module in a new interpreter; wall seconds, per-module cumulative us and the heavy modules seen."""
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=BACKEND_DIR,
+                          capture_output=True, text=True)
+    seconds = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|", 2)
+        if cum.strip().isdigit():
+            cumulative[name.strip()] = int(cum)
+    heavy = sorted(m for m in HEAVY_MODULES if m in cumulative)
+    return {"seconds": seconds, "cumulative": cumulative, "heavy": heavy}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="Module to import (default: the FastAPI app)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    parser.add_argument("--max-seconds", type=float, default=None, help="Fail above this median wall time")
+    args = parser.parse_args()
+
+    runs = [import_once(args.module) for _ in range(args.runs)]
+    times = sorted(r["seconds"] for r in runs)
+    median = statistics.median(times)
+    print(f"import {args.module}: median {median * 1000:.0f} ms, min {times[0] * 1000:.0f} ms, "
+          f"max {times[-1] * 1000:.0f} ms over {args.runs} runs")
+
+    last = runs[-1]["cumulative"]
+    top_level = {name: us for name, us in last.items() if "." not in name}
+    print(f"{'ms':>8}  top-level import")
+    for name, us in sorted(top_level.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"{us / 1000:>8.1f}  {name}")
+
+    heavy = sorted({m for r in runs for m in r["heavy"]})
+    print(f"heavy modules imported: {', '.join(heavy) if heavy else 'none'}")
+    if args.max_seconds is not None and (median > args.max_seconds or heavy):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
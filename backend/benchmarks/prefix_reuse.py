@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Measure prefill time of follow-up questions with and without a chat session.
+
+All questions are answered from the same packed context (retrieved for the
+first question), which is the case prompt-prefix reuse targets. Three runs:
+
+- fresh:   full prompt per question, the model is unloaded between calls
+           (keep_alive=0) so nothing can be reused
+- prefix:  full prompt per question; Ollama reuses the KV cache of the
+           identical instructions + context prefix
+- session: follow-ups continue from the previous turn's context tokens
+
+With --dry-run no model is called; each run instead reports the prompt
+tokens a follow-up leaves to prefill (for prefix, the tokens after the
+part shared with the previous prompt). This bounds the saving but is not
+a prefill time.
+
+Usage (from backend/):
+    python -m benchmarks.prefix_reuse --doc Certificate-BAM-A001.pdf
+    python -m benchmarks.prefix_reuse --doc Certificate-BAM-A001.pdf --dry-run
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import uuid
+from os.path import commonprefix
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.context_packing import DEFAULT_QUERIES, ensure_ingested
+from core.assistant import OllamaExtractor, aclose_async_client
+from core.context_builder import get_token_counter
+from core.vec_db import VecDB
+from settings import settings
+
+
+async def run(mode: str, context: str, queries) -> list:
+    assistant = OllamaExtractor(settings)
+    if mode == "fresh":
+        assistant.settings = settings.model_copy(update={"llm_keep_alive": "0"})
+    session_id = str(uuid.uuid4()) if mode == "session" else None
+    prefill = []
+    for query in queries:
+        await assistant.aextract_from_document(query, context, session_id=session_id)
+        prefill.append(assistant.last_llm_stats.get("prompt_eval_ms") or 0.0)
+    return prefill
+
+
+def count_prefill_tokens(mode: str, context: str, queries) -> list:
+    """Prompt tokens left to prefill per question, without calling the model."""
+    assistant = OllamaExtractor(settings)
+    count_tokens, _ = get_token_counter(settings.context_tokenizer)
+    tokens, previous = [], ""
+    for i, query in enumerate(queries):
+        prompt = assistant._format_prompt(query, context)
+        if mode == "session" and i:
+            prompt = assistant._read_prompt_file(assistant._followup_prompt_path).replace("{query}", query)
+        elif mode == "prefix":
+            prompt, previous = prompt[len(commonprefix([prompt, previous])):], prompt
+        tokens.append(count_tokens(prompt))
+    return tokens
+
+
+async def main_async(args):
+    vec_db = VecDB(settings=settings)
+    doc_name = ensure_ingested(vec_db, args.pdf) if args.pdf else args.doc
+    context, _ = vec_db.get_context(args.queries[0], doc_name, n_results=args.k)
+    print(f"doc={doc_name} k={args.k} context_tokens={vec_db.last_context_stats.get('context_tokens')}")
+    try:
+        for mode in ("fresh", "prefix", "session"):
+            if args.dry_run:
+                tokens = count_prefill_tokens(mode, context, args.queries)
+                follow_ups = tokens[1:] or tokens
+                print(f"{mode:>8}: first={tokens[0]} tokens  follow-up prefill median={statistics.median(follow_ups)} tokens")
+                continue
+            prefill = await run(mode, context, args.queries)
+            follow_ups = prefill[1:] or prefill
+            print(f"{mode:>8}: first={prefill[0]:.1f} ms  follow-up prefill median={statistics.median(follow_ups):.1f} ms")
+    finally:
+        await aclose_async_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doc", help="Name of an already ingested document")
+    parser.add_argument("--pdf", help="PDF to ingest (if needed) and benchmark")
+    parser.add_argument("--k", type=int, default=5, help="Chunks retrieved for the shared context")
+    parser.add_argument("--dry-run", action="store_true", help="Count tokens left to prefill without a model")
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES)
+    args = parser.parse_args()
+    if not (args.doc or args.pdf):
+        parser.error("pass --doc or --pdf")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Time a full spec extraction (what POST /extract does) on one document.
+
+Runs the spec twice: cold (empty retrieval cache) and warm (retrievals
+cached, as for a repeated extraction of the same document). Reports total
+time, the time spent before the first LLM call (retrieval and context
+packing), LLM calls and valid fields. With --dry-run no model is called:
+prompts are built and every field comes back empty, so the numbers cover
+everything except generation.
+
+Usage (from backend/):
+    python -m benchmarks.spec_extraction --doc Certificate-BAM-A001.pdf
+    python -m benchmarks.spec_extraction --pdf ../test_files/Certificate-BAM-A001.pdf --dry-run
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.context_packing import ensure_ingested
+from core.answer_cache import document_fingerprint
+from core.assistant import OllamaExtractor, aclose_async_client
+from core.spec_extractor import RetrievalCache, SpecExtractor, get_spec_registry
+from core.vec_db import VecDB
+from settings import settings
+from utils.highlighting import ORIGINAL_DIR
+
+
+class TimedExtractor(OllamaExtractor):
+    """Records when the first LLM call starts; with dry_run, answers without calling the model."""
+
+    def __init__(self, dry_run: bool):
+        super().__init__(settings, model=settings.spec_gen_model)
+        self.dry_run = dry_run
+        self.first_call_at = None
+
+    async def acall_llm(self, prompt: str, response_format: dict = None, context_tokens=None, prefer_backend=None):
+        if self.first_call_at is None:
+            self.first_call_at = time.perf_counter()
+        if self.dry_run:
+            return {}
+        return await super().acall_llm(prompt, response_format, context_tokens, prefer_backend)
+
+
+async def run(vec_db, compiled, doc_name: str, doc_hash: str, cache: RetrievalCache, args) -> dict:
+    assistant = TimedExtractor(args.dry_run)
+    extractor = SpecExtractor(vec_db, assistant, cache, k=args.k, max_concurrency=settings.spec_max_concurrency,
+                              context_token_budget=settings.spec_context_token_budget)
+    started = time.perf_counter()
+    record = await extractor.extract(compiled, doc_name, doc_hash)
+    total = time.perf_counter() - started
+    return {
+        "total_ms": total * 1000,
+        "before_llm_ms": ((assistant.first_call_at or time.perf_counter()) - started) * 1000,
+        "llm_calls": record["llm_calls"],
+        "valid": sum(1 for field in record["fields"].values() if field["valid"]),
+        "fields": len(record["fields"]),
+    }
+
+
+async def main_async(args):
+    vec_db = VecDB(settings=settings)
+    doc_name = ensure_ingested(vec_db, args.pdf) if args.pdf else args.doc
+    compiled = get_spec_registry().get(args.spec)
+    if compiled is None:
+        raise SystemExit(f"Extraction spec '{args.spec}' not found in {settings.extraction_specs_folder}")
+    doc_hash = document_fingerprint(os.path.join(ORIGINAL_DIR, doc_name))
+    print(f"doc={doc_name} spec={args.spec} fields={len(compiled.spec.fields)} k={args.k} "
+          f"fields_per_call={settings.spec_fields_per_call} max_concurrency={settings.spec_max_concurrency} "
+          f"dry_run={args.dry_run}")
+    print(f"{'run':>5} {'total ms':>10} {'before LLM ms':>14} {'llm calls':>10} {'valid':>7}")
+    cache = RetrievalCache()
+    try:
+        for label in ("cold", "warm"):
+            r = await run(vec_db, compiled, doc_name, doc_hash, cache, args)
+            valid = "-" if args.dry_run else f"{r['valid']}/{r['fields']}"
+            print(f"{label:>5} {r['total_ms']:>10.1f} {r['before_llm_ms']:>14.1f} {r['llm_calls']:>10} {valid:>7}")
+    finally:
+        await aclose_async_client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--doc", help="Name of an already ingested document")
+    parser.add_argument("--pdf", help="PDF to ingest (if needed) and benchmark")
+    parser.add_argument("--spec", default="reference_material_certificate")
+    parser.add_argument("--k", type=int, default=5, help="Chunks retrieved per field query")
+    parser.add_argument("--dry-run", action="store_true", help="Skip generation and time everything else")
+    args = parser.parse_args()
+    if not (args.doc or args.pdf):
+        parser.error("pass --doc or --pdf")
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
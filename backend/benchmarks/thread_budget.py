@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Throughput of embedding and OCR under concurrency, with and without the thread budget.
+
+Each request is either one SentenceTransformer ``encode`` of a page worth of
+lines ("embed") or the OCR fallback path on one rendered page: denoise with
+OpenCV, then Tesseract ("ocr"). For 1, 4 and 16 concurrent requests two runs
+are compared:
+
+- default: library defaults (every call may use one thread per core)
+- budget:  settings.n_threads split across the concurrent requests, as
+           core/thread_budget.py does for the executors
+
+Usage (from backend/):
+    python -m benchmarks.thread_budget --pdf ../test_files/Certificate-BAM-A001.pdf
+    python -m benchmarks.thread_budget --pdf ../test_files/Certificate-BAM-A001.pdf --workload ocr --requests 32
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import pymupdf
+
+from core.thread_budget import limit_ocr_threads, limit_torch_threads, per_worker, total_threads
+from settings import settings
+
+_ENV = ("OMP_THREAD_LIMIT", "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def load_pages(pdf_path: str, dpi: int):
+    """(lines of text, grayscale image) per page."""
+    pages = []
+    with pymupdf.open(pdf_path) as doc:
+        for page in doc:
+            lines = [line for line in page.get_text().splitlines() if line.strip()] or ["empty page"]
+            pix = page.get_pixmap(dpi=dpi)
+            img = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+            pages.append((lines, cv2.cvtColor(img[:, :, :3], cv2.COLOR_RGB2GRAY)))
+    return pages
+
+
+def make_task(workload: str):
+    if workload == "embed":
+        from core.vec_db import get_embedding_model
+        model = get_embedding_model("all-MiniLM-L6-v2")  # VecDB default
+        return lambda page: model.encode(page[0], batch_size=32)
+
+    import pytesseract
+    from PIL import Image
+
+    def ocr(page):
+        # same steps as the OCR fallback in core/doc_ocr.py
+        denoised = cv2.fastNlMeansDenoising(page[1], None, h=5, templateWindowSize=7, searchWindowSize=21)
+        _, binary = cv2.threshold(denoised, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        return pytesseract.image_to_data(Image.fromarray(binary), output_type=pytesseract.Output.DICT)
+    return ocr
+
+
+def use_defaults(defaults: dict):
+    for name in _ENV:
+        os.environ.pop(name, None)
+    cv2.setNumThreads(defaults["cv2"])
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(defaults["torch"])
+
+
+def use_budget(concurrency: int):
+    threads = per_worker(total_threads(settings), concurrency)
+    limit_ocr_threads(threads)
+    limit_torch_threads(threads)
+    return threads
+
+
+def measure(task, pages, concurrency: int, requests: int) -> dict:
+    def timed(i):
+        started = time.perf_counter()
+        task(pages[i % len(pages)])
+        return time.perf_counter() - started
+
+    task(pages[0])  # warm up (model, Tesseract data files)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(timed, range(requests)))
+    wall = time.perf_counter() - started
+    return {
+        "req_s": requests / wall,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", required=True, help="PDF whose pages are used as requests")
+    parser.add_argument("--workload", choices=["embed", "ocr"], default="embed")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=48, help="Requests per run")
+    parser.add_argument("--dpi", type=int, default=300, help="Render resolution for OCR")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pdf, args.dpi)
+    task = make_task(args.workload)
+    torch = sys.modules.get("torch")
+    defaults = {"cv2": cv2.getNumThreads(), "torch": torch.get_num_threads() if torch is not None else None}
+    print(f"workload={args.workload} pages={len(pages)} requests={args.requests} "
+          f"n_threads={total_threads(settings)} cores={os.cpu_count()} defaults={defaults}")
+    print(f"{'mode':>8} {'conc':>5} {'threads':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9}")
+    for concurrency in args.concurrency:
+        for mode in ("default", "budget"):
+            if mode == "default":
+                use_defaults(defaults)
+                threads = "-"
+            else:
+                threads = use_budget(concurrency)
+            r = measure(task, pages, concurrency, args.requests)
+            print(f"{mode:>8} {concurrency:>5} {threads:>8} {r['req_s']:>8.2f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
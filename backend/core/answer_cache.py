@@ -0,0 +1,168 @@
+"""Answer cache for repeated questions against the same document.
+
+Entries are keyed by (document content hash, prompt template hash, model,
+normalized query). Near-duplicate questions can additionally be matched by
+cosine similarity of their query embeddings within the same
+(document, prompt, model) scope.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+_fingerprints = {}  # path -> (mtime_ns, size, sha256)
+_fingerprint_lock = threading.Lock()
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def document_fingerprint(path: str) -> Optional[str]:
+    """Content hash of a stored document, recomputed only when the file changes."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    with _fingerprint_lock:
+        cached = _fingerprints.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+    digest = file_sha256(path)
+    with _fingerprint_lock:
+        _fingerprints[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def remember_fingerprint(path: str, digest: str):
+    """Record the hash of a file just written (e.g. computed while streaming it) so it is not read again."""
+    st = os.stat(path)
+    with _fingerprint_lock:
+        _fingerprints[path] = (st.st_mtime_ns, st.st_size, digest)
+
+
+def forget_fingerprint(path: str):
+    with _fingerprint_lock:
+        _fingerprints.pop(path, None)
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    query = re.sub(r'\s+', ' ', query.strip().lower())
+    return query.rstrip(' ?.!')
+
+
+class AnswerCache:
+    """Thread-safe in-memory LRU of answers with optional embedding matching."""
+
+    def __init__(self, max_entries: int = 2048, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()  # key -> entry dict
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _scope(doc_hash, prompt_hash, model, retrieval):
+        return (doc_hash, prompt_hash, model, retrieval)
+
+    def get(self, doc_hash: str, prompt_hash: str, model: str, retrieval, query: str) -> Optional[dict]:
+        """Exact lookup on the normalized query (no embedding needed).
+
+        retrieval is what shaped the context, e.g. (k, context_token_budget):
+        an answer built from 5 chunks is not served for a k=10 request.
+        """
+        key = self._scope(doc_hash, prompt_hash, model, retrieval) + (normalize_query(query),)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry["answer"], cache_similarity=1.0)
+
+    def get_similar(self, doc_hash: str, prompt_hash: str, model: str, retrieval, query_embedding) -> Optional[dict]:
+        """Best entry in the same scope whose query embedding is above the threshold."""
+        if not self.similarity_threshold or query_embedding is None:
+            return None
+        scope = self._scope(doc_hash, prompt_hash, model, retrieval)
+        q = np.asarray(query_embedding, dtype=np.float32).ravel()
+        q_norm = np.linalg.norm(q)
+        if not q_norm:
+            return None
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if key[:4] == scope and entry["embedding"] is not None
+            ]
+            if not candidates:
+                return None
+            matrix = np.stack([entry["embedding"] for _, entry in candidates])
+            scores = matrix @ q / (np.linalg.norm(matrix, axis=1) * q_norm + 1e-12)
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+            key, entry = candidates[best]
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            return dict(entry["answer"], cache_similarity=round(float(scores[best]), 4))
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, doc_name: str, doc_hash: str, prompt_hash: str, model: str, retrieval, query: str,
+            answer: dict, query_embedding=None):
+        key = self._scope(doc_hash, prompt_hash, model, retrieval) + (normalize_query(query),)
+        embedding = None
+        if query_embedding is not None:
+            embedding = np.asarray(query_embedding, dtype=np.float32).ravel()
+        with self._lock:
+            self._entries[key] = {"doc_name": doc_name, "answer": dict(answer), "embedding": embedding}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_document(self, doc_name: str) -> int:
+        """Drop every entry for doc_name (e.g. after re-ingestion). Returns number removed."""
+        with self._lock:
+            stale = [k for k, e in self._entries.items() if e["doc_name"] == doc_name]
+            for k in stale:
+                del self._entries[k]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_answer_cache = None
+
+
+def get_answer_cache() -> AnswerCache:
+    """Process-wide answer cache configured from settings."""
+    global _answer_cache
+    if _answer_cache is None:
+        from settings import settings
+        _answer_cache = AnswerCache(
+            max_entries=settings.answer_cache_max_entries,
+            similarity_threshold=settings.answer_cache_similarity,
+        )
+    return _answer_cache
+
+
+__all__ = ["AnswerCache", "get_answer_cache", "document_fingerprint", "remember_fingerprint", "normalize_query"]
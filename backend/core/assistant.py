@@ -1,24 +1,90 @@
 import requests
+import httpx
+import hashlib
 import json
 import logging
 import os
+import re
+import time
+from core.ollama_pool import OllamaBackendPool, get_backend_pool
+from core.llm_sessions import get_session_store
+from utils.metrics import record_llm, stage
 
 logging.getLogger("requests").setLevel(logging.ERROR)
 
+_BATCH_PLACEHOLDER = re.compile(r"\{(questions|context)\}")
+_prompt_fingerprints = {}  # (template path, (mtime_ns, size), schema) -> hash
+
+# Shared HTTP clients (one connection pool per process, reused across requests)
+_sync_session = None
+_async_client = None
+
+
+def _timeouts(settings):
+    return settings.llm_connect_timeout, settings.llm_read_timeout
+
+
+def get_sync_session():
+    """Return the process-wide requests session (keep-alive connection reuse)."""
+    global _sync_session
+    if _sync_session is None:
+        _sync_session = requests.Session()
+    return _sync_session
+
+
+def get_async_client(settings):
+    """Return the process-wide async client, creating it with pool limits and timeouts on first use."""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        connect_timeout, read_timeout = _timeouts(settings)
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+            ),
+        )
+    return _async_client
+
+
+async def aclose_async_client():
+    """Close the shared async client (called on application shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
 
 class OllamaExtractor:
-    def __init__(self, settings, base_url="http://localhost:8880", model=None):
-        self.base_url = base_url
+    def __init__(self, settings, base_url=None, model=None, async_client=None):
+        self.settings = settings
         self.model = model or settings.extraction_model
+        if base_url or async_client is not None:
+            # explicit backend / transport (tests, scripts): private single-backend pool
+            self.pool = OllamaBackendPool([base_url or settings.ollama_base_url], client=async_client,
+                                          settings=settings, health_interval=0)
+        else:
+            self.pool = get_backend_pool(settings)
         # Store path; do not read or format yet
         self._prompt_path = os.path.join(os.path.dirname(__file__), "..", "prompts", "assistant_prompt.txt")
+        self._batch_prompt_path = os.path.join(os.path.dirname(__file__), "..", "prompts", "batch_prompt.txt")
+        self._followup_prompt_path = os.path.join(os.path.dirname(__file__), "..", "prompts", "followup_prompt.txt")
         self.response_schema = self._build_response_schema()  # JSON schema definition
+        self.batch_response_schema = self._build_batch_response_schema()
+        self.last_llm_stats = {}  # token counts / timings of the most recent generation
+        self.last_llm_context = None  # Ollama context tokens of the most recent generation
+        self.last_backend_url = None
         print(f"Using Ollama model: {self.model}")
 
-    def _read_prompt_file(self):
+    @property
+    def base_url(self):
+        """URL of the backend a synchronous call would use right now."""
+        return self.pool.pick().url
+
+    def _read_prompt_file(self, path=None):
         """Read raw prompt template text each call (allows live edits)."""
         try:
-            with open(self._prompt_path, 'r', encoding='utf-8') as f:
+            with open(path or self._prompt_path, 'r', encoding='utf-8') as f:
                 return f.read()
         except FileNotFoundError:
             return (
@@ -53,22 +119,124 @@ class OllamaExtractor:
             "additionalProperties": False
         }
 
+    def _build_batch_response_schema(self):
+        """Schema for answering several numbered questions in one generation."""
+        answer = self._build_response_schema()
+        answer["properties"] = {"question_id": {"type": "integer"}, **answer["properties"]}
+        answer["required"] = ["question_id"] + answer["required"]
+        return {
+            "type": "object",
+            "properties": {"answers": {"type": "array", "items": answer}},
+            "required": ["answers"],
+            "additionalProperties": False
+        }
+
+    def prompt_fingerprint(self):
+        """Hash of the current prompt template and response schema (answer cache key part).
+
+        Recomputed only when the template file changes (mtime or size).
+        """
+        try:
+            st = os.stat(self._prompt_path)
+            version = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            version = None
+        schema = json.dumps(self.response_schema, sort_keys=True)
+        key = (self._prompt_path, version, schema)
+        fingerprint = _prompt_fingerprints.get(key)
+        if fingerprint is None:
+            material = self._read_prompt_file() + schema
+            fingerprint = _prompt_fingerprints[key] = hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+        return fingerprint
+
+    @staticmethod
+    def _error_response(e):
+        return {"result": f"Error: {e}", "evidence": {"doc_name": [], "chunk_id": []}, "error": str(e)}
+
+    @staticmethod
+    def _llm_stats(result: dict) -> dict:
+        """Token counts and timings Ollama reports with a finished generation (durations in ms)."""
+        ns = 1e6
+        return {
+            "prompt_tokens": result.get("prompt_eval_count"),
+            "completion_tokens": result.get("eval_count"),
+            "prompt_eval_ms": round(result["prompt_eval_duration"] / ns, 1) if result.get("prompt_eval_duration") else None,
+            "eval_ms": round(result["eval_duration"] / ns, 1) if result.get("eval_duration") else None,
+            "total_ms": round(result["total_duration"] / ns, 1) if result.get("total_duration") else None,
+        }
+
+    def _build_payload(self, prompt: str, response_format: dict = None, stream: bool = False, context_tokens=None):
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "format": response_format,
+            "keep_alive": self.settings.llm_keep_alive,
+        }
+        if context_tokens:
+            payload["context"] = context_tokens
+        return payload
+
+    def _prefix_hash(self, context):
+        """Identity of everything in the prompt that precedes the query."""
+        material = f"{self.model}\n{self.prompt_fingerprint()}\n{context}"
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()[:16]
+
+    def _session_turn(self, query, context, session_id):
+        """(prompt, previous turn or None, prefix hash) for one question of a chat session.
+
+        A follow-up whose packed document context is unchanged continues from the
+        previous generation's context tokens with only the new question.
+        """
+        prefix_hash = self._prefix_hash(context)
+        turn = get_session_store().get(session_id, prefix_hash) if session_id else None
+        if turn:
+            template = self._read_prompt_file(self._followup_prompt_path)
+            return template.replace("{query}", query), turn, prefix_hash
+        return self._format_prompt(query, context), None, prefix_hash
+
+    def _end_session_turn(self, session_id, prefix_hash, reused):
+        self.last_llm_stats["session_reused"] = reused
+        if session_id:
+            get_session_store().put(session_id, prefix_hash, self.last_llm_context, self.last_backend_url)
+
+    def _format_prompt(self, query, context):
+        """Load the prompt template and fill in query and context."""
+        with stage("prompt"):
+            return self._fill_prompt(query, context)
+
+    def _fill_prompt(self, query, context):
+        base_template = self._read_prompt_file()
+        try:
+            return base_template.format(query=query, context=context)
+        except KeyError:
+            # Guard against accidental braces in template
+            safe_template = base_template.replace('{', '{{').replace('}', '}}')
+            safe_template = safe_template.replace('{{query}}', '{query}').replace('{{context}}', '{context}')
+            return safe_template.format(query=query, context=context)
+
+    def _format_batch_prompt(self, questions, context):
+        numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(questions))
+        template = self._read_prompt_file(self._batch_prompt_path).replace("{{", "{").replace("}}", "}")
+        # One pass, so placeholders inside questions or document text are never substituted
+        values = {"questions": numbered, "context": context}
+        return _BATCH_PLACEHOLDER.sub(lambda m: values[m.group(1)], template)
+
     def call_llm(
         self,
         prompt: str,
         response_format: dict = None,
         stream_response: bool = False,
     ):
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": stream_response,
-            "format": response_format,
-        }
+        payload = self._build_payload(prompt, response_format, stream_response)
+        session = get_sync_session()
+        timeout = _timeouts(self.settings)
+        base_url = self.base_url
 
         if stream_response:
             response_text = ""
-            with requests.post(f"{self.base_url}/api/generate", json=payload, stream=True) as response:
+            with session.post(f"{base_url}/api/generate", json=payload, stream=True, timeout=timeout) as response:
+                response.raise_for_status()
                 for line in response.iter_lines():
                     if line:
                         chunk = json.loads(line.decode('utf-8'))
@@ -80,25 +248,104 @@ class OllamaExtractor:
                             break
             return response_text
         else:
-            response = requests.post(f"{self.base_url}/api/generate", json=payload)
+            started = time.perf_counter()
+            response = session.post(f"{base_url}/api/generate", json=payload, timeout=timeout)
+            response.raise_for_status()
             result = response.json()
+            self.last_llm_stats = self._llm_stats(result)
+            record_llm("generate", time.perf_counter() - started, self.last_llm_stats)
             return json.loads(result['response'])
 
+    async def acall_llm(self, prompt: str, response_format: dict = None, context_tokens=None, prefer_backend=None):
+        """Async, non-streaming generation on the least busy healthy backend.
+
+        Cancelling the awaiting task aborts the in-flight HTTP request, which
+        makes Ollama stop generating for it.
+        """
+        payload = self._build_payload(prompt, response_format, stream=False, context_tokens=context_tokens)
+        started = time.perf_counter()
+        response = await self.pool.post("/api/generate", payload, prefer=prefer_backend)
+        response.raise_for_status()
+        result = response.json()
+        self.last_llm_stats = self._llm_stats(result)
+        record_llm("generate", time.perf_counter() - started, self.last_llm_stats)
+        self.last_llm_context = result.get("context")
+        self.last_backend_url = response.extensions.get("ollama_backend")
+        return json.loads(result['response'])
+
+    async def astream_llm(self, prompt: str, response_format: dict = None, context_tokens=None, prefer_backend=None):
+        """Yield raw Ollama stream chunks (dicts with 'response', 'done', ...) as they arrive."""
+        payload = self._build_payload(prompt, response_format, stream=True, context_tokens=context_tokens)
+        started = time.perf_counter()
+        async with self.pool.stream("/api/generate", payload, prefer=prefer_backend) as response:
+            response.raise_for_status()
+            self.last_backend_url = response.extensions.get("ollama_backend")
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get('done', False):
+                    self.last_llm_stats = self._llm_stats(chunk)
+                    self.last_llm_context = chunk.get("context")
+                    record_llm("stream", time.perf_counter() - started, self.last_llm_stats)
+                yield chunk
+                if chunk.get('done', False):
+                    break
+
+    async def astream_extract_from_document(self, query, context, session_id=None):
+        """Stream the structured answer for query; yields Ollama chunks."""
+        prompt, turn, prefix_hash = self._session_turn(query, context, session_id)
+        async for chunk in self.astream_llm(prompt, response_format=self.response_schema,
+                                            context_tokens=turn and turn["context"],
+                                            prefer_backend=turn and turn["backend_url"]):
+            if chunk.get('done', False):
+                self._end_session_turn(session_id, prefix_hash, turn is not None)
+            yield chunk
+
+    async def aextract_batch(self, questions, context):
+        """Answer several questions against one shared context in a single generation.
+
+        Returns {question_index: {"result", "evidence"}}; questions the model skipped are absent.
+        """
+        prompt = self._format_batch_prompt(questions, context)
+        data = await self.acall_llm(prompt, response_format=self.batch_response_schema)
+        answers = {}
+        for item in (data or {}).get("answers", []):
+            qid = item.get("question_id")
+            if isinstance(qid, int) and 0 <= qid < len(questions) and qid not in answers:
+                answers[qid] = {
+                    "result": item.get("result", ""),
+                    "evidence": item.get("evidence", {"doc_name": [], "chunk_id": []}),
+                }
+        return answers
+
     def extract_from_document(self, query, context):
         """Extract information using formatted context. Loads & formats prompt now."""
-        base_template = self._read_prompt_file()
+        full_prompt = self._format_prompt(query, context)
         try:
-            full_prompt = base_template.format(query=query, context=context)
-        except KeyError as e:
-            # Guard against accidental braces in template
-            safe_template = base_template.replace('{', '{{').replace('}', '}}')
-            safe_template = safe_template.replace('{{query}}', '{query}').replace('{{context}}', '{context}')
-            full_prompt = safe_template.format(query=query, context=context)
+            raw = self.call_llm(full_prompt, response_format=self.response_schema, stream_response=False)
+            data = raw if isinstance(raw, dict) else json.loads(raw)
+        except Exception as e:
+            return self._error_response(e)
 
+        return data
+
+    async def aextract_from_document(self, query, context, session_id=None):
+        """Async variant of extract_from_document (does not block the event loop).
+
+        With a session_id, follow-up questions on an unchanged document context
+        reuse the previous turn instead of prefilling the whole prompt again.
+        """
+        prompt, turn, prefix_hash = self._session_turn(query, context, session_id)
         try:
-            raw = self.call_llm(full_prompt, response_format=self.response_schema, stream_response=False)
+            raw = await self.acall_llm(prompt, response_format=self.response_schema,
+                                       context_tokens=turn and turn["context"],
+                                       prefer_backend=turn and turn["backend_url"])
             data = raw if isinstance(raw, dict) else json.loads(raw)
         except Exception as e:
-            return {"result": f"Error: {e}", "evidence": {"doc_name": [], "chunk_id": []}}
+            if session_id:
+                get_session_store().drop(session_id)
+            return self._error_response(e)
+        self._end_session_turn(session_id, prefix_hash, turn is not None)
 
         return data
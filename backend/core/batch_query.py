@@ -0,0 +1,187 @@
+"""Answer many questions about one document in a single request.
+
+All questions are embedded in one batch and retrieved with one Chroma call.
+They are then answered either
+
+- "packed": questions whose combined evidence fits one context budget are
+  grouped and answered by a single structured LLM call, or
+- "parallel": one LLM call per question,
+
+with at most ``max_concurrency`` LLM calls in flight.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+from typing import List, Optional
+
+from core.answer_cache import get_answer_cache
+from core.executors import get_executor
+from utils.evidence import resolve_chunk_ids, highlights_from_metadata
+
+logger = logging.getLogger(__name__)
+
+
+class BatchQueryRunner:
+    def __init__(self, vec_db, assistant, doc_name: str, k: int = 5, cache_scope: tuple = None,
+                 pack_size: int = 8, context_token_budget: int = 4096, catalog=None, line_min_score: float = 1.0):
+        self.vec_db = vec_db
+        self.assistant = assistant
+        self.doc_name = doc_name
+        self.k = k
+        self.cache_scope = cache_scope
+        self.pack_size = max(1, pack_size)
+        self.context_token_budget = context_token_budget
+        self.catalog = catalog  # ChunkCatalog for line-level highlights (optional)
+        self.line_min_score = line_min_score
+        self.llm_calls = 0
+        self.packed_fallbacks = 0  # packed calls that failed; their questions were answered one by one
+
+    def group_questions(self, indices: List[int], hits: dict) -> List[List[int]]:
+        """Greedily group questions while the union of their retrieved chunks fits one context budget."""
+        groups, current = [], []
+        for idx in indices:
+            candidate = current + [idx]
+            if current and (len(candidate) > self.pack_size or not self._fits(candidate, hits)):
+                groups.append(current)
+                candidate = [idx]
+            current = candidate
+        if current:
+            groups.append(current)
+        return groups
+
+    def _fits(self, group: List[int], hits: dict) -> bool:
+        if self.vec_db.context_builder is None:
+            return True
+        self.vec_db.build_context([hits[i] for i in group], token_budget=self.context_token_budget)
+        stats = self.vec_db.last_context_stats
+        return stats["chunks_packed"] == stats["chunks_retrieved"]
+
+    def _result(self, question: str, answer: dict, metadata: List[dict], embedding=None) -> dict:
+        evidence = answer.get("evidence", {}) or {"doc_name": [], "chunk_id": []}
+        chunk_ids = resolve_chunk_ids(evidence, metadata, self.doc_name)
+        item = {
+            "question": question,
+            "result": answer.get("result", ""),
+            "evidence": evidence,
+            "chunk_ids": chunk_ids,
+            "highlights": highlights_from_metadata(
+                chunk_ids, metadata, self.doc_name, line_boxes=self._line_boxes(chunk_ids),
+                answer=answer.get("result", ""), min_score=self.line_min_score),
+            "context_chunk_count": len(metadata),
+            "cached": False,
+        }
+        if "error" in answer:
+            item["error"] = answer["error"]
+        elif self.cache_scope:
+            get_answer_cache().put(self.doc_name, *self.cache_scope, question, {
+                "result": item["result"], "evidence": evidence, "chunk_ids": item["chunk_ids"],
+                "highlights": item["highlights"], "context_chunk_count": item["context_chunk_count"],
+            }, query_embedding=embedding)
+        return item
+
+    def _line_boxes(self, chunk_ids: List[int]) -> dict:
+        if self.catalog is None or not chunk_ids:
+            return {}
+        return {c["chunk_idx"]: c["line_boxes"] for c in self.catalog.get_chunks(self.doc_name, chunk_ids)}
+
+    @staticmethod
+    def _cached(question: str, hit: dict) -> dict:
+        return {
+            "question": question,
+            "result": hit["result"],
+            "evidence": hit["evidence"],
+            "chunk_ids": hit["chunk_ids"],
+            "highlights": hit.get("highlights", []),
+            "context_chunk_count": hit["context_chunk_count"],
+            "cached": True,
+            "cache_similarity": hit["cache_similarity"],
+        }
+
+    async def _answer_single(self, idx, question, hit, embedding, semaphore):
+        context, metadata = self.vec_db.build_context([hit])
+        async with semaphore:
+            self.llm_calls += 1
+            answer = await self.assistant.aextract_from_document(question, context)
+        return idx, self._result(question, answer, metadata, embedding)
+
+    async def _answer_group(self, group, questions, hits, embeddings, semaphore):
+        if len(group) == 1:
+            idx = group[0]
+            return [await self._answer_single(idx, questions[idx], hits[idx], embeddings[idx], semaphore)]
+        context, metadata = self.vec_db.build_context([hits[i] for i in group], token_budget=self.context_token_budget)
+        async with semaphore:
+            self.llm_calls += 1
+            try:
+                answers = await self.assistant.aextract_batch([questions[i] for i in group], context)
+            except Exception as e:
+                logger.warning("Packed LLM call for %d questions failed (%s); answering them individually",
+                               len(group), e)
+                self.packed_fallbacks += 1
+                answers = {}
+        out = []
+        missing = []
+        for pos, idx in enumerate(group):
+            if pos in answers:
+                out.append((idx, self._result(questions[idx], answers[pos], metadata, embeddings[idx])))
+            else:
+                missing.append(idx)
+        # Questions the packed call skipped fall back to their own call
+        out.extend(await asyncio.gather(*[
+            self._answer_single(idx, questions[idx], hits[idx], embeddings[idx], semaphore) for idx in missing
+        ]))
+        return out
+
+    async def run(self, questions: List[str], mode: str = "packed", max_concurrency: Optional[int] = 4) -> List[dict]:
+        results: List[Optional[dict]] = [None] * len(questions)
+        cache = get_answer_cache()
+
+        pending = []
+        for idx, question in enumerate(questions):
+            hit = cache.get(*self.cache_scope, question) if self.cache_scope else None
+            if hit:
+                results[idx] = self._cached(question, hit)
+            else:
+                pending.append(idx)
+        if not pending:
+            return results
+
+        # One batched forward pass for all uncached questions
+        matrix = await get_executor("vector").run(self.vec_db.get_query_embeddings, [questions[i] for i in pending])
+        embeddings = {idx: matrix[pos] for pos, idx in enumerate(pending)}
+
+        if self.cache_scope:
+            still_pending = []
+            for idx in pending:
+                hit = cache.get_similar(*self.cache_scope, embeddings[idx])
+                if hit:
+                    results[idx] = self._cached(questions[idx], hit)
+                else:
+                    cache.record_miss()
+                    still_pending.append(idx)
+            pending = still_pending
+            if not pending:
+                return results
+
+        # One Chroma call retrieves for every question
+        per_query = await get_executor("vector").run(
+            self.vec_db.query_many, self.doc_name, [embeddings[i] for i in pending], self.k
+        )
+        hits = {idx: per_query[pos] for pos, idx in enumerate(pending)}
+
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or 1))
+        if mode == "parallel":
+            tasks = [self._answer_single(idx, questions[idx], hits[idx], embeddings[idx], semaphore) for idx in pending]
+            answered = await asyncio.gather(*tasks)
+        else:
+            groups = self.group_questions(pending, hits)
+            nested = await asyncio.gather(*[
+                self._answer_group(group, questions, hits, embeddings, semaphore) for group in groups
+            ])
+            answered = [pair for group_result in nested for pair in group_result]
+
+        for idx, item in answered:
+            results[idx] = item
+        return results
+
+
+__all__ = ["BatchQueryRunner"]
@@ -0,0 +1,197 @@
+"""SQLite catalog of chunk metadata, independent of the embedding model.
+
+Ingestion writes one row per chunk (text, header, page, merged bbox and the
+boxes of its lines) keyed by (doc_name, chunk_idx) and indexed by page.
+Highlighting reads geometry from here without loading SentenceTransformer or
+opening the vector store. The extracted text of every page is kept too, so
+it can be paged through (``GET /documents/{doc_name}/pages``) instead of
+being returned whole by /process-pdf.
+
+Line geometry is packed per chunk: ``line_rects`` holds 4 float32 values per
+line and ``line_ends`` the int32 end offset of each line in the chunk text
+(lines are joined with one space), so line texts come back without storing
+them twice.
+"""
+from __future__ import annotations
+import json
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    doc_name   TEXT    NOT NULL,
+    chunk_idx  INTEGER NOT NULL,
+    page       INTEGER,
+    header     TEXT    NOT NULL DEFAULT '',
+    text       TEXT    NOT NULL DEFAULT '',
+    bbox       TEXT,
+    line_rects BLOB,
+    line_ends  BLOB,
+    PRIMARY KEY (doc_name, chunk_idx)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS chunks_by_page ON chunks (doc_name, page);
+CREATE TABLE IF NOT EXISTS pages (
+    doc_name TEXT    NOT NULL,
+    page     INTEGER NOT NULL,
+    text     TEXT    NOT NULL DEFAULT '',
+    PRIMARY KEY (doc_name, page)
+) WITHOUT ROWID;
+"""
+
+_COLUMNS = "doc_name, chunk_idx, page, header, text, bbox, line_rects, line_ends"
+_PLACEHOLDERS = ", ".join("?" * len(_COLUMNS.split(",")))
+
+
+def pack_lines(text: str, line_boxes: List[dict]) -> Tuple[bytes, bytes]:
+    """(line_rects, line_ends) blobs for a chunk whose text is its line texts joined by spaces."""
+    rects, ends = array("f"), array("i")
+    pos = 0
+    for line in line_boxes:
+        bbox = line.get("bbox") or [0, 0, 0, 0]
+        rects.extend(float(v) for v in bbox[:4])
+        pos += len(line.get("text") or "")
+        ends.append(min(pos, len(text)))
+        pos += 1
+    return rects.tobytes(), ends.tobytes()
+
+
+def unpack_lines(text: str, line_rects: Optional[bytes], line_ends: Optional[bytes]) -> List[dict]:
+    """Inverse of pack_lines: [{'text', 'bbox'}] per line."""
+    if not line_rects:
+        return []
+    rects, ends = array("f"), array("i")
+    rects.frombytes(line_rects)
+    ends.frombytes(line_ends or b"")
+    lines, start = [], 0
+    for i in range(len(rects) // 4):
+        end = ends[i] if i < len(ends) else len(text)
+        lines.append({"text": text[start:end], "bbox": [round(v, 2) for v in rects[i * 4:i * 4 + 4]]})
+        start = end + 1
+    return lines
+
+
+class ChunkCatalog:
+    """Thread-safe access to the catalog (one SQLite connection per thread, WAL mode)."""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(row) -> dict:
+        doc_name, chunk_idx, page, header, text, bbox, line_rects, line_ends = row
+        return {
+            "source": doc_name,
+            "chunk_idx": chunk_idx,
+            "page": page,
+            "header": header,
+            "text": text,
+            "bbox": json.loads(bbox) if bbox else None,
+            "line_boxes": unpack_lines(text, line_rects, line_ends),
+        }
+
+    @staticmethod
+    def _to_rows(doc_name: str, chunks: Iterable[dict]) -> list:
+        rows = []
+        for c in chunks:
+            text = c.get("text") or ""
+            line_rects, line_ends = pack_lines(text, c.get("line_boxes") or []) if c.get("line_boxes") else (None, None)
+            rows.append((doc_name, c["chunk_idx"], c.get("page"), c.get("header") or "", text,
+                         json.dumps(c["bbox"]) if c.get("bbox") is not None else None, line_rects, line_ends))
+        return rows
+
+    def replace_document(self, doc_name: str, chunks: Iterable[dict]):
+        """Store all chunks of doc_name, replacing any previous ingestion, in one transaction.
+
+        Each chunk: {chunk_idx, page, header, text, bbox, line_boxes}.
+        """
+        rows = self._to_rows(doc_name, chunks)
+        with self._conn() as conn:
+            conn.execute("DELETE FROM chunks WHERE doc_name = ?", (doc_name,))
+            conn.executemany(f"INSERT INTO chunks ({_COLUMNS}) VALUES ({_PLACEHOLDERS})", rows)
+
+    def add_chunks(self, doc_name: str, chunks: Iterable[dict]):
+        """Insert or update individual chunks (used to backfill from the vector store)."""
+        rows = self._to_rows(doc_name, chunks)
+        with self._conn() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO chunks ({_COLUMNS}) VALUES ({_PLACEHOLDERS})", rows)
+
+    def get_chunks(self, doc_name: str, chunk_ids: List[int]) -> List[dict]:
+        """Chunks of doc_name with the given indices (missing ones are skipped), in index order."""
+        ids = sorted({int(c) for c in chunk_ids})
+        if not ids:
+            return []
+        placeholders = ",".join("?" * len(ids))
+        rows = self._conn().execute(
+            f"SELECT {_COLUMNS} FROM chunks WHERE doc_name = ? AND chunk_idx IN ({placeholders}) ORDER BY chunk_idx",
+            (doc_name, *ids),
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def chunks_on_page(self, doc_name: str, page: int) -> List[dict]:
+        rows = self._conn().execute(
+            f"SELECT {_COLUMNS} FROM chunks WHERE doc_name = ? AND page = ? ORDER BY chunk_idx",
+            (doc_name, page),
+        ).fetchall()
+        return [self._row(r) for r in rows]
+
+    def has_document(self, doc_name: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM chunks WHERE doc_name = ? LIMIT 1", (doc_name,)).fetchone() is not None
+
+    def delete_document(self, doc_name: str) -> int:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM pages WHERE doc_name = ?", (doc_name,))
+            return conn.execute("DELETE FROM chunks WHERE doc_name = ?", (doc_name,)).rowcount
+
+    def replace_pages(self, doc_name: str, page_texts: List[str]):
+        """Store the extracted text of every page (0-based, in order), replacing any previous ingestion."""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM pages WHERE doc_name = ?", (doc_name,))
+            conn.executemany("INSERT INTO pages (doc_name, page, text) VALUES (?, ?, ?)",
+                             [(doc_name, i, text) for i, text in enumerate(page_texts)])
+
+    def page_count(self, doc_name: str) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM pages WHERE doc_name = ?", (doc_name,)).fetchone()[0]
+
+    def get_pages(self, doc_name: str, offset: int = 0, limit: Optional[int] = None) -> List[dict]:
+        """[{page, text}] from page offset on, at most limit pages."""
+        rows = self._conn().execute(
+            "SELECT page, text FROM pages WHERE doc_name = ? AND page >= ? ORDER BY page LIMIT ?",
+            (doc_name, offset, -1 if limit is None else limit),
+        ).fetchall()
+        return [{"page": page, "text": text} for page, text in rows]
+
+
+_catalogs = {}
+_catalog_lock = threading.Lock()
+
+
+def get_chunk_catalog(path: Optional[str] = None) -> ChunkCatalog:
+    """Process-wide catalog at path (default settings.catalog_path)."""
+    if path is None:
+        from settings import settings
+        path = settings.catalog_path
+    path = str(path)
+    with _catalog_lock:
+        if path not in _catalogs:
+            _catalogs[path] = ChunkCatalog(path)
+        return _catalogs[path]
+
+
+__all__ = ["ChunkCatalog", "get_chunk_catalog", "pack_lines", "unpack_lines"]
@@ -0,0 +1,153 @@
+"""Token-budget-aware context packing for the LLM prompt.
+
+Retrieved chunks are de-duplicated, ranked by retrieval distance and packed
+greedily into a token budget measured with the target model's tokenizer.
+The packed context is emitted in document order with a compact citation
+format; headers are written once per run of chunks instead of per chunk:
+
+    DOC_NAME Certificate-BAM-A001.pdf
+    ## Certified Values
+    [chunk_3] Lead 12.5 mg/kg ...
+    [chunk_4] Cadmium ...
+"""
+from __future__ import annotations
+import os
+import threading
+from typing import Callable, List, Tuple
+
+from utils.evidence import parse_bbox
+
+_tokenizers = {}
+_tokenizer_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) used when no tokenizer is configured."""
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+def get_token_counter(tokenizer_name: str = "") -> Tuple[Callable[[str], int], str]:
+    """Return (count_fn, tokenizer_label) for tokenizer_name.
+
+    tokenizer_name may be a path to a tokenizer.json or a Hugging Face repo id
+    (loaded with the `tokenizers` package). Falls back to estimate_tokens.
+    """
+    if not tokenizer_name:
+        return estimate_tokens, "estimate"
+    with _tokenizer_lock:
+        if tokenizer_name not in _tokenizers:
+            try:
+                from tokenizers import Tokenizer
+                if os.path.exists(tokenizer_name):
+                    _tokenizers[tokenizer_name] = Tokenizer.from_file(tokenizer_name)
+                else:
+                    _tokenizers[tokenizer_name] = Tokenizer.from_pretrained(tokenizer_name)
+            except Exception as e:
+                print(f"Could not load tokenizer '{tokenizer_name}' ({e}); using length estimate")
+                _tokenizers[tokenizer_name] = None
+        tokenizer = _tokenizers[tokenizer_name]
+    if tokenizer is None:
+        return estimate_tokens, "estimate"
+
+    def count(text: str) -> int:
+        return len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+    return count, tokenizer_name
+
+
+def collect_hits(hit_dicts_list) -> List[dict]:
+    """Flatten Chroma query results into unique chunks, keeping the best distance per chunk."""
+    best = {}
+    for hit_dict in hit_dicts_list:
+        if not hit_dict or not hit_dict.get('documents'):
+            continue
+        docs = hit_dict['documents'][0]
+        metadatas = hit_dict['metadatas'][0] if hit_dict.get('metadatas') else [{}] * len(docs)
+        distances = hit_dict['distances'][0] if hit_dict.get('distances') else [None] * len(docs)
+        for doc, metadata, distance in zip(docs, metadatas, distances):
+            key = (metadata.get('source'), metadata.get('chunk_idx'))
+            previous = best.get(key)
+            if previous is not None and (distance is None or (previous['distance'] is not None and previous['distance'] <= distance)):
+                continue
+            best[key] = {'text': doc or '', 'metadata': metadata, 'distance': distance}
+    return list(best.values())
+
+
+class ContextBuilder:
+    """Pack retrieved chunks into a token budget."""
+
+    def __init__(self, token_budget: int, count_tokens: Callable[[str], int] = estimate_tokens,
+                 tokenizer_label: str = "estimate"):
+        self.token_budget = token_budget
+        self.count_tokens = count_tokens
+        self.tokenizer_label = tokenizer_label
+
+    @classmethod
+    def from_settings(cls, settings):
+        count, label = get_token_counter(settings.context_tokenizer)
+        return cls(settings.context_token_budget, count, label)
+
+    @staticmethod
+    def _body(text: str, header: str) -> str:
+        body = text.strip()
+        # Chunk text starts with its header line; the header is emitted separately
+        if header and body.startswith(header):
+            body = body[len(header):].lstrip(' :\n')
+        return ' '.join(body.split())
+
+    def build(self, hit_dicts_list) -> Tuple[str, List[dict], dict]:
+        """Return (context, metadata_of_packed_chunks, stats)."""
+        hits = collect_hits(hit_dicts_list)
+        ranked = sorted(hits, key=lambda h: (h['distance'] is None, h['distance'] or 0.0))
+
+        packed = []
+        used = 0
+        charged = set()  # doc/header lines already paid for
+        for hit in ranked:
+            md = hit['metadata']
+            source = md.get('source', 'Unknown')
+            header = (md.get('header') or '').strip()
+            line = f"[chunk_{md.get('chunk_idx')}] {self._body(hit['text'], header)}\n"
+            # Charge doc/header lines the first time they are needed so the final context stays within budget
+            extra = [k for k in (('doc', source), ('header', source, header)) if k not in charged and k[-1]]
+            cost = self.count_tokens(line) + sum(
+                self.count_tokens(f"DOC_NAME {source}\n" if k[0] == 'doc' else f"## {header}\n") for k in extra
+            )
+            if self.token_budget and used + cost > self.token_budget:
+                continue  # a smaller, lower-ranked chunk may still fit
+            used += cost
+            charged.update(extra)
+            packed.append((hit, header, line))
+
+        # Emit in document order so consecutive chunks can share one header line
+        packed.sort(key=lambda p: (str(p[0]['metadata'].get('source')), p[0]['metadata'].get('chunk_idx') or 0))
+        parts = []
+        metadata = []
+        current_source = current_header = None
+        for hit, header, line in packed:
+            md = hit['metadata']
+            source = md.get('source', 'Unknown')
+            if source != current_source:
+                parts.append(f"DOC_NAME {source}\n")
+                current_source, current_header = source, None
+            if header and header != current_header:
+                parts.append(f"## {header}\n")
+            current_header = header
+            parts.append(line)
+            md_copy = md.copy()
+            md_copy['bbox'] = parse_bbox(md.get('bbox')) or []
+            md_copy['distance'] = hit['distance']
+            metadata.append(md_copy)
+
+        context = ''.join(parts)
+        stats = {
+            "chunks_retrieved": len(hits),
+            "chunks_packed": len(packed),
+            "context_tokens": self.count_tokens(context),
+            "token_budget": self.token_budget,
+            "tokenizer": self.tokenizer_label,
+        }
+        return context, metadata, stats
+
+
+__all__ = ["ContextBuilder", "collect_hits", "estimate_tokens", "get_token_counter"]
@@ -0,0 +1,253 @@
+"""Embedding sidecar: one SentenceTransformer shared by several API worker processes.
+
+With ``uvicorn --workers N`` every worker would load its own copy of the
+model (and torch), multiplying RSS. Instead one sidecar process loads it and
+the workers send texts over a Unix socket:
+
+    python -m core.embedding_service --socket /tmp/agentqi-embed.sock
+    EMBEDDING_SOCKET=/tmp/agentqi-embed.sock uvicorn main:app --workers 4
+
+Requests arriving within ``max_wait_ms`` of each other are encoded as one
+batch (up to ``max_batch`` texts), so concurrent queries from all workers
+share forward passes. EmbeddingClient has the ``encode`` signature VecDB
+uses, and ``core.vec_db.get_embedding_model`` returns one when
+``settings.embedding_socket`` is set.
+
+Wire format, both directions: 4-byte big-endian length + JSON header.
+Requests: ``{"model": name, "texts": [...]}`` or ``{"op": "stats"}``.
+Responses: ``{"shape": [n, dim], "dtype": "float32"}`` followed by the raw
+array bytes, or ``{"error": "..."}``.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+_LENGTH = struct.Struct(">I")
+
+
+def _frame(header: dict) -> bytes:
+    data = json.dumps(header).encode("utf-8")
+    return _LENGTH.pack(len(data)) + data
+
+
+class EmbeddingServiceError(RuntimeError):
+    pass
+
+
+class EmbeddingServer:
+    def __init__(self, model, model_name: str, socket_path: str, max_batch: int = 64, max_wait_ms: float = 5.0):
+        self.model = model
+        self.model_name = model_name
+        self.socket_path = socket_path
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait_ms / 1000
+        self.dim = None
+        self.requests = 0
+        self.batches = 0
+        self.texts = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._writers = set()
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        embeddings = self.model.encode(texts, convert_to_numpy=True, batch_size=self.max_batch,
+                                       show_progress_bar=False)
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            count = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while count < self.max_batch:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                count += len(item[0])
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                # one encode at a time: torch already uses the whole thread budget per call
+                embeddings = await asyncio.to_thread(self._encode, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.texts += len(texts)
+            offset = 0
+            for item_texts, future in batch:
+                if not future.done():
+                    future.set_result(embeddings[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    (length,) = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+                    request = json.loads(await reader.readexactly(length))
+                except asyncio.IncompleteReadError:
+                    return
+                writer.write(await self._respond(request))
+                await writer.drain()
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, request: dict) -> bytes:
+        if request.get("op") == "stats":
+            return _frame(self.stats())
+        if request.get("model") not in (None, self.model_name):
+            return _frame({"error": f"Sidecar serves {self.model_name}, not {request['model']}"})
+        texts = request.get("texts") or []
+        self.requests += 1
+        if not texts:
+            return _frame({"shape": [0, self.dim], "dtype": "float32"})
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((texts, future))
+        try:
+            embeddings = await future
+        except Exception as e:
+            return _frame({"error": f"{type(e).__name__}: {e}"})
+        return _frame({"shape": list(embeddings.shape), "dtype": "float32"}) + embeddings.tobytes()
+
+    def stats(self) -> dict:
+        return {"model": self.model_name, "dim": self.dim, "requests": self.requests, "batches": self.batches,
+                "texts": self.texts, "max_batch": self.max_batch, "max_wait_ms": self.max_wait * 1000}
+
+    async def serve(self, ready: Optional[threading.Event] = None):
+        """Serve until cancelled. ready, if given, is set once the socket accepts connections."""
+        self.dim = self._encode(["warmup"]).shape[1]  # also loads the lazy parts of the model
+        self._queue = asyncio.Queue()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # left over from a previous run
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        batcher = asyncio.create_task(self._batcher())
+        print(f"Embedding sidecar serving {self.model_name} (dim {self.dim}) on {self.socket_path}")
+        if ready is not None:
+            ready.set()
+        try:
+            await asyncio.Future()  # until cancelled
+        finally:
+            batcher.cancel()
+            server.close()
+            # workers keep their connections open; close them rather than wait for them
+            for writer in list(self._writers):
+                writer.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+
+class EmbeddingClient:
+    """Stands in for SentenceTransformer in VecDB: ``encode`` goes to the sidecar.
+
+    One connection per thread (the vector executor encodes from several
+    threads); a broken connection is reopened once, so a restarted sidecar
+    is picked up without restarting the workers.
+    """
+
+    def __init__(self, socket_path: str, model_name: Optional[str] = None, timeout: float = 120.0):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise EmbeddingServiceError(f"Embedding sidecar not reachable at {self.socket_path}: {e}") from e
+        return sock
+
+    @staticmethod
+    def _read(sock: socket.socket, n: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("Embedding sidecar closed the connection")
+            buf += chunk
+        return bytes(buf)
+
+    def _call(self, request: dict) -> Tuple[dict, Optional[bytes]]:
+        for attempt in (1, 2):
+            sock = getattr(self._local, "sock", None)
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                sock.sendall(_frame(request))
+                (length,) = _LENGTH.unpack(self._read(sock, _LENGTH.size))
+                header = json.loads(self._read(sock, length))
+                body = None
+                if "shape" in header:
+                    body = self._read(sock, int(np.prod(header["shape"])) * np.dtype(header["dtype"]).itemsize)
+                break
+            except (ConnectionError, socket.timeout, OSError):
+                sock.close()
+                self._local.sock = None
+                if attempt == 2:
+                    raise
+        if "error" in header:
+            raise EmbeddingServiceError(header["error"])
+        return header, body
+
+    def encode(self, sentences, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        """Same shapes as SentenceTransformer.encode: (dim,) for a string, (n, dim) for a list."""
+        single = isinstance(sentences, str)
+        header, body = self._call({"model": self.model_name, "texts": [sentences] if single else list(sentences)})
+        embeddings = np.frombuffer(body, dtype=header["dtype"]).reshape(header["shape"])
+        return embeddings[0] if single else embeddings
+
+    def stats(self) -> dict:
+        return self._call({"op": "stats"})[0]
+
+    def close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+
+__all__ = ["EmbeddingServer", "EmbeddingClient", "EmbeddingServiceError"]
+
+
+def main():
+    from settings import settings
+    from core.thread_budget import limit_torch_threads, total_threads
+
+    parser = argparse.ArgumentParser(description="Serve one embedding model to all API workers over a Unix socket")
+    parser.add_argument("--socket", default=settings.embedding_socket or "/tmp/agentqi-embed.sock")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2", help="Must match the model VecDB asks for")
+    parser.add_argument("--max-batch", type=int, default=settings.embedding_max_batch)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.embedding_max_wait_ms)
+    args = parser.parse_args()
+
+    # the only torch user in this process: it gets the whole thread budget
+    limit_torch_threads(total_threads(settings))
+    from sentence_transformers import SentenceTransformer
+    server = EmbeddingServer(SentenceTransformer(args.model), args.model, args.socket, args.max_batch,
+                             args.max_wait_ms)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
+
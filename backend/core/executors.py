@@ -0,0 +1,238 @@
+"""Sized executors per workload class, with admission control.
+
+- ``ocr``:    process pool (page rasterisation and Tesseract are CPU bound
+              and hold the GIL in places)
+- ``vector``: threads for SentenceTransformer ``encode`` and Chroma I/O
+- ``render``: threads for PyMuPDF work (annotated PDFs, overlays)
+
+Each executor admits at most ``workers + max_queue`` tasks. Past that,
+request handlers get ExecutorSaturated (main.py answers it with HTTP 503
+and Retry-After) instead of piling up behind a busy pool, while background
+jobs submit with ``admit=False`` and simply wait their turn. Queue wait and run times are
+recorded per executor for ``GET /api/v1/executors``.
+"""
+from __future__ import annotations
+import asyncio
+import contextvars
+import math
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+class ExecutorSaturated(Exception):
+    """All workers busy and the queue full; main.py answers it with 503 and Retry-After."""
+
+    def __init__(self, name: str, retry_after: int):
+        self.name = name
+        self.retry_after = retry_after
+        self.detail = f"Server busy ({name} workers saturated), retry later"
+        super().__init__(self.detail)
+
+
+def _timed_call(fn: Callable, submitted_at: float, args: tuple, kwargs: dict):
+    """Run fn and return (result, queue wait s, run time s); module level so process pools can pickle it."""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return result, started - submitted_at, time.time() - started
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, workers: int, max_queue: int, processes: bool = False,
+                 start_method: str = "spawn", samples: int = 512,
+                 initializer: Optional[Callable] = None, initargs: tuple = ()):
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.processes = processes
+        self.start_method = start_method
+        self.initializer = initializer  # runs once in every worker process/thread
+        self.initargs = initargs
+        self._pool = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self._waits = deque(maxlen=samples)
+        self._runs = deque(maxlen=samples)
+
+    @property
+    def pool(self):
+        # created on first use: a process pool costs start-up time and memory
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    if self.processes:
+                        self._pool = ProcessPoolExecutor(
+                            max_workers=self.workers, mp_context=multiprocessing.get_context(self.start_method),
+                            initializer=self.initializer, initargs=self.initargs)
+                    else:
+                        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name,
+                                                        initializer=self.initializer, initargs=self.initargs)
+        return self._pool
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free: queued work divided by workers, times the median run time."""
+        median_run = _percentile(list(self._runs), 0.5) or 1.0
+        return max(1, math.ceil(median_run * max(1, self.in_flight - self.workers + 1) / self.workers))
+
+    def _admit(self, count: int, admit: bool):
+        capacity = self.workers + self.max_queue
+        with self._lock:
+            # A batch larger than the whole queue (a long document) could never fit; it is admitted
+            # when nothing is waiting, so it takes the next free workers and later requests queue behind it.
+            oversized_ok = count > capacity and self.in_flight <= self.workers
+            if admit and self.in_flight + count > capacity and not oversized_ok:
+                self.rejected += 1
+                raise ExecutorSaturated(self.name, self.retry_after())
+            self.in_flight += count
+            self.submitted += count
+
+    def _done(self, future: Future):
+        with self._lock:
+            self.in_flight -= 1
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, wait, run = future.result()
+        with self._lock:
+            self.completed += 1
+            self._waits.append(wait)
+            self._runs.append(run)
+
+    def _submit_admitted(self, fn: Callable, args: tuple, kwargs: dict) -> Future:
+        if not self.processes:
+            # keep request-scoped context variables (e.g. timings) inside the worker thread
+            fn = _ContextBound(fn)
+        try:
+            inner = self.pool.submit(_timed_call, fn, time.time(), args, kwargs)
+        except BaseException:
+            with self._lock:
+                self.in_flight -= 1
+            raise
+        inner.add_done_callback(self._done)
+        outer = Future()  # resolves to fn's result only; cancelling it drops the task if still queued
+
+        def relay(f: Future):
+            try:
+                if f.cancelled():
+                    outer.cancel()
+                elif f.exception() is not None:
+                    outer.set_exception(f.exception())
+                else:
+                    outer.set_result(f.result()[0])
+            except InvalidStateError:
+                pass  # outer was cancelled by the caller
+
+        inner.add_done_callback(relay)
+        outer.add_done_callback(lambda f: f.cancelled() and inner.cancel())
+        return outer
+
+    def submit(self, fn: Callable, *args, admit: bool = True, **kwargs) -> Future:
+        """Concurrent future for fn(*args, **kwargs); raises ExecutorSaturated if admit and full."""
+        self._admit(1, admit)
+        return self._submit_admitted(fn, args, kwargs)
+
+    def submit_many(self, fn: Callable, arg_list: List[tuple], admit: bool = True) -> List[Future]:
+        """Submit fn once per args tuple, admitting the whole batch or none of it.
+
+        A batch larger than workers + max_queue is admitted when no task is waiting for a worker.
+        """
+        self._admit(len(arg_list), admit)
+        return [self._submit_admitted(fn, args, {}) for args in arg_list]
+
+    def call(self, fn: Callable, *args, admit: bool = False, **kwargs):
+        """Blocking call from a worker thread (background jobs wait instead of being rejected)."""
+        return self.submit(fn, *args, admit=admit, **kwargs).result()
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """Await fn(*args, **kwargs) on this executor; raises ExecutorSaturated when full."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits, runs = list(self._waits), list(self._runs)
+            stats = {
+                "kind": "process" if self.processes else "thread",
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queued": max(0, self.in_flight - self.workers),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+        for label, values in (("queue_wait_ms", waits), ("run_ms", runs)):
+            stats[label] = {q: round(v * 1000, 1) if v is not None else None
+                            for q, v in (("p50", _percentile(values, 0.5)), ("p95", _percentile(values, 0.95)),
+                                         ("max", max(values) if values else None))}
+        return stats
+
+
+class _ContextBound:
+    """Callable running fn inside a copy of the submitting thread's context."""
+
+    def __init__(self, fn: Callable):
+        self.fn = fn
+        self.context = contextvars.copy_context()
+
+    def __call__(self, *args, **kwargs):
+        return self.context.run(self.fn, *args, **kwargs)
+
+
+_executors: Dict[str, BoundedExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str, settings=None) -> BoundedExecutor:
+    """Process-wide executor for a workload class ("ocr", "vector" or "render")."""
+    with _executors_lock:
+        if name not in _executors:
+            if settings is None:
+                from settings import settings
+            if name == "ocr":
+                from core.thread_budget import limit_ocr_threads, thread_budget
+                # worker processes cap OpenCV/Tesseract threads to their share of n_threads
+                initializer = limit_ocr_threads if settings.ocr_process_pool else None
+                _executors[name] = BoundedExecutor(
+                    "ocr", settings.ocr_workers, settings.ocr_max_queue,
+                    processes=settings.ocr_process_pool, start_method=settings.ocr_start_method,
+                    initializer=initializer, initargs=(thread_budget(settings)["ocr"],) if initializer else ())
+            elif name == "vector":
+                _executors[name] = BoundedExecutor("vector", settings.vector_workers, settings.vector_max_queue)
+            elif name == "render":
+                _executors[name] = BoundedExecutor("render", settings.render_workers, settings.render_max_queue)
+            else:
+                raise KeyError(f"Unknown executor '{name}'")
+        return _executors[name]
+
+
+def executor_stats() -> dict:
+    with _executors_lock:
+        executors = dict(_executors)
+    return {name: ex.stats() for name, ex in executors.items()}
+
+
+def shutdown_executors():
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for ex in executors:
+        ex.shutdown()
+
+
+__all__ = ["BoundedExecutor", "ExecutorSaturated", "get_executor", "executor_stats", "shutdown_executors"]
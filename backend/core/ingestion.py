@@ -0,0 +1,152 @@
+"""PDF ingestion pipeline: OCR, chunking, embedding and indexing.
+
+Shared by the synchronous /process-pdf endpoint and the background ingestion
+jobs (core/jobs.py), which pass a JobReporter to record stage and page
+progress and to stop between pages when cancelled.
+
+Uploads are streamed in fixed-size chunks into a part file next to the
+stored original (``receive_upload``), hashing on the way, and ingestion reads
+that file: one disk write per upload and constant memory whatever the file
+size. Only after a successful ingestion does ``publish_upload`` move it over
+the stored original, so a failed or rejected re-upload leaves the viewer, the
+index and the answer-cache fingerprint on the previous version.
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import AsyncIterator, Tuple
+from urllib.parse import quote
+
+from core.answer_cache import document_fingerprint, forget_fingerprint, get_answer_cache, remember_fingerprint
+from core.chunk_catalog import get_chunk_catalog
+from core.executors import get_executor
+from core.vec_db import VecDB
+from utils.highlighting import ORIGINAL_DIR, annotated_prefix, get_annotated_cache
+from utils.metrics import DOCUMENTS_INGESTED, stage
+from utils.pdf_assets import hashed_url, precompress
+
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+
+def _write_chunk(out, digest, chunk: bytes):
+    out.write(chunk)
+    digest.update(chunk)
+
+
+async def receive_upload(chunks: AsyncIterator[bytes], doc_name: str) -> Tuple[str, str]:
+    """Stream an upload into a part file in ORIGINAL_DIR; returns (part_path, sha256)."""
+    os.makedirs(ORIGINAL_DIR, exist_ok=True)
+    fd, part_path = tempfile.mkstemp(prefix=".upload-", suffix=".part", dir=ORIGINAL_DIR)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as part:
+            async for chunk in chunks:
+                if chunk:
+                    # disk write and hashing off the event loop
+                    await asyncio.to_thread(_write_chunk, part, digest, chunk)
+    except BaseException:
+        discard_upload(part_path)
+        raise
+    sha = digest.hexdigest()
+    remember_fingerprint(part_path, sha)
+    return part_path, sha
+
+
+def publish_upload(part_path: str, doc_name: str, settings) -> str:
+    """Make an ingested part file the stored original ORIGINAL_DIR/doc_name; returns its path.
+
+    Identical content leaves the stored file (and its mtime) untouched.
+    """
+    stored_path = os.path.join(ORIGINAL_DIR, doc_name)
+    sha = document_fingerprint(part_path)
+    if document_fingerprint(stored_path) == sha:
+        discard_upload(part_path)
+    else:
+        os.replace(part_path, stored_path)
+        forget_fingerprint(part_path)
+        remember_fingerprint(stored_path, sha)
+    if settings.pdf_precompress:
+        precompress(stored_path)
+    return stored_path
+
+
+def discard_upload(part_path: str):
+    """Delete a part file that was not published (ingestion failed, was rejected or cancelled)."""
+    forget_fingerprint(part_path)
+    if os.path.exists(part_path):
+        os.remove(part_path)
+
+
+async def upload_chunks(file, chunk_size: int = UPLOAD_CHUNK_BYTES) -> AsyncIterator[bytes]:
+    """Read a FastAPI UploadFile chunk by chunk."""
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+def ingest_pdf(pdf_path: str, doc_name: str, settings, reporter=None, admit: bool = False) -> dict:
+    """Extract, chunk, embed and index one PDF; returns a summary of the document.
+
+    Pages go to the "ocr" executor and embedding/indexing to the "vector" one.
+    admit=True (request handlers) raises ExecutorSaturated when the OCR pool
+    cannot take the whole document; jobs pass False and wait instead.
+    """
+    if reporter is not None:
+        reporter.stage("ocr")
+    page_texts = []
+    with stage("extraction"):
+        from core.doc_ocr import OCRDocProcessor  # OpenCV, Tesseract: loaded with the first document
+        extracted_text, line_boxes = OCRDocProcessor(settings).get_text_with_boxes(
+            pdf_path, on_page=reporter.pages if reporter is not None else None,
+            executor=get_executor("ocr", settings), admit=admit, page_texts=page_texts)
+    if reporter is not None:
+        reporter.stage("loading_model")
+    vector = get_executor("vector", settings)
+    vec_db = vector.call(VecDB, settings=settings)
+    # Stages are the cancellation points; the last one ("indexing") comes before anything is written.
+    # The same content already indexed is skipped; changed content (re-upload) replaces the old chunks.
+    indexed = vector.call(vec_db.add_document, doc_name, line_boxes,
+                          on_stage=reporter.stage if reporter is not None else None,
+                          fingerprint=document_fingerprint(pdf_path))
+    catalog = get_chunk_catalog(settings.catalog_path)
+    if indexed or catalog.page_count(doc_name) == 0:
+        # The text itself is served page by page from the catalog, not returned here
+        catalog.replace_pages(doc_name, page_texts)
+    if indexed:
+        # Answers computed against a previous ingestion are no longer trustworthy
+        get_answer_cache().invalidate_document(doc_name)
+        get_annotated_cache().invalidate_prefix(annotated_prefix(doc_name))
+        DOCUMENTS_INGESTED.inc()
+    return {
+        "text_length": len(extracted_text.strip()),
+        "document_name": doc_name,
+        "page_count": len(page_texts),
+        "line_boxes_count": len(line_boxes),
+        "pages_url": f"/api/v1/documents/{quote(doc_name)}/pages",
+    }
+
+
+def ingest_job(params: dict, reporter) -> dict:
+    """Job handler for kind "ingest": params {"pdf_path", "doc_name"}, pdf_path a received part file."""
+    from settings import settings
+    doc_name = params["doc_name"]
+    result = ingest_pdf(params["pdf_path"], doc_name, settings, reporter)
+    stored_path = publish_upload(params["pdf_path"], doc_name, settings)
+    result.update({
+        "filename": doc_name,
+        "stored_path": stored_path,
+        "pdf_url": hashed_url("/pdfs/original", ORIGINAL_DIR, doc_name),
+    })
+    return result
+
+
+def discard_job_upload(job: dict):
+    """on_finished hook: remove the part file of a job that failed or was cancelled before publishing it."""
+    path = (job or {}).get("params", {}).get("pdf_path")
+    if path:
+        discard_upload(path)
+
+
+__all__ = ["ingest_pdf", "ingest_job", "receive_upload", "publish_upload", "discard_upload", "discard_job_upload",
+           "upload_chunks", "UPLOAD_CHUNK_BYTES"]
@@ -0,0 +1,348 @@
+"""Background jobs persisted in SQLite (used for PDF ingestion).
+
+Submitting inserts a ``queued`` row and returns at once; a fixed number of
+worker threads run the jobs. Handlers report their stage and page progress
+through a JobReporter, which is also where cancellation is noticed (between
+pages and stages). On start-up, jobs left ``queued`` or ``running`` by a
+previous process are queued again, so nothing submitted is lost on restart.
+
+Several processes (``uvicorn --workers N``) may share one job store. A
+running job records its owner (host:pid) and the owner's queue refreshes
+``heartbeat_at`` every ``heartbeat`` seconds; only running jobs whose
+heartbeat is older than ``stale_after`` (or whose owner process on this host
+is gone) are taken over, so a starting worker never requeues the jobs
+another live worker is running.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+
+from utils.metrics import JOBS_REQUEUED
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    stage       TEXT,
+    pages_done  INTEGER NOT NULL DEFAULT 0,
+    pages_total INTEGER,
+    params      TEXT NOT NULL,
+    result      TEXT,
+    error       TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    owner       TEXT,
+    heartbeat_at REAL,
+    created_at  REAL NOT NULL,
+    started_at  REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+"""
+
+
+def process_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _owner_gone(owner: Optional[str]) -> bool:
+    """True if owner is a process on this host that no longer exists."""
+    host, _, pid = (owner or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        return False
+    return False
+
+
+class JobCancelled(Exception):
+    """Raised inside a handler when its job was cancelled."""
+
+
+class JobStore:
+    """Job rows in SQLite (one connection per thread, WAL mode)."""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _job(row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def create(self, kind: str, params: dict) -> dict:
+        job_id = uuid.uuid4().hex
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, params, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, json.dumps(params), time.time()),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self._job(self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._conn() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def claim(self, job_id: str, owner: Optional[str] = None) -> Optional[dict]:
+        """Mark a queued job running for owner; None if it was cancelled (or claimed) meanwhile."""
+        now = time.time()
+        with self._conn() as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, owner = ?, heartbeat_at = ? "
+                "WHERE id = ? AND status = ?",
+                (RUNNING, now, owner, now if owner else None, job_id, QUEUED),
+            ).rowcount
+        return self.get(job_id) if claimed else None
+
+    def heartbeat(self, owner: str) -> int:
+        """Refresh heartbeat_at of the jobs owner is running."""
+        with self._conn() as conn:
+            return conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status = ?",
+                                (time.time(), owner, RUNNING)).rowcount
+
+    def request_cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel a queued job right away, or flag a running one for its handler."""
+        with self._conn() as conn:
+            conn.execute("UPDATE jobs SET status = ?, finished_at = ?, cancel_requested = 1 WHERE id = ? AND status = ?",
+                         (CANCELLED, time.time(), job_id, QUEUED))
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        row = self._conn().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def requeue_stale(self, stale_after: float, owner: Optional[str] = None) -> list:
+        """Queue running jobs whose owner stopped heartbeating; return their ids.
+
+        Jobs of a gone process on this host, and jobs recorded under owner (a
+        previous process that had this pid), are queued without waiting.
+        """
+        cutoff = time.time() - stale_after
+        with self._conn() as conn:
+            rows = conn.execute("SELECT id, owner, heartbeat_at FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            stale = [r["id"] for r in rows
+                     if r["heartbeat_at"] is None or r["heartbeat_at"] < cutoff
+                     or (owner is not None and r["owner"] == owner) or _owner_gone(r["owner"])]
+            for job_id in stale:
+                conn.execute("UPDATE jobs SET status = ?, stage = NULL, owner = NULL WHERE id = ? AND status = ?",
+                             (QUEUED, job_id, RUNNING))
+        return stale
+
+    def requeue_interrupted(self, stale_after: float, owner: Optional[str] = None) -> list:
+        """Queue jobs a previous process left running; return all queued ids, oldest first."""
+        self.requeue_stale(stale_after, owner)
+        rows = self._conn().execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall()
+        return [r[0] for r in rows]
+
+    def prune(self, older_than: float) -> int:
+        """Delete finished jobs that ended more than older_than seconds ago."""
+        placeholders = ",".join("?" * len(FINISHED))
+        with self._conn() as conn:
+            return conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+                (*FINISHED, time.time() - older_than),
+            ).rowcount
+
+    def counts(self) -> dict:
+        rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+
+class JobReporter:
+    """Handed to a job handler to record progress; raises JobCancelled once the job is cancelled."""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def check(self):
+        if self.store.cancel_requested(self.job_id):
+            raise JobCancelled(self.job_id)
+
+    def stage(self, name: str):
+        self.check()
+        logger.info("Job %s: %s", self.job_id, name)
+        self.store.update(self.job_id, stage=name)
+
+    def pages(self, done: int, total: int):
+        self.store.update(self.job_id, pages_done=done, pages_total=total)
+        self.check()
+
+
+class JobQueue:
+    """Runs persisted jobs on ``workers`` threads.
+
+    handlers maps a job kind to ``handler(params, reporter) -> result dict``.
+    on_finished(job), if given, runs after every job (also failed or cancelled
+    ones), e.g. to remove its uploaded file. A monitor thread refreshes the
+    heartbeat of this queue's running jobs every ``heartbeat`` seconds and
+    takes over jobs of other processes that went ``stale_after`` seconds
+    without one. A job claimed more than ``max_attempts`` times (its worker
+    kept dying while running it) is marked failed instead of run again.
+    """
+
+    def __init__(self, store: JobStore, handlers: Dict[str, Callable], workers: int = 1,
+                 on_finished: Optional[Callable[[dict], None]] = None, heartbeat: float = 10.0,
+                 stale_after: float = 60.0, max_attempts: int = 3):
+        self.store = store
+        self.handlers = handlers
+        self.workers = max(1, workers)
+        self.on_finished = on_finished
+        self.heartbeat = heartbeat
+        self.stale_after = stale_after
+        self.max_attempts = max(1, max_attempts)
+        self.owner = process_owner()
+        self._queue = queue.Queue()
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        for job_id in self.store.requeue_interrupted(self.stale_after, self.owner):
+            self._queue.put(job_id)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        monitor = threading.Thread(target=self._monitor, name="job-monitor", daemon=True)
+        monitor.start()
+        self._threads.append(monitor)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the workers after their current job; queued jobs stay queued in the store."""
+        self._stopping.set()
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _monitor(self):
+        while not self._stopping.wait(self.heartbeat):
+            try:
+                self.store.heartbeat(self.owner)
+                for job_id in self.store.requeue_stale(self.stale_after):
+                    logger.warning("Job %s: owner stopped responding, queued again", job_id)
+                    JOBS_REQUEUED.inc()
+                    self._queue.put(job_id)
+            except Exception:
+                logger.exception("Job monitor failed")
+
+    def submit(self, kind: str, params: dict) -> dict:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        job = self.store.create(kind, params)
+        self._queue.put(job["id"])
+        return job
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        job = self.store.request_cancel(job_id)
+        if job and job["status"] == CANCELLED and self.on_finished:
+            self.on_finished(job)
+        return job
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            # checked before claiming: on stop, jobs still in the in-memory queue stay queued in the store
+            if job_id is None or self._stopping.is_set():
+                return
+            job = self.store.claim(job_id, self.owner)
+            if job is None:
+                continue
+            if job["attempts"] > self.max_attempts:
+                self.store.update(job_id, status=FAILED, finished_at=time.time(),
+                                  error=f"Gave up after {self.max_attempts} interrupted attempts")
+                if self.on_finished:
+                    self.on_finished(self.store.get(job_id))
+                continue
+            self.run(job)
+
+    def run(self, job: dict):
+        reporter = JobReporter(self.store, job["id"])
+        try:
+            result = self.handlers[job["kind"]](job["params"], reporter)
+            self.store.update(job["id"], status=DONE, stage="done", result=result, finished_at=time.time())
+        except JobCancelled:
+            self.store.update(job["id"], status=CANCELLED, finished_at=time.time())
+        except Exception as e:
+            logger.exception("Job %s failed", job["id"])
+            self.store.update(job["id"], status=FAILED, error=str(e), finished_at=time.time())
+        if self.on_finished:
+            self.on_finished(self.store.get(job["id"]))
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "pending": self._queue.qsize(), "jobs": self.store.counts()}
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue(settings=None) -> JobQueue:
+    """Process-wide ingestion job queue configured from settings."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            if settings is None:
+                from settings import settings
+            from core.ingestion import discard_job_upload, ingest_job
+            store = JobStore(settings.jobs_path)
+            store.prune(settings.job_retention_days * 86400)
+            _job_queue = JobQueue(store, {"ingest": ingest_job}, workers=settings.ingest_workers,
+                                  heartbeat=settings.job_heartbeat_seconds, stale_after=settings.job_stale_seconds,
+                                  max_attempts=settings.job_max_attempts, on_finished=discard_job_upload)
+        return _job_queue
+
+
+__all__ = ["JobStore", "JobQueue", "JobReporter", "JobCancelled", "get_job_queue", "process_owner",
+           "QUEUED", "RUNNING", "DONE", "FAILED", "CANCELLED", "FINISHED"]
@@ -0,0 +1,77 @@
+"""Chat sessions for follow-up questions about the same document.
+
+Ollama returns the token ``context`` of every /api/generate call. When a
+follow-up question in the same session is answered from the same packed
+document context (same prompt prefix), the next call continues from those
+tokens with only the new question, so the instructions and the document are
+not prefilled again. Sessions remember which backend served them so the
+follow-up lands where the KV cache is warm.
+"""
+from __future__ import annotations
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class LLMSessionStore:
+    """Thread-safe LRU of session_id -> last generation state, with idle expiry."""
+
+    def __init__(self, max_entries: int = 256, ttl: float = 1800.0, max_tokens: int = 8192):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_tokens = max_tokens
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.restarted = 0
+
+    def get(self, session_id: str, prefix_hash: str) -> Optional[dict]:
+        """Previous turn of session_id if it was built on the same prompt prefix."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or time.monotonic() - entry["touched"] > self.ttl or entry["prefix_hash"] != prefix_hash:
+                self.restarted += 1
+                return None
+            self._entries.move_to_end(session_id)
+            self.reused += 1
+            return dict(entry)
+
+    def put(self, session_id: str, prefix_hash: str, context_tokens, backend_url: str = None):
+        """Remember the tokens of the latest turn; long conversations start over instead."""
+        with self._lock:
+            if not context_tokens or len(context_tokens) > self.max_tokens:
+                self._entries.pop(session_id, None)
+                return
+            self._entries[session_id] = {
+                "prefix_hash": prefix_hash,
+                "context": list(context_tokens),
+                "backend_url": backend_url,
+                "touched": time.monotonic(),
+            }
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_session_store = None
+
+
+def get_session_store() -> LLMSessionStore:
+    """Process-wide session store configured from settings."""
+    global _session_store
+    if _session_store is None:
+        from settings import settings
+        _session_store = LLMSessionStore(
+            max_entries=settings.llm_session_max_entries,
+            ttl=settings.llm_session_ttl,
+            max_tokens=settings.llm_session_max_tokens,
+        )
+    return _session_store
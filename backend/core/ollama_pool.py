@@ -0,0 +1,311 @@
+"""Load-balanced pool of Ollama backends.
+
+- Routing: least outstanding requests among backends whose circuit is not open.
+- Circuit breaker: ``failure_threshold`` consecutive failures (connect errors,
+  timeouts, 5xx) open a backend for ``cooldown`` seconds; afterwards one trial
+  request (half-open) decides whether it closes again.
+- Health checks: a background task probes every backend (GET /api/tags) so
+  dead nodes are opened, and recovered ones closed, without user traffic.
+- Failover: a failed request is retried once on another backend.
+- Hedging (optional): if a request is still running after the backend's p95
+  latency, the same request is sent to a second backend and the first
+  response wins; the loser is cancelled.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+import httpx
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class BackendUnavailable(Exception):
+    """No backend in the pool can take the request."""
+
+
+class Backend:
+    def __init__(self, url: str, window: int = 200):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.latencies = deque(maxlen=window)
+
+    def p95(self, min_samples: int = 10) -> Optional[float]:
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        p95 = self.p95()
+        return {
+            "url": self.url,
+            "state": self.state,
+            "outstanding": self.outstanding,
+            "consecutive_failures": self.failures,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class OllamaBackendPool:
+    def __init__(self, urls: List[str], client: httpx.AsyncClient = None, settings=None, failure_threshold: int = 3,
+                 cooldown: float = 30.0, health_interval: float = 15.0, hedge: bool = False,
+                 hedge_min_delay: float = 1.0):
+        if not urls:
+            raise ValueError("OllamaBackendPool needs at least one backend URL")
+        self.backends = [Backend(u) for u in urls]
+        self._client = client
+        self.settings = settings
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.health_interval = health_interval
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self._health_task = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is not None:
+            return self._client
+        from core.assistant import get_async_client  # shared client; imported late to avoid a cycle
+        if self.settings is None:
+            from settings import settings
+            self.settings = settings
+        return get_async_client(self.settings)
+
+    # -- routing / breaker -------------------------------------------------
+
+    def _available(self, backend: Backend) -> bool:
+        if backend.state == OPEN and time.monotonic() - backend.opened_at >= self.cooldown:
+            backend.state = HALF_OPEN
+        if backend.state == HALF_OPEN:
+            return not backend.trial_in_flight
+        return backend.state == CLOSED
+
+    def pick(self, exclude=(), prefer: str = None) -> Backend:
+        """Least busy available backend; ``prefer`` (a URL) wins while it is available."""
+        candidates = [b for b in self.backends if b not in exclude and self._available(b)]
+        if not candidates:
+            raise BackendUnavailable("No healthy Ollama backend available")
+        for backend in candidates:
+            if prefer and backend.url == prefer.rstrip('/'):
+                return backend
+        return min(candidates, key=lambda b: b.outstanding)
+
+    def _record_success(self, backend: Backend, elapsed: float = None):
+        backend.failures = 0
+        backend.state = CLOSED
+        if elapsed is not None:
+            backend.latencies.append(elapsed)
+
+    def _record_failure(self, backend: Backend):
+        backend.failures += 1
+        if backend.state == HALF_OPEN or backend.failures >= self.failure_threshold:
+            if backend.state != OPEN:
+                print(f"Ollama backend {backend.url} marked unavailable")
+            backend.state = OPEN
+            backend.opened_at = time.monotonic()
+
+    @staticmethod
+    def _is_failure(exc: BaseException = None, response: httpx.Response = None) -> bool:
+        if exc is not None:
+            return isinstance(exc, (httpx.TransportError, httpx.TimeoutException))
+        return response is not None and response.status_code >= 500
+
+    # -- requests ----------------------------------------------------------
+
+    async def _send(self, backend: Backend, path: str, json: dict) -> httpx.Response:
+        backend.outstanding += 1
+        trial = backend.state == HALF_OPEN
+        backend.trial_in_flight = backend.trial_in_flight or trial
+        started = time.monotonic()
+        try:
+            response = await self.client.post(f"{backend.url}{path}", json=json)
+        except BaseException as e:
+            if self._is_failure(exc=e):
+                self._record_failure(backend)
+            raise
+        finally:
+            backend.outstanding -= 1
+            if trial:
+                backend.trial_in_flight = False
+        if self._is_failure(response=response):
+            self._record_failure(backend)
+        else:
+            self._record_success(backend, time.monotonic() - started)
+        response.extensions["ollama_backend"] = backend.url
+        return response
+
+    async def _send_with_failover(self, path: str, json: dict, exclude=(), prefer: str = None) -> httpx.Response:
+        tried = list(exclude)
+        last_error = None
+        for _ in range(2):
+            try:
+                backend = self.pick(exclude=tried, prefer=prefer)
+            except BackendUnavailable:
+                break
+            tried.append(backend)
+            try:
+                response = await self._send(backend, path, json)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                last_error = e
+                continue
+            if response.status_code >= 500:
+                last_error = httpx.HTTPStatusError(
+                    f"{response.status_code} from {backend.url}", request=response.request, response=response)
+                continue
+            return response
+        if last_error is not None:
+            raise last_error
+        raise BackendUnavailable("No healthy Ollama backend available")
+
+    def _hedge_delay(self, backend: Backend) -> float:
+        p95 = backend.p95()
+        return max(self.hedge_min_delay, p95 or 0.0)
+
+    async def post(self, path: str, json: dict, prefer: str = None) -> httpx.Response:
+        """POST to the least-loaded (or preferred) backend, with failover and optional hedging."""
+        if not self.hedge or len(self.backends) < 2:
+            return await self._send_with_failover(path, json, prefer=prefer)
+
+        primary_backend = self.pick(prefer=prefer)
+        primary = asyncio.ensure_future(self._send(primary_backend, path, json))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self._hedge_delay(primary_backend))
+        except asyncio.CancelledError:
+            primary.cancel()
+            raise
+        if done:
+            if primary.exception() is None and primary.result().status_code < 500:
+                return primary.result()
+            # primary failed fast: plain failover to another backend
+            return await self._send_with_failover(path, json, exclude=[primary_backend])
+
+        try:
+            hedge_backend = self.pick(exclude=[primary_backend])
+        except BackendUnavailable:
+            return await primary
+        print(f"Hedging slow request on {primary_backend.url} to {hedge_backend.url}")
+        secondary = asyncio.ensure_future(self._send(hedge_backend, path, json))
+        pending = {primary, secondary}
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result().status_code < 500:
+                        return task.result()
+                    last_error = task.exception() or httpx.HTTPStatusError(
+                        f"{task.result().status_code}", request=task.result().request, response=task.result())
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @asynccontextmanager
+    async def stream(self, path: str, json: dict, prefer: str = None):
+        """Open a streaming POST on the least-loaded backend.
+
+        No hedging; failover happens only before the response is handed out.
+        """
+        tried = []
+        handed_out = False
+        while True:
+            backend = self.pick(exclude=tried, prefer=prefer)
+            tried.append(backend)
+            can_retry = len(tried) < 2 and any(self._available(b) for b in self.backends if b not in tried)
+            backend.outstanding += 1
+            started = time.monotonic()
+            try:
+                async with self.client.stream("POST", f"{backend.url}{path}", json=json) as response:
+                    if response.status_code >= 500:
+                        self._record_failure(backend)
+                        if can_retry:
+                            continue
+                    else:
+                        self._record_success(backend, time.monotonic() - started)
+                    response.extensions["ollama_backend"] = backend.url
+                    handed_out = True
+                    yield response
+                    return
+            except (httpx.TransportError, httpx.TimeoutException):
+                if handed_out:
+                    raise  # failed mid-stream: the caller already consumed part of it
+                self._record_failure(backend)
+                if not can_retry:
+                    raise
+            finally:
+                backend.outstanding -= 1
+
+    # -- health checks -----------------------------------------------------
+
+    async def check_health(self):
+        """Probe every backend once and update breaker state."""
+        async def probe(backend: Backend):
+            try:
+                response = await self.client.get(f"{backend.url}/api/tags", timeout=5.0)
+                healthy = response.status_code < 500
+            except (httpx.TransportError, httpx.TimeoutException):
+                healthy = False
+            if healthy:
+                if backend.state != CLOSED:
+                    print(f"Ollama backend {backend.url} is healthy again")
+                self._record_success(backend)
+            else:
+                backend.failures = max(backend.failures, self.failure_threshold - 1)
+                self._record_failure(backend)
+
+        await asyncio.gather(*(probe(b) for b in self.backends))
+
+    async def _health_loop(self):
+        while True:
+            try:
+                await self.check_health()
+            except Exception as e:
+                print(f"Ollama health check failed: {e}")
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        if self._health_task is None and self.health_interval > 0:
+            self._health_task = asyncio.ensure_future(self._health_loop())
+
+    async def stop(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def status(self) -> List[dict]:
+        return [b.snapshot() for b in self.backends]
+
+
+_pool = None
+
+
+def get_backend_pool(settings) -> OllamaBackendPool:
+    """Process-wide pool over settings.ollama_base_urls (or the single ollama_base_url)."""
+    global _pool
+    if _pool is None:
+        _pool = OllamaBackendPool(
+            settings.ollama_base_urls or [settings.ollama_base_url],
+            settings=settings,
+            failure_threshold=settings.llm_breaker_failures,
+            cooldown=settings.llm_breaker_cooldown,
+            health_interval=settings.llm_health_interval,
+            hedge=settings.llm_hedge_enabled,
+            hedge_min_delay=settings.llm_hedge_min_delay,
+        )
+    return _pool
+
+
+__all__ = ["OllamaBackendPool", "Backend", "BackendUnavailable", "get_backend_pool"]
@@ -0,0 +1,366 @@
+"""Spec-driven structured extraction.
+
+Field specs live in ``settings.extraction_specs_folder`` as JSON (or YAML when
+PyYAML is installed) files, one document type per file:
+
+    {
+      "name": "reference_material_certificate",
+      "description": "Certificate of a certified reference material",
+      "fields": [
+        {"name": "lead_mass_fraction", "type": "number", "unit": "mg/kg",
+         "description": "Certified mass fraction of lead",
+         "retrieval_hints": ["certified values", "Pb"], "keywords": ["Pb"]}
+      ]
+    }
+
+For a document, SpecExtractor plans one retrieval per distinct field query.
+All queries are embedded in one batch and retrieved with one Chroma call,
+and the results are cached per document. Fields are then answered in groups
+by concurrent LLM calls, each with a precompiled prompt prefix and JSON
+schema. Values are validated and coerced to their declared types, and the
+typed record is written under storage/extractions/.
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from core.executors import get_executor
+from utils.evidence import resolve_chunk_ids
+
+EXTRACTIONS_DIR = os.path.join("storage", "extractions")
+_PROMPT_PATH = os.path.join(os.path.dirname(__file__), "..", "prompts", "spec_prompt.txt")
+
+_JSON_TYPES = {"string": "string", "number": "number", "integer": "integer", "boolean": "boolean", "date": "string"}
+_DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%Y/%m/%d", "%B %d, %Y", "%d %B %Y", "%B %Y", "%m/%Y", "%Y-%m")
+
+
+class FieldSpec(BaseModel):
+    name: str
+    type: Literal["string", "number", "integer", "boolean", "date"] = "string"
+    unit: Optional[str] = None
+    description: str = ""
+    retrieval_hints: List[str] = Field(default_factory=list)
+    keywords: List[str] = Field(default_factory=list, description="Restrict retrieval to chunks containing one of these")
+
+    @property
+    def retrieval_query(self) -> str:
+        parts = [self.description or self.name.replace('_', ' ')] + self.retrieval_hints
+        return " ".join(p for p in parts if p).strip()
+
+
+class ExtractionSpec(BaseModel):
+    name: str
+    description: str = ""
+    fields: List[FieldSpec]
+
+
+class CompiledSpec:
+    """A spec with its field groups, prompt prefixes and JSON schemas built once."""
+
+    def __init__(self, spec: ExtractionSpec, fields_per_call: int, template: str):
+        self.spec = spec
+        self.fingerprint = hashlib.sha256(
+            (spec.model_dump_json() + template).encode('utf-8')
+        ).hexdigest()[:16]
+        self.groups = [spec.fields[i:i + fields_per_call] for i in range(0, len(spec.fields), fields_per_call)]
+        template = template.replace("{{", "{").replace("}}", "}")
+        self.prompts = [
+            template.replace("{spec_description}", spec.description or spec.name)
+                    .replace("{fields}", "\n".join(self._describe(f) for f in group))
+            for group in self.groups
+        ]
+        self.schemas = [self._schema(group) for group in self.groups]
+
+    @staticmethod
+    def _describe(field: FieldSpec) -> str:
+        unit = f" in {field.unit}" if field.unit else ""
+        return f"- {field.name} ({field.type}{unit}): {field.description}".rstrip(': ')
+
+    @staticmethod
+    def _schema(group: List[FieldSpec]) -> dict:
+        return {
+            "type": "object",
+            "properties": {
+                f.name: {
+                    "type": "object",
+                    "properties": {
+                        "value": {"type": [_JSON_TYPES[f.type], "null"]},
+                        "chunk_id": {"type": "array", "items": {"type": ["string", "integer"]}},
+                    },
+                    "required": ["value", "chunk_id"],
+                }
+                for f in group
+            },
+            "required": [f.name for f in group],
+        }
+
+
+def coerce_value(value, field_type: str):
+    """Validate/coerce an LLM value to field_type. Returns (value, error_or_None)."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None, None
+    try:
+        if field_type == "string":
+            return str(value).strip(), None
+        if field_type in ("number", "integer"):
+            if isinstance(value, bool):
+                raise ValueError("boolean is not a number")
+            if isinstance(value, str):
+                text = value.replace(' ', '').replace('\u00a0', '')
+                if ',' in text and '.' in text:
+                    text = text.replace(',', '')  # thousands separators
+                match = re.search(r'[-+]?\d+(?:[.,]\d+)?(?:[eE][-+]?\d+)?', text)
+                if not match:
+                    raise ValueError(f"no number in {value!r}")
+                value = match.group(0).replace(',', '.')
+            number = float(value)
+            if field_type == "integer":
+                if not number.is_integer():
+                    raise ValueError(f"{value!r} is not an integer")
+                return int(number), None
+            return number, None
+        if field_type == "boolean":
+            if isinstance(value, bool):
+                return value, None
+            text = str(value).strip().lower()
+            if text in ("true", "yes", "1"):
+                return True, None
+            if text in ("false", "no", "0"):
+                return False, None
+            raise ValueError(f"{value!r} is not a boolean")
+        if field_type == "date":
+            if isinstance(value, (date, datetime)):
+                return value.isoformat()[:10], None
+            text = str(value).strip()
+            for fmt in _DATE_FORMATS:
+                try:
+                    return datetime.strptime(text, fmt).date().isoformat(), None
+                except ValueError:
+                    continue
+            raise ValueError(f"unrecognised date {value!r}")
+    except (TypeError, ValueError) as e:
+        return None, str(e)
+    return None, f"unknown type {field_type}"
+
+
+def _load_spec_file(path: Path) -> ExtractionSpec:
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.suffix in (".yaml", ".yml"):
+            import yaml  # optional dependency, only needed for YAML specs
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+    data.setdefault("name", path.stem)
+    return ExtractionSpec(**data)
+
+
+class SpecRegistry:
+    """Loads and compiles specs from a folder, recompiling a file only when it changes."""
+
+    def __init__(self, folder, fields_per_call: int = 6):
+        self.folder = Path(folder)
+        self.fields_per_call = max(1, fields_per_call)
+        self._compiled: Dict[str, tuple] = {}  # path -> (mtime_ns, CompiledSpec, template)
+        self._lock = threading.Lock()
+
+    def _read_template(self) -> str:
+        with open(_PROMPT_PATH, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def load(self) -> Dict[str, CompiledSpec]:
+        if not self.folder.is_dir():
+            return {}
+        template = self._read_template()
+        specs = {}
+        with self._lock:
+            for path in sorted(self.folder.iterdir()):
+                if path.suffix not in (".json", ".yaml", ".yml"):
+                    continue
+                mtime = path.stat().st_mtime_ns
+                cached = self._compiled.get(str(path))
+                if cached is None or cached[0] != mtime or cached[2] != template:
+                    try:
+                        compiled = CompiledSpec(_load_spec_file(path), self.fields_per_call, template)
+                    except Exception as e:
+                        print(f"Skipping invalid extraction spec {path.name}: {e}")
+                        continue
+                    cached = (mtime, compiled, template)
+                    self._compiled[str(path)] = cached
+                specs[cached[1].spec.name] = cached[1]
+        return specs
+
+    def get(self, name: str) -> Optional[CompiledSpec]:
+        return self.load().get(name)
+
+
+class RetrievalCache:
+    """Small LRU of Chroma hit dicts keyed by (doc hash, query, k)."""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SpecExtractor:
+    def __init__(self, vec_db, assistant, retrieval_cache: RetrievalCache, k: int = 5,
+                 max_concurrency: int = 4, context_token_budget: int = 2048):
+        self.vec_db = vec_db
+        self.assistant = assistant
+        self.retrieval_cache = retrieval_cache
+        self.k = k
+        self.max_concurrency = max(1, max_concurrency)
+        self.context_token_budget = context_token_budget
+
+    def _retrieve(self, doc_name: str, doc_hash: str, fields: List[FieldSpec]) -> Dict[str, dict]:
+        """Hit dict per field name; identical queries are retrieved once and cached per document."""
+        hits_by_query = {}
+        missing = []
+        for f in fields:
+            key = (doc_hash or doc_name, f.retrieval_query, tuple(f.keywords), self.k)
+            cached = self.retrieval_cache.get(key)
+            if cached is not None:
+                hits_by_query[key] = cached
+            elif key not in missing:
+                missing.append(key)
+
+        if missing:
+            embeddings = self.vec_db.get_query_embeddings([key[1] for key in missing])
+            plain = [i for i, key in enumerate(missing) if not key[2]]
+            if plain:
+                per_query = self.vec_db.query_many(doc_name, embeddings[plain], self.k)
+                for i, hits in zip(plain, per_query):
+                    hits_by_query[missing[i]] = hits
+            for i, key in enumerate(missing):
+                if key[2]:
+                    hits = self.vec_db.query_by_keyword(doc_name, embeddings[i:i + 1], list(key[2]), n_results=self.k)
+                    hits_by_query[key] = hits
+            for key in missing:
+                self.retrieval_cache.put(key, hits_by_query[key])
+
+        return {
+            f.name: hits_by_query[(doc_hash or doc_name, f.retrieval_query, tuple(f.keywords), self.k)]
+            for f in fields
+        }
+
+    async def _extract_group(self, prompt_prefix, schema, group, hits, doc_name, semaphore):
+        context, metadata = await get_executor("vector").run(
+            self.vec_db.build_context, [hits[f.name] for f in group], token_budget=self.context_token_budget
+        )
+        async with semaphore:
+            try:
+                raw = await self.assistant.acall_llm(prompt_prefix.replace("{context}", context), response_format=schema)
+                error = None
+            except Exception as e:
+                raw, error = {}, f"LLM call failed: {e}"
+        record = {}
+        for f in group:
+            item = (raw or {}).get(f.name) or {}
+            if not isinstance(item, dict):
+                item = {"value": item, "chunk_id": []}
+            value, type_error = coerce_value(item.get("value"), f.type)
+            chunk_ids = resolve_chunk_ids({"chunk_id": item.get("chunk_id", [])}, metadata, doc_name)
+            record[f.name] = {
+                "value": value,
+                "type": f.type,
+                "unit": f.unit,
+                "chunk_ids": chunk_ids,
+                "valid": error is None and type_error is None,
+                "error": error or type_error,
+            }
+        return record
+
+    async def extract(self, compiled: CompiledSpec, doc_name: str, doc_hash: str = None) -> dict:
+        started = time.perf_counter()
+        hits = await get_executor("vector").run(self._retrieve, doc_name, doc_hash, compiled.spec.fields)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        groups = await asyncio.gather(*[
+            self._extract_group(prompt, schema, group, hits, doc_name, semaphore)
+            for prompt, schema, group in zip(compiled.prompts, compiled.schemas, compiled.groups)
+        ])
+        fields = {}
+        for group_record in groups:
+            fields.update(group_record)
+        return {
+            "doc_name": doc_name,
+            "doc_hash": doc_hash,
+            "spec": compiled.spec.name,
+            "spec_fingerprint": compiled.fingerprint,
+            "model": self.assistant.model,
+            "fields": {f.name: fields[f.name] for f in compiled.spec.fields},
+            "llm_calls": len(compiled.groups),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+
+def write_record(record: dict, out_dir: str = EXTRACTIONS_DIR) -> str:
+    """Persist a typed extraction record atomically; returns its path.
+
+    Names are reduced to their last path component so a doc_name like
+    ``../x`` cannot write outside out_dir; the temp file is unique per call
+    so concurrent extractions of the same document do not clobber it.
+    """
+    doc_name = os.path.basename(str(record["doc_name"]))
+    spec = os.path.basename(str(record["spec"]))
+    if doc_name in ("", ".", "..") or spec in ("", ".", ".."):
+        raise ValueError(f"Invalid record name: {record['doc_name']!r} / {record['spec']!r}")
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{doc_name}__{spec}.json")
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, prefix=f".{doc_name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(record, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+_registry = None
+_retrieval_cache = RetrievalCache()
+
+
+def get_spec_registry() -> SpecRegistry:
+    global _registry
+    if _registry is None:
+        from settings import settings
+        _registry = SpecRegistry(settings.extraction_specs_folder, settings.spec_fields_per_call)
+    return _registry
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    return _retrieval_cache
+
+
+__all__ = [
+    "FieldSpec", "ExtractionSpec", "CompiledSpec", "SpecRegistry", "SpecExtractor",
+    "RetrievalCache", "coerce_value", "write_record", "get_spec_registry", "get_retrieval_cache",
+]
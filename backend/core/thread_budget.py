@@ -0,0 +1,95 @@
+"""One CPU thread budget (``settings.n_threads``) shared by the native libraries.
+
+Torch (SentenceTransformer ``encode``), OpenCV (denoising) and Tesseract
+(OpenMP) each default to one thread per core *per call*. With several
+requests in flight that multiplies into far more runnable threads than
+cores. Every pool is sized so that, when all of its workers are busy, it
+uses the whole budget and no more:
+
+- torch:            n_threads // vector_workers per encode call
+- OpenCV / OpenMP:  n_threads // ocr_workers per page being OCR'd
+
+``apply_thread_budget`` runs in the API process at start-up and in every OCR
+worker process (as the pool initializer). OMP_THREAD_LIMIT is set in the
+environment, which the ``tesseract`` subprocesses started by pytesseract
+inherit.
+"""
+from __future__ import annotations
+import os
+import sys
+from typing import Optional
+
+# OpenMP/BLAS runtimes read these once, when first loaded (torch, numpy, tesseract)
+_OMP_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def total_threads(settings) -> int:
+    """The budget: settings.n_threads, or all cores when it is 0."""
+    return settings.n_threads or os.cpu_count() or 1
+
+
+def per_worker(total: int, concurrency: int) -> int:
+    """Threads for each of concurrency workers sharing total (at least 1)."""
+    return max(1, total // max(1, concurrency))
+
+
+def thread_budget(settings) -> dict:
+    """Threads per call for each library, from the budget and the executor sizes."""
+    total = total_threads(settings)
+    return {
+        "total": total,
+        "torch": per_worker(total, settings.vector_workers),
+        "ocr": per_worker(total, settings.ocr_workers),
+    }
+
+
+def limit_ocr_threads(threads: int):
+    """Cap OpenCV and Tesseract/OpenMP in this process (and the subprocesses it starts)."""
+    os.environ["OMP_THREAD_LIMIT"] = str(threads)
+    try:
+        import cv2
+    except ImportError:
+        return
+    cv2.setNumThreads(threads)
+
+
+def limit_torch_threads(threads: int):
+    """Cap torch intra-op threads; the environment covers a torch imported later, so this never imports it."""
+    for name in _OMP_ENV:
+        os.environ[name] = str(threads)
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        torch.set_num_threads(threads)
+
+
+def apply_thread_budget(settings=None, role: str = "api") -> dict:
+    """Apply the budget to this process.
+
+    role "api": the server process (torch for the vector executor; OpenCV too
+    when OCR runs on threads). role "ocr": an OCR worker process.
+    """
+    if settings is None:
+        from settings import settings
+    budget = thread_budget(settings)
+    if role == "ocr" or not settings.ocr_process_pool:
+        limit_ocr_threads(budget["ocr"])
+    if role == "api":
+        limit_torch_threads(budget["torch"])
+    return budget
+
+
+def current_threads() -> dict:
+    """Thread settings in effect in this process, for diagnostics."""
+    state = {"omp_thread_limit": os.environ.get("OMP_THREAD_LIMIT")}
+    # only libraries already loaded: diagnostics must not import them
+    cv2 = sys.modules.get("cv2")
+    if cv2 is not None:
+        state["cv2"] = cv2.getNumThreads()
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        state["torch"] = torch.get_num_threads()
+    return state
+
+
+__all__ = ["apply_thread_budget", "thread_budget", "per_worker", "total_threads",
+           "limit_ocr_threads", "limit_torch_threads", "current_threads"]
@@ -1,12 +1,53 @@
-import chromadb
-from chromadb.utils import embedding_functions
-from sentence_transformers import SentenceTransformer
 import os
 import sys
 from pathlib import Path
 import numpy as np
+import threading
+from typing import Optional
+from urllib.parse import urlsplit
 from utils.chunking import split_wordboxes_chunks
-import ast  # Add this import at the top
+from core.context_builder import ContextBuilder
+from core.chunk_catalog import get_chunk_catalog
+from utils.evidence import parse_bbox
+from utils.metrics import CHUNKS_EMBEDDED, stage
+
+# Embedding models and Chroma clients are expensive to create; share them per process.
+# chromadb and sentence_transformers (torch) are imported on first use, not with this module.
+_shared_lock = threading.Lock()
+_embedding_models = {}
+_chroma_clients = {}
+
+
+def get_embedding_model(name: str, socket_path: str = "") -> "SentenceTransformer":
+    """Return the process-wide SentenceTransformer for name (loaded once).
+
+    With socket_path (settings.embedding_socket) the model lives in the
+    embedding sidecar (core/embedding_service.py) and a client is returned.
+    """
+    with _shared_lock:
+        if name not in _embedding_models:
+            if socket_path:
+                from core.embedding_service import EmbeddingClient
+                _embedding_models[name] = EmbeddingClient(socket_path, name)
+            else:
+                from sentence_transformers import SentenceTransformer
+                _embedding_models[name] = SentenceTransformer(name)
+        return _embedding_models[name]
+
+
+def get_chroma_client(db_path: str, server_url: str = ""):
+    """Return the process-wide Chroma client: persistent at db_path, or over HTTP to server_url if set."""
+    key = server_url or db_path
+    with _shared_lock:
+        if key not in _chroma_clients:
+            import chromadb
+            if server_url:
+                url = urlsplit(server_url)
+                _chroma_clients[key] = chromadb.HttpClient(host=url.hostname, port=url.port or 8000,
+                                                           ssl=url.scheme == "https")
+            else:
+                _chroma_clients[key] = chromadb.PersistentClient(path=db_path)
+        return _chroma_clients[key]
 
 
 def concatenate_documents(hit_dicts_list):
@@ -32,11 +73,7 @@ def concatenate_documents(hit_dicts_list):
                 source = metadata.get('source', 'Unknown')
                 
                 # Convert bbox string back to list
-                bbox_str = metadata.get('bbox', '[]')
-                try:
-                    bbox = ast.literal_eval(bbox_str)
-                except (ValueError, SyntaxError):
-                    bbox = []
+                bbox = parse_bbox(metadata.get('bbox')) or []
                 
                 # Build standardized prefix
                 prefix = f"DOC_NAME {source} CHUNK_ID {chunk_idx}:"
@@ -53,16 +90,19 @@ def concatenate_documents(hit_dicts_list):
 
 class VecDB:
     def __init__(self, settings: "BaseSettings", dbpath: str = None, collection_name: str = "documents", embedding_model: str = "all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(embedding_model)
+        self.model = get_embedding_model(embedding_model, settings.embedding_socket)
         self.embedding_model = embedding_model
+        self.settings = settings
         
         # Use path from settings if not provided
         db_path = dbpath or settings.db_path
         
-        self.chroma_client = chromadb.PersistentClient(path=str(db_path))
+        self.chroma_client = get_chroma_client(str(db_path), settings.chroma_server_url)
         self.collection = self.chroma_client.get_or_create_collection(
             name=collection_name,
         )
+        self.context_builder = ContextBuilder.from_settings(settings) if settings.context_token_budget > 0 else None
+        self.last_context_stats = {}
 
     def document_exists(self, doc_name: str) -> bool:
         """Check if a document is already in the collection."""
@@ -72,27 +112,70 @@ class VecDB:
         except Exception:
             return False
 
-    def add_document(self, doc_name: str, line_boxes: list):
-        # Check if document already exists
-        if self.document_exists(doc_name):
+    def indexed_fingerprint(self, doc_name: str) -> Optional[str]:
+        """sha256 of the file doc_name was indexed from; None if not indexed, "" if indexed before it was recorded."""
+        try:
+            results = self.collection.get(where={"source": doc_name}, limit=1, include=["metadatas"])
+        except Exception:
+            return None
+        if not results['ids']:
+            return None
+        return (results['metadatas'][0] or {}).get("sha256", "")
+
+    def add_document(self, doc_name: str, line_boxes: list, on_stage=None, fingerprint: str = None) -> bool:
+        """Chunk, embed and store a document; on_stage(name), if given, is called before each step.
+
+        fingerprint is the sha256 of the source file. A document already
+        indexed from the same content is skipped; one indexed from other
+        content (a re-upload under the same name) is replaced. Without a
+        fingerprint any indexed document is skipped. Returns True if indexed.
+        """
+        on_stage = on_stage or (lambda name: None)
+        indexed = self.indexed_fingerprint(doc_name)
+        if indexed is not None and (fingerprint is None or indexed == fingerprint):
             print(f"Document '{doc_name}' already exists in the collection. Skipping.")
-            return
+            return False
 
-        chunks, headers = split_wordboxes_chunks(line_boxes)
-        embeddings = self.model.encode(
-            chunks['chunk_text'], convert_to_numpy=True, show_progress_bar=True, batch_size=5
-        )
+        on_stage("chunking")
+        with stage("chunking"):
+            chunks, headers = split_wordboxes_chunks(line_boxes)
+        on_stage("embedding")
+        with stage("embedding"):
+            embeddings = self.model.encode(
+                chunks['chunk_text'], convert_to_numpy=True, show_progress_bar=True, batch_size=5
+            )
+        CHUNKS_EMBEDDED.inc(len(chunks['chunk_text']))
         ids = [f"{doc_name}_{i}" for i in range(len(chunks['chunk_text']))]
         metadatas = [
-            {"source": doc_name, "chunk_idx": i, "header": headers[i], "bbox": str(chunks['bboxes'][i]), "page": chunks['pages'][i]}
+            {"source": doc_name, "chunk_idx": i, "header": headers[i], "bbox": str(chunks['bboxes'][i]), "page": chunks['pages'][i],
+             **({"sha256": fingerprint} if fingerprint else {})}
             for i in range(len(chunks["chunk_text"]))
         ]
-        self.collection.upsert(
-            ids=ids, documents=chunks['chunk_text'], embeddings=embeddings, metadatas=metadatas
-        )
+        on_stage("indexing")
+        with stage("indexing"):
+            if indexed is not None:
+                # content changed: drop every old chunk (the new version may have fewer)
+                print(f"Document '{doc_name}' changed since it was indexed. Re-indexing.")
+                self.collection.delete(where={"source": doc_name})
+            self.collection.upsert(
+                ids=ids, documents=chunks['chunk_text'], embeddings=embeddings, metadatas=metadatas
+            )
+            # Geometry and text also go to the catalog, so highlighting never needs the embedding model
+            get_chunk_catalog(self.settings.catalog_path).replace_document(doc_name, [
+                {"chunk_idx": i, "page": chunks['pages'][i], "header": headers[i], "text": chunks['chunk_text'][i],
+                 "bbox": chunks['bboxes'][i], "line_boxes": chunks['line_boxes'][i]}
+                for i in range(len(chunks["chunk_text"]))
+            ])
+        return True
 
     def get_query_embedding(self, query: str):
-        return self.model.encode(query, convert_to_numpy=True)
+        with stage("query_embedding"):
+            return self.model.encode(query, convert_to_numpy=True)
+
+    def get_query_embeddings(self, queries: list):
+        """Embed several queries in one batch (one forward pass instead of one per query)."""
+        with stage("query_embedding"):
+            return self.model.encode(queries, convert_to_numpy=True)
 
     def query(
         self,
@@ -104,14 +187,24 @@ class VecDB:
         if where_filter is None:
             where_filter = {"source": doc_name}
 
-        hits = self.collection.query(
-            query_embeddings=query_embedding,
-            where=where_filter,
-            n_results=n_results,
-            include=["documents", "metadatas", "distances"],
-        )
+        with stage("retrieval"):
+            hits = self.collection.query(
+                query_embeddings=query_embedding,
+                where=where_filter,
+                n_results=n_results,
+                include=["documents", "metadatas", "distances"],
+            )
         return hits
 
+    def query_many(self, doc_name: str, query_embeddings: np.ndarray, n_results: int = 5):
+        """Retrieve for several query embeddings in one Chroma call; returns one hit dict per query."""
+        hits = self.query(doc_name=doc_name, query_embedding=query_embeddings, n_results=n_results)
+        keys = ("ids", "documents", "metadatas", "distances")
+        return [
+            {key: [hits[key][i]] if hits.get(key) else None for key in keys}
+            for i in range(len(query_embeddings))
+        ]
+
     def query_by_keyword(
         self,
         doc_name: str,
@@ -127,26 +220,42 @@ class VecDB:
 
         where_doc = {"$or": search_list} if len(search_list) > 1 else search_list[0]
 
-        hits = self.collection.query(
-            query_embeddings=query_embedding,
-            where=where_filter,
-            n_results=n_results,
-            where_document=where_doc,
-            include=["documents", "metadatas", "distances"],
-        )
+        with stage("retrieval"):
+            hits = self.collection.query(
+                query_embeddings=query_embedding,
+                where=where_filter,
+                n_results=n_results,
+                where_document=where_doc,
+                include=["documents", "metadatas", "distances"],
+            )
         return hits
     
-    def get_context(self, query: str, doc_name: str, keywords: list = None):
-        q_emb = self.get_query_embedding(query)
+    def get_context(self, query: str, doc_name: str, keywords: list = None, query_embedding: np.ndarray = None,
+                    n_results: int = 5):
+        q_emb = query_embedding if query_embedding is not None else self.get_query_embedding(query)
         hit_dicts = []
 
         if keywords:
             hits = self.query_by_keyword(
-                doc_name=doc_name, query_embedding=q_emb, keywords=keywords
+                doc_name=doc_name, query_embedding=q_emb, keywords=keywords, n_results=n_results
             )
             hit_dicts.append(hits)
 
-        hit_dicts.append(self.query(doc_name=doc_name, query_embedding=q_emb))
+        hit_dicts.append(self.query(doc_name=doc_name, query_embedding=q_emb, n_results=n_results))
+
+        return self.build_context(hit_dicts)
+
+    def build_context(self, hit_dicts: list, token_budget: int = None):
+        """Turn query results into (context, metadata), packed into the token budget when enabled."""
+        if self.context_builder is None:
+            context, metadata = concatenate_documents(hit_dicts)
+            self.last_context_stats = {"chunks_packed": len(metadata)}
+            return context, metadata
 
-        context, metadata = concatenate_documents(hit_dicts)
+        # Pack by score into the token budget (see core/context_builder.py)
+        builder = self.context_builder
+        if token_budget is not None:
+            builder = ContextBuilder(token_budget, builder.count_tokens, builder.tokenizer_label)
+        with stage("context_packing"):
+            context, metadata, self.last_context_stats = builder.build(hit_dicts)
         return context, metadata
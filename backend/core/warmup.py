@@ -0,0 +1,107 @@
+"""Background warmup after start-up, and the readiness it reports.
+
+Heavy libraries are imported on first use, so the API process starts serving
+in about a second. The lifespan then runs these steps in the background and
+``GET /readyz`` answers 503 until all of them succeeded, so a load balancer
+only sends traffic once the first request no longer pays for them:
+
+- ``vector_db``:   import torch/sentence_transformers and chromadb, load the
+                   embedding model, open the collection, run one encode
+- ``ocr_workers``: start every OCR worker process (each imports OpenCV,
+                   pytesseract and PyMuPDF)
+- ``pdf``:         import PyMuPDF in the API process (highlighting)
+
+``GET /healthz`` (liveness) does not wait for any of this.
+"""
+from __future__ import annotations
+import asyncio
+import time
+from typing import Dict, Optional
+
+STEPS = ("vector_db", "ocr_workers", "pdf")
+
+
+def _load_vector_db(settings):
+    from core.vec_db import VecDB
+    VecDB(settings=settings).model.encode(["warmup"], convert_to_numpy=True, show_progress_bar=False)
+
+
+async def _start_ocr_workers(settings):
+    from core.doc_ocr import warm_worker
+    from core.executors import get_executor
+    ocr = get_executor("ocr", settings)
+    # submitted together, so the pool starts one process per worker instead of reusing the first
+    futures = ocr.submit_many(warm_worker, [()] * ocr.workers, admit=False)
+    await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+
+
+def _import_pdf():
+    import pymupdf  # noqa: F401
+
+
+class Warmup:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.steps: Dict[str, dict] = {name: {"status": "pending" if enabled else "skipped", "seconds": None}
+                                       for name in STEPS}
+        self.started_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return all(step["status"] in ("done", "skipped") for step in self.steps.values())
+
+    async def _step(self, name: str, run):
+        step = self.steps[name]
+        step["status"] = "running"
+        started = time.perf_counter()
+        try:
+            await run()
+            step["status"] = "done"
+        except Exception as e:
+            step["status"] = "failed"
+            step["error"] = f"{type(e).__name__}: {e}"
+            print(f"Warmup step {name} failed: {e}")
+        step["seconds"] = round(time.perf_counter() - started, 3)
+
+    async def run(self, settings):
+        self.started_at = time.time()
+        await asyncio.gather(
+            self._step("vector_db", lambda: asyncio.to_thread(_load_vector_db, settings)),
+            self._step("ocr_workers", lambda: _start_ocr_workers(settings)),
+            self._step("pdf", lambda: asyncio.to_thread(_import_pdf)),
+        )
+        print(f"Warmup finished: {self.status()}")
+
+    def start(self, settings):
+        if self.enabled:
+            self._task = asyncio.get_running_loop().create_task(self.run(settings))
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def status(self) -> dict:
+        return {"ready": self.ready, "steps": self.steps}
+
+
+_warmup = Warmup()
+
+
+def get_warmup() -> Warmup:
+    return _warmup
+
+
+def start_warmup(settings) -> Warmup:
+    """Start the warmup steps on the running loop (settings.warmup=False: ready at once, loaded on first use)."""
+    global _warmup
+    _warmup = Warmup(enabled=settings.warmup)
+    _warmup.start(settings)
+    return _warmup
+
+
+__all__ = ["Warmup", "STEPS", "get_warmup", "start_warmup"]
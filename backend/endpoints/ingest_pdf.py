@@ -1,20 +1,36 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
-import tempfile
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+import asyncio
+import json
+import time
 import os
-import io
-import hashlib
-import ast
-import pymupdf  # PyMuPDF
-from typing import List, Optional
+import hmac
+from typing import List, Literal, Optional
+from urllib.parse import quote
 from pydantic import BaseModel, Field
-from core.doc_ocr import OCRDocProcessor
 from core.vec_db import VecDB
 from core.assistant import OllamaExtractor
+from core.ollama_pool import get_backend_pool
+from core.answer_cache import get_answer_cache, document_fingerprint
+from core.batch_query import BatchQueryRunner
+from core.chunk_catalog import get_chunk_catalog
+from core.executors import ExecutorSaturated, executor_stats, get_executor
+from core.thread_budget import current_threads, thread_budget
+from core.ingestion import discard_upload, ingest_pdf, publish_upload, receive_upload, upload_chunks
+from core.jobs import FINISHED, get_job_queue
+from core.spec_extractor import SpecExtractor, get_spec_registry, get_retrieval_cache, write_record
 from . import settings
-from utils.highlighting import generate_highlight_pdf  # new reusable function
+from utils.highlighting import build_highlight_overlays, generate_highlight_pdf, get_annotated_cache
+from utils.evidence import resolve_chunk_ids, highlights_from_metadata
+from utils.streaming import sse_event, PartialJSONStringField
+from utils.pdf_assets import hashed_url
+from utils.metrics import stage
+from utils.timings import timings_block
+from utils.profiling import capture_status, list_profiles, start_capture, stop_capture
+from utils.responses import JSONResponse
 
-router = APIRouter()
+router = APIRouter(default_response_class=JSONResponse)
 
 # Storage directories
 ORIGINAL_DIR = os.path.join("storage", "original_pdfs")
@@ -26,96 +42,572 @@ class HighlightRequest(BaseModel):
     doc_name: str = Field(..., description="Exact document name used at ingestion")
     chunk_ids: List[int] = Field(..., description="List of chunk indices to highlight")
     color: Optional[List[float]] = Field(default=None, description="RGB values 0-1, e.g. [1,0.85,0.2]")
-    return_pdf: bool = Field(default=False, description="If true returns PDF bytes instead of JSON metadata only")
+    mode: Literal["overlay", "svg", "export"] = Field(
+        default="overlay",
+        description="overlay: per-page rects in PDF coordinates; svg: rects plus one SVG per page; export: annotated PDF copy")
+    return_pdf: bool = Field(default=False, description="Export mode: return PDF bytes instead of JSON metadata only")
+    pages: Literal["all", "evidence"] = Field(
+        default="all", description="Export mode: all pages, or only pages with evidence plus neighbor_pages around them")
+    neighbor_pages: int = Field(default=1, ge=0, le=10, description="Pages kept on each side of an evidence page")
+    answer: Optional[str] = Field(default=None, description="Answer text; only the lines of each chunk that match it are highlighted")
+    timings: bool = Field(default=False, description="Include per-stage milliseconds (also sent as Server-Timing)")
 
-@router.post("/process-pdf")
-async def process_pdf(file: UploadFile = File(...)):
+class ProfileRequest(BaseModel):
+    mode: Literal["sample", "cprofile", "tracemalloc"] = Field(default="sample", description="sample: stacks of all threads; cprofile: event loop thread; tracemalloc: live allocations")
+    seconds: Optional[float] = Field(default=None, gt=0, description="Stop after this many seconds")
+    requests: Optional[int] = Field(default=None, ge=1, description="Stop after this many API requests")
+    interval_ms: float = Field(default=5.0, ge=0.5, le=1000, description="Sampling interval (sample mode)")
+    frames: int = Field(default=25, ge=1, le=100, description="Traceback depth (tracemalloc mode)")
+
+class BatchQueryRequest(BaseModel):
+    doc_name: str = Field(..., description="Exact document name used at ingestion")
+    questions: List[str] = Field(..., min_length=1, description="Questions to answer about the document")
+    k: int = Field(default=5, description="Chunks retrieved per question")
+    mode: Literal["packed", "parallel"] = Field(
+        default="packed", description="packed: group questions into shared structured LLM calls; parallel: one call per question")
+    max_concurrency: Optional[int] = Field(default=None, ge=1, description="LLM calls in flight (defaults to settings)")
+
+class ExtractRequest(BaseModel):
+    doc_name: str = Field(..., description="Exact document name used at ingestion")
+    spec: str = Field(..., description="Name of an extraction spec in settings.extraction_specs_folder")
+    k: int = Field(default=5, description="Chunks retrieved per field")
+
+async def _await_unless_disconnected(request: Request, coro):
+    """Await coro, cancelling it if the HTTP client goes away before it finishes."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.llm_disconnect_poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def _cache_scope_sync(doc_name: str, assistant: OllamaExtractor, k: int, context_token_budget: int):
+    doc_hash = document_fingerprint(os.path.join(ORIGINAL_DIR, doc_name))
+    if doc_hash is None:
+        return None
+    return doc_hash, assistant.prompt_fingerprint(), assistant.model, (k, context_token_budget)
+
+async def _answer_cache_scope(doc_name: str, assistant: OllamaExtractor, k: int, context_token_budget: int):
+    """(doc content hash, prompt hash, model, (k, budget)) for the answer cache, or None if caching is off.
+
+    Hashing the document (on a fingerprint cache miss) and checking the prompt file run off the event loop.
     """
-    Process a PDF file with OCR and return extracted text.
+    if not settings.answer_cache_enabled:
+        return None
+    return await run_in_threadpool(_cache_scope_sync, doc_name, assistant, k, context_token_budget)
+
+async def _lookup_answer(query: str, doc_name: str, assistant: OllamaExtractor, k: int):
+    """Check the answer cache before retrieval.
+
+    Exact matches are served without touching the embedding model; otherwise the
+    query is embedded once and used for near-duplicate matching and retrieval.
+    Returns (cache_scope, cached_answer_or_None, vec_db, query_embedding).
+    """
+    cache = get_answer_cache()
+    scope = await _answer_cache_scope(doc_name, assistant, k, settings.context_token_budget)
+    if scope:
+        hit = cache.get(*scope, query)
+        if hit:
+            return scope, hit, None, None
+    vector = get_executor("vector", settings)
+    vec_db = await vector.run(VecDB, settings=settings)
+    q_emb = await vector.run(vec_db.get_query_embedding, query)
+    if scope:
+        hit = cache.get_similar(*scope, q_emb)
+        if hit:
+            return scope, hit, vec_db, q_emb
+        cache.record_miss()
+    return scope, None, vec_db, q_emb
+
+def _store_answer(scope, doc_name, query, q_emb, result, evidence, chunk_ids, highlights, context_chunk_count):
+    if not scope:
+        return
+    get_answer_cache().put(doc_name, *scope, query, {
+        "result": result,
+        "evidence": evidence,
+        "chunk_ids": chunk_ids,
+        "highlights": highlights,
+        "context_chunk_count": context_chunk_count,
+    }, query_embedding=q_emb)
+
+def _upload_source(request: Request, file: Optional[UploadFile], filename: Optional[str]):
+    """(doc_name, chunk iterator) of a multipart ``file`` or a raw ``application/pdf`` body.
+
+    A raw body is streamed as it arrives; multipart uploads are spooled by
+    Starlette's form parser first, so large files are better sent raw.
     """
-    # Validate file type
-    if not file.filename.lower().endswith('.pdf'):
+    if file is not None:
+        name, chunks = file.filename, upload_chunks(file)
+    elif request.headers.get("content-type", "").split(";")[0].strip() == "application/pdf" and filename:
+        name, chunks = filename, request.stream()
+    else:
+        raise HTTPException(status_code=400,
+                            detail="Send the PDF as form field 'file', or as an application/pdf body with ?filename=")
+    name = os.path.basename(name or "")
+    if not name.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    return name, chunks
+
+def _content_disposition(filename: str, disposition: str = "inline") -> str:
+    """RFC 6266 header value: an ASCII filename= for old clients plus the UTF-8 filename*=."""
+    fallback = filename.encode("ascii", "replace").decode("ascii").replace("?", "_")
+    fallback = fallback.replace('"', "_").replace("\\", "_")
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+# Opt-in /process-pdf fields; the text itself is otherwise read page by page from /documents/{doc_name}/pages
+PROCESS_PDF_FIELDS = ("extracted_text", "pages")
+
+def _requested_fields(fields: Optional[str]) -> set:
+    requested = {f.strip() for f in (fields or "").split(",") if f.strip()}
+    unknown = requested - set(PROCESS_PDF_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown fields {sorted(unknown)}; choose from {list(PROCESS_PDF_FIELDS)}")
+    return requested
+
+@router.post("/process-pdf")
+async def process_pdf(request: Request, file: Optional[UploadFile] = File(None), filename: Optional[str] = None,
+                      timings: bool = False, fields: Optional[str] = None):
+    """
+    Process a PDF file with OCR and return a summary of the document.
+    fields (comma-separated) adds "extracted_text" (the whole text) and/or
+    "pages" (text per page); by default the text is left to pages_url.
+    timings=true adds per-stage milliseconds (also sent as Server-Timing).
+    """
+    requested = _requested_fields(fields)
+    doc_name, chunks = _upload_source(request, file, filename)
+    part_path = None
     try:
-        # Create a temporary file to save the uploaded PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        # Persist original if not already stored
-        stored_path = os.path.join(ORIGINAL_DIR, file.filename)
-        if not os.path.exists(stored_path):
-            with open(stored_path, 'wb') as outf:
-                outf.write(content)
-        # Initialize OCR processor with basic settings
-        ocr_processor = OCRDocProcessor(settings)
-        # Extract text from PDF
-        extracted_text, line_boxes = ocr_processor.get_text_with_boxes(temp_file_path)
-        # Initialize vector database
-        vec_db = VecDB(
-            settings=settings,
-        )
-        # Add document to vector database using line_boxes
-        doc_name = file.filename
-        vec_db.add_document(doc_name, line_boxes)
-        # Clean up temporary file
-        os.unlink(temp_file_path)
-        return JSONResponse(content={
+        # Streamed into a part file (hashed on the way); OCR opens that file
+        with stage("upload"):
+            part_path, _ = await receive_upload(chunks, doc_name)
+        # OCR, chunking and embedding run on the bounded executors (503 when they are saturated)
+        summary = await run_in_threadpool(ingest_pdf, part_path, doc_name, settings, admit=True)
+        # only an ingested upload replaces the stored original
+        stored_path = await run_in_threadpool(publish_upload, part_path, doc_name, settings)
+        result = {
             "success": True,
-            "filename": file.filename,
-            "extracted_text": extracted_text.strip(),
-            "text_length": len(extracted_text.strip()),
-            "document_name": doc_name,
-            "line_boxes_count": len(line_boxes),
-            "stored_path": stored_path
-        })
+            "filename": doc_name,
+            **summary,
+            "stored_path": stored_path,
+            # content-hash URL: cacheable forever, changes when the stored file does
+            "pdf_url": hashed_url("/pdfs/original", ORIGINAL_DIR, doc_name),
+        }
+        if requested:
+            pages = get_chunk_catalog(settings.catalog_path).get_pages(doc_name)
+            if "extracted_text" in requested:
+                result["extracted_text"] = "".join(p["text"] for p in pages).strip()
+            if "pages" in requested:
+                result["pages"] = pages
+        if timings:
+            result["timings"] = timings_block()
+        return JSONResponse(content=result)
+    except (HTTPException, ExecutorSaturated):
+        raise
     except Exception as e:
-        # Clean up temporary file if it exists
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            os.unlink(temp_file_path)
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+    finally:
+        if part_path is not None:
+            discard_upload(part_path)  # no-op once published
+
+@router.get("/documents/{doc_name}/pages")
+async def document_pages(doc_name: str, offset: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=200)):
+    """Extracted text of an ingested document, limit pages from page offset (0-based) on."""
+    catalog = get_chunk_catalog(settings.catalog_path)
+    page_count = catalog.page_count(doc_name)
+    if page_count == 0:
+        raise HTTPException(status_code=404,
+                            detail=f"No page text for '{doc_name}' (not ingested, or ingested before page text was kept)")
+    pages = catalog.get_pages(doc_name, offset, limit)
+    next_offset = offset + limit if offset + limit < page_count else None
+    return JSONResponse(content={
+        "doc_name": doc_name,
+        "page_count": page_count,
+        "offset": offset,
+        "limit": limit,
+        "pages": pages,
+        "next_offset": next_offset,
+    })
+
+def _job_status(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "pages_done": job["pages_done"],
+        "pages_total": job["pages_total"],
+        "doc_name": job["params"].get("doc_name"),
+        "error": job["error"],
+        "cancel_requested": job["cancel_requested"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "status_url": f"/api/v1/jobs/{job['id']}",
+        "result_url": f"/api/v1/jobs/{job['id']}/result",
+    }
+
+def _get_job(job_id: str) -> dict:
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.post("/jobs/ingest", status_code=202)
+async def submit_ingest_job(request: Request, file: Optional[UploadFile] = File(None), filename: Optional[str] = None):
+    """Queue a PDF for ingestion and return its job id right away.
+
+    The upload is accepted like for /process-pdf. Poll ``GET /jobs/{job_id}``
+    for stage and page progress and fetch the /process-pdf style summary from
+    ``GET /jobs/{job_id}/result``.
+    """
+    doc_name, chunks = _upload_source(request, file, filename)
+    # published over the stored original by the job once ingestion succeeds
+    part_path, _ = await receive_upload(chunks, doc_name)
+    job = get_job_queue().submit("ingest", {"pdf_path": part_path, "doc_name": doc_name})
+    return JSONResponse(status_code=202, content=_job_status(job))
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return JSONResponse(content=_job_status(_get_job(job_id)))
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = _get_job(job_id)
+    if job["status"] != "done":
+        detail = f"Job is {job['status']}" + (f": {job['error']}" if job["error"] else "")
+        raise HTTPException(status_code=409, detail=detail)
+    return JSONResponse(content={"success": True, **job["result"]})
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued job at once, or a running one at its next page or stage."""
+    job = _get_job(job_id)
+    if job["status"] in FINISHED:
+        raise HTTPException(status_code=409, detail=f"Job is already {job['status']}")
+    job = get_job_queue().cancel(job_id)
+    return JSONResponse(status_code=200 if job["status"] in FINISHED else 202, content=_job_status(job))
+
+def _cited_highlights(doc_name: str, chunk_ids: List[int], metadata: List[dict], answer: str) -> List[dict]:
+    """Highlights of the cited chunks, as the lines (from the chunk catalog) that match the answer."""
+    line_boxes = {c["chunk_idx"]: c["line_boxes"]
+                  for c in get_chunk_catalog(settings.catalog_path).get_chunks(doc_name, chunk_ids)} if chunk_ids else {}
+    return highlights_from_metadata(chunk_ids, metadata, doc_name, line_boxes=line_boxes, answer=answer,
+                                    min_score=settings.highlight_line_min_score)
 
 @router.post("/query")
-async def query_documents(query: str, doc_name: str, k: int = 5):
-    """Query a specific document and return structured JSON answer."""
+async def query_documents(request: Request, query: str, doc_name: str, k: int = 5, session_id: Optional[str] = None,
+                          timings: bool = False):
+    """Query a specific document and return structured JSON answer.
+
+    Pass the same session_id for follow-up questions so the LLM can reuse the
+    already processed instructions and document context. timings=true adds
+    per-stage milliseconds (also sent as Server-Timing).
+    """
     try:
-        vec_db = VecDB(
-            settings=settings,
-        )
-        context, metadata = vec_db.get_context(query, doc_name)
         assistant = OllamaExtractor(settings)
-        assistant_response = assistant.extract_from_document(query, context)
+        scope, cached, vec_db, q_emb = await _lookup_answer(query, doc_name, assistant, k)
+        if cached:
+            return JSONResponse(content={
+                "success": True,
+                "query": query,
+                "doc_name": doc_name,
+                "result": cached["result"],
+                "evidence": cached["evidence"],
+                "chunk_ids": cached["chunk_ids"],
+                "highlights": cached.get("highlights", []),
+                "context_chunk_count": cached["context_chunk_count"],
+                "cached": True,
+                "cache_similarity": cached["cache_similarity"],
+                **({"timings": timings_block()} if timings else {}),
+            })
+        context, metadata = await get_executor("vector", settings).run(vec_db.get_context, query, doc_name, None, q_emb, k)
+        assistant_response = await _await_unless_disconnected(
+            request, assistant.aextract_from_document(query, context, session_id=session_id)
+        )
         # Ensure expected keys exist
         result = assistant_response.get("result", "") if isinstance(assistant_response, dict) else str(assistant_response)
         evidence = assistant_response.get("evidence", {}) if isinstance(assistant_response, dict) else {"doc_name": [], "chunk_id": []}
+        # Resolve cited chunks against the retrieved metadata so the viewer can draw them right away
+        with stage("evidence"):
+            chunk_ids = resolve_chunk_ids(evidence, metadata, doc_name)
+            highlights = _cited_highlights(doc_name, chunk_ids, metadata, result)
+        if isinstance(assistant_response, dict) and "error" not in assistant_response:
+            _store_answer(scope, doc_name, query, q_emb, result, evidence, chunk_ids, highlights, len(metadata))
         return JSONResponse(content={
             "success": True,
             "query": query,
             "doc_name": doc_name,
             "result": result,
             "evidence": evidence,
+            "chunk_ids": chunk_ids,
+            "highlights": highlights,
             "context_chunk_count": len(metadata),
+            "context_tokens": vec_db.last_context_stats.get("context_tokens"),
+            "prompt_tokens": assistant.last_llm_stats.get("prompt_tokens"),
+            "prompt_eval_ms": assistant.last_llm_stats.get("prompt_eval_ms"),
+            "session_reused": assistant.last_llm_stats.get("session_reused", False),
+            "cached": False,
+            **({"timings": timings_block()} if timings else {}),
+        })
+    except (HTTPException, ExecutorSaturated):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error querying documents: {str(e)}")
+
+@router.api_route("/query/stream", methods=["GET", "POST"])
+async def query_documents_stream(query: str, doc_name: str, k: int = 5, session_id: Optional[str] = None):
+    """Stream the answer as server-sent events while the LLM generates it.
+
+    Events: ``meta`` (retrieval done), ``token`` (answer text deltas),
+    ``evidence`` (final result with resolved chunk ids), ``done`` or ``error``.
+    """
+    async def event_stream():
+        started = time.perf_counter()
+        assistant = OllamaExtractor(settings)
+        try:
+            scope, cached, vec_db, q_emb = await _lookup_answer(query, doc_name, assistant, k)
+            if cached:
+                yield sse_event("meta", {"query": query, "doc_name": doc_name,
+                                         "context_chunk_count": cached["context_chunk_count"], "cached": True})
+                yield sse_event("token", {"delta": cached["result"]})
+                yield sse_event("evidence", {"result": cached["result"], "evidence": cached["evidence"],
+                                             "chunk_ids": cached["chunk_ids"],
+                                             "highlights": cached.get("highlights", [])})
+                yield sse_event("done", {"ttft_ms": round((time.perf_counter() - started) * 1000, 1),
+                                         "total_ms": round((time.perf_counter() - started) * 1000, 1),
+                                         "cached": True, "cache_similarity": cached["cache_similarity"]})
+                return
+            context, metadata = await get_executor("vector", settings).run(vec_db.get_context, query, doc_name, None, q_emb, k)
+        except Exception as e:
+            yield sse_event("error", {"detail": f"Error querying documents: {str(e)}"})
+            return
+        yield sse_event("meta", {"query": query, "doc_name": doc_name, "context_chunk_count": len(metadata), "cached": False})
+
+        result_field = PartialJSONStringField("result")
+        raw_text = ""
+        first_token_ms = None
+        try:
+            async for chunk in assistant.astream_extract_from_document(query, context, session_id=session_id):
+                text = chunk.get("response", "")
+                if not text:
+                    continue
+                raw_text += text
+                delta = result_field.feed(text)
+                if delta:
+                    if first_token_ms is None:
+                        first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                    yield sse_event("token", {"delta": delta})
+        except Exception as e:
+            yield sse_event("error", {"detail": f"LLM generation failed: {str(e)}"})
+            return
+
+        try:
+            answer = json.loads(raw_text)
+            parsed = isinstance(answer, dict)
+        except json.JSONDecodeError:
+            answer, parsed = {}, False
+        result = answer.get("result", result_field.value) if parsed else result_field.value
+        evidence = answer.get("evidence", {}) if parsed else {"doc_name": [], "chunk_id": []}
+        with stage("evidence"):
+            chunk_ids = resolve_chunk_ids(evidence, metadata, doc_name)
+            highlights = _cited_highlights(doc_name, chunk_ids, metadata, result)
+        if parsed:
+            _store_answer(scope, doc_name, query, q_emb, result, evidence, chunk_ids, highlights, len(metadata))
+        yield sse_event("evidence", {"result": result, "evidence": evidence, "chunk_ids": chunk_ids,
+                                     "highlights": highlights})
+        yield sse_event("done", {
+            "ttft_ms": first_token_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "cached": False,
+            "context_tokens": vec_db.last_context_stats.get("context_tokens"),
+            "prompt_tokens": assistant.last_llm_stats.get("prompt_tokens"),
+            "prompt_eval_ms": assistant.last_llm_stats.get("prompt_eval_ms"),
+            "session_reused": assistant.last_llm_stats.get("session_reused", False),
+        })
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/query/batch")
+async def query_documents_batch(request: Request, payload: BatchQueryRequest):
+    """Answer many questions about one document: one embedding batch, one retrieval call,
+    and packed or bounded-parallel LLM calls. Results are returned in question order."""
+    started = time.perf_counter()
+    try:
+        assistant = OllamaExtractor(settings)
+        vec_db = await get_executor("vector", settings).run(VecDB, settings=settings)
+        runner = BatchQueryRunner(
+            vec_db, assistant, payload.doc_name, k=payload.k,
+            cache_scope=await _answer_cache_scope(payload.doc_name, assistant, payload.k,
+                                                  settings.batch_context_token_budget),
+            pack_size=settings.batch_pack_size,
+            context_token_budget=settings.batch_context_token_budget,
+            catalog=get_chunk_catalog(settings.catalog_path),
+            line_min_score=settings.highlight_line_min_score,
+        )
+        results = await _await_unless_disconnected(request, runner.run(
+            payload.questions, mode=payload.mode,
+            max_concurrency=payload.max_concurrency or settings.batch_max_concurrency,
+        ))
+        return JSONResponse(content={
+            "success": True,
+            "doc_name": payload.doc_name,
+            "mode": payload.mode,
+            "results": results,
+            "llm_calls": runner.llm_calls,
+            "packed_fallbacks": runner.packed_fallbacks,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
         })
+    except (HTTPException, ExecutorSaturated):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error querying documents: {str(e)}")
 
+@router.get("/extraction-specs")
+async def list_extraction_specs():
+    """List the field specs available for /extract."""
+    specs = await run_in_threadpool(get_spec_registry().load)
+    return JSONResponse(content={
+        "folder": str(settings.extraction_specs_folder),
+        "specs": [
+            {"name": name, "description": c.spec.description, "fields": [f.model_dump() for f in c.spec.fields]}
+            for name, c in specs.items()
+        ],
+    })
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit/eviction counters and sizes of the answer cache and the annotated PDF cache."""
+    answers = get_answer_cache()
+    return JSONResponse(content={
+        "answers": {"entries": len(answers), "hits": answers.hits,
+                    "semantic_hits": answers.semantic_hits, "misses": answers.misses},
+        "annotated_pdfs": get_annotated_cache().stats(),
+    })
+
+@router.get("/llm/backends")
+async def llm_backends():
+    """Routing state of the configured Ollama backends (breaker state, load, p95 latency)."""
+    return JSONResponse(content={"backends": get_backend_pool(settings).status()})
+
+@router.get("/executors")
+async def executors():
+    """Load of the OCR, vector and render executors: in flight, queued, rejected, queue wait and run times.
+
+    ``threads`` shows the thread budget and the limits in effect in the API process.
+    """
+    return JSONResponse(content={"executors": executor_stats(),
+                                 "threads": {**thread_budget(settings), "in_effect": current_threads()}})
+
+@router.post("/extract")
+async def extract_structured(request: Request, payload: ExtractRequest):
+    """Extract typed fields defined by a spec from one document and store the record."""
+    if settings.spec_generator != "ollama":
+        raise HTTPException(status_code=501, detail=f"Unsupported spec_generator '{settings.spec_generator}'")
+    if payload.doc_name != os.path.basename(payload.doc_name) or payload.doc_name in ("", ".", ".."):
+        raise HTTPException(status_code=400, detail="doc_name must be a document name, not a path")
+    compiled = await run_in_threadpool(get_spec_registry().get, payload.spec)
+    if compiled is None:
+        raise HTTPException(status_code=404, detail=f"Extraction spec '{payload.spec}' not found")
+    try:
+        vec_db = await get_executor("vector", settings).run(VecDB, settings=settings)
+        extractor = SpecExtractor(
+            vec_db, OllamaExtractor(settings, model=settings.spec_gen_model), get_retrieval_cache(),
+            k=payload.k, max_concurrency=settings.spec_max_concurrency,
+            context_token_budget=settings.spec_context_token_budget,
+        )
+        doc_hash = await run_in_threadpool(document_fingerprint, os.path.join(ORIGINAL_DIR, payload.doc_name))
+        record = await _await_unless_disconnected(request, extractor.extract(compiled, payload.doc_name, doc_hash))
+        record["record_path"] = await run_in_threadpool(write_record, record)
+        return JSONResponse(content={"success": True, **record})
+    except (HTTPException, ExecutorSaturated):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error extracting fields: {str(e)}")
+
 @router.post("/highlight")
 async def highlight_chunks(payload: HighlightRequest):
-    """Generate (or reuse cached) annotated PDF with highlighted chunk rectangles (delegated)."""
-    result = generate_highlight_pdf(payload.doc_name, payload.chunk_ids, payload.color)
+    """Highlight chunks as vector overlays (default) or as an exported annotated PDF."""
+    if payload.mode != "export" and not payload.return_pdf:
+        result = await get_executor("render", settings).run(
+            build_highlight_overlays, payload.doc_name, payload.chunk_ids, payload.color, payload.mode == "svg",
+            payload.answer)
+    else:
+        result = await get_executor("render", settings).run(
+            generate_highlight_pdf, payload.doc_name, payload.chunk_ids, payload.color,
+            payload.pages == "evidence", payload.neighbor_pages, payload.answer)
     if not result.get("success"):
         error = result.get("error", "Highlight generation failed")
         status = 404 if "not found" in error.lower() or "no valid" in error.lower() else 500
         raise HTTPException(status_code=status, detail=error)
 
+    pdf_bytes = result.pop("pdf_bytes", None)
     if payload.return_pdf:
-        try:
-            with open(result["annotated_pdf_path"], 'rb') as f:
-                import io
-                return StreamingResponse(io.BytesIO(f.read()), media_type="application/pdf")
-        except FileNotFoundError:
+        headers = {
+            "Content-Disposition": _content_disposition(result["annotated_pdf"]),
+            "X-Page-Map": ",".join(map(str, result["page_map"])),
+        }
+        if pdf_bytes is not None:
+            # Fresh render: send the in-memory bytes, no read-back from disk
+            return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+        if not os.path.exists(result["annotated_pdf_path"]):
             raise HTTPException(status_code=500, detail="Annotated file missing after generation")
+        return FileResponse(result["annotated_pdf_path"], media_type="application/pdf", headers=headers)
 
     # Strip internal path before returning
     result.pop("annotated_pdf_path", None)
+    result["mode"] = "export" if payload.return_pdf else payload.mode
+    if payload.timings:
+        result["timings"] = timings_block()
     return JSONResponse(content=result)
+
+def _require_admin(request: Request):
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (set ADMIN_TOKEN)")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), settings.admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.post("/admin/profile", status_code=202)
+async def start_profile(request: Request, payload: ProfileRequest):
+    """Profile the live process for the next ``seconds`` and/or ``requests``; files land in settings.profiles_dir."""
+    _require_admin(request)
+    seconds = min(payload.seconds or settings.profile_max_seconds, settings.profile_max_seconds)
+    try:
+        capture = start_capture(payload.mode, settings.profiles_dir, seconds=seconds, requests=payload.requests,
+                                interval_ms=payload.interval_ms, frames=payload.frames)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return JSONResponse(status_code=202, content=capture.status())
+
+@router.get("/admin/profile")
+async def profile_status(request: Request):
+    """The running (or last) capture and the saved profile files."""
+    _require_admin(request)
+    return JSONResponse(content={"capture": capture_status(), "files": list_profiles(str(settings.profiles_dir))})
+
+@router.delete("/admin/profile")
+async def stop_profile(request: Request):
+    """Stop the running capture now and write its files."""
+    _require_admin(request)
+    capture = stop_capture("stopped")
+    if capture is None:
+        raise HTTPException(status_code=409, detail="No capture is running")
+    return JSONResponse(content=capture.status())
+
+@router.get("/admin/profile/{name}")
+async def download_profile(request: Request, name: str):
+    _require_admin(request)
+    path = os.path.join(settings.profiles_dir, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=os.path.basename(path))
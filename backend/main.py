@@ -1,10 +1,53 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipMiddleware
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from endpoints.ingest_pdf import router as pdf_router
+from core.assistant import aclose_async_client
+from core.ollama_pool import get_backend_pool
+from core.jobs import get_job_queue
+from core.executors import ExecutorSaturated, shutdown_executors
+from core.thread_budget import apply_thread_budget
+from core.warmup import get_warmup, start_warmup
+from settings import settings
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render as render_metrics
+from utils.pdf_assets import PDFStaticFiles
+from utils.profiling import ProfilingMiddleware
+from utils.responses import JSONResponse
+from utils.timings import ServerTimingMiddleware
 import os
 
-app = FastAPI(title="AgentQI PDF OCR API", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Share settings.n_threads between torch, OpenCV and Tesseract instead of one pool per core each
+    budget = apply_thread_budget(settings)
+    print(f"Thread budget: {budget}")
+    # Probe the LLM backends in the background so dead ones leave the rotation early
+    backend_pool = get_backend_pool(settings)
+    backend_pool.start()
+    # Heavy libraries are imported lazily; load them in the background (/readyz reports progress)
+    warmup = start_warmup(settings)
+    # Ingestion workers; jobs interrupted by the last shutdown are queued again
+    job_queue = get_job_queue(settings)
+    job_queue.start()
+    yield
+    job_queue.stop()
+    await warmup.stop()
+    # OCR processes and executor threads; queued tasks are dropped
+    shutdown_executors()
+    await backend_pool.stop()
+    # Release pooled LLM connections on shutdown
+    await aclose_async_client()
+
+
+app = FastAPI(title="AgentQI PDF OCR API", version="1.0.0", lifespan=lifespan, default_response_class=JSONResponse)
+
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated(request: Request, exc: ExecutorSaturated):
+    """A full worker pool is a temporary condition: 503 with a Retry-After estimate."""
+    return JSONResponse(status_code=503, content={"detail": exc.detail}, headers={"Retry-After": str(exc.retry_after)})
 
 # CORS (enable frontend dev / external origins)
 # For development, allow all origins. Tighten for production as needed.
@@ -14,15 +57,30 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    # PDF.js needs these to load large PDFs in ranges from another origin
+    expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "Content-Encoding", "ETag", "X-Page-Map",
+                    "Server-Timing"],
 )
+# gzip API responses above response_gzip_min_bytes (SSE streams and byte ranges are left alone). PDFs are
+# excluded: PDFStaticFiles serves them with their own precompressed .gz variants and ETags.
+if settings.response_gzip_min_bytes > 0:
+    app.add_middleware(GZipMiddleware, minimum_size=settings.response_gzip_min_bytes, compresslevel=6,
+                       exclude_content_types=DEFAULT_EXCLUDED_CONTENT_TYPES + ("application/pdf",))
+# Server-Timing header on /api responses: per-stage ms of this request (visible in browser devtools)
+app.add_middleware(ServerTimingMiddleware)
+# Counts requests for profiles limited to N requests; a no-op unless a capture is running
+app.add_middleware(ProfilingMiddleware)
 
 # Ensure storage directories exist
 os.makedirs(os.path.join("storage", "original_pdfs"), exist_ok=True)
 os.makedirs(os.path.join("storage", "annotated_pdfs"), exist_ok=True)
 
-# Mount static file serving for PDFs
-app.mount("/pdfs/original", StaticFiles(directory=os.path.join("storage", "original_pdfs")), name="original_pdfs")
-app.mount("/pdfs/annotated", StaticFiles(directory=os.path.join("storage", "annotated_pdfs")), name="annotated_pdfs")
+# Mount static file serving for PDFs (content ETags, byte ranges; /pdfs/original/<hash>/<name> is immutable)
+app.mount("/pdfs/original", PDFStaticFiles(directory=os.path.join("storage", "original_pdfs"),
+                                           precompressed=settings.pdf_precompress), name="original_pdfs")
+# Annotated file names already encode the source hash and highlight request
+app.mount("/pdfs/annotated", PDFStaticFiles(directory=os.path.join("storage", "annotated_pdfs"), immutable=True),
+          name="annotated_pdfs")
 
 # Include routers
 app.include_router(pdf_router, prefix="/api/v1")
@@ -31,6 +89,22 @@ app.include_router(pdf_router, prefix="/api/v1")
 def read_root():
     return {"message": "Welcome to AgentQI PDF OCR API"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Stage timings, OCR/embedding/LLM counters, caches, executors and jobs in the Prometheus text format."""
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the process is up and its event loop answers (does not wait for warmup)."""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: 200 once the warmup steps succeeded, 503 with their status until then."""
+    warmup = get_warmup()
+    return JSONResponse(status_code=200 if warmup.ready else 503, content=warmup.status())
+
 def main():
     print("Hello from backend!")
 
@@ -9,6 +9,15 @@ REPO_ROOT = BACKEND_ROOT.parent                 # .../AgentQI
 class Settings(BaseSettings):
     # db path anchored to backend directory
     db_path: Path = BACKEND_ROOT / "vector_db"
+    # chunk metadata catalog (SQLite; geometry for highlighting without the embedding model)
+    catalog_path: Path = BACKEND_ROOT / "storage" / "catalog.sqlite3"
+    # background ingestion jobs (/jobs/ingest)
+    jobs_path: Path = BACKEND_ROOT / "storage" / "jobs.sqlite3"
+    ingest_workers: int = 1  # jobs processed in parallel (OCR is CPU bound)
+    job_retention_days: float = 7.0  # finished jobs are deleted after this
+    job_heartbeat_seconds: float = 10.0  # running jobs refresh their heartbeat this often
+    job_stale_seconds: float = 60.0  # a running job without heartbeat for this long is queued again
+    job_max_attempts: int = 3  # a job interrupted this many times is marked failed
     
     # choose adapter modules
     vec_db: str = "chroma"
@@ -23,9 +32,87 @@ class Settings(BaseSettings):
 
     # device settings
     device: str = "cpu"
-    n_threads: int = 8
+    n_threads: int = 8  # CPU threads shared by torch, OpenCV and Tesseract (core/thread_budget.py); 0 = all cores
     n_gpu_layers: int = -1
 
+    # llm backend (ollama) connection settings
+    ollama_base_url: str = "http://localhost:8880"
+    llm_connect_timeout: float = 5.0   # seconds to establish a connection
+    llm_read_timeout: float = 300.0    # seconds to wait between bytes of a generation
+    llm_max_connections: int = 16
+    llm_max_keepalive_connections: int = 8
+    llm_disconnect_poll_interval: float = 0.5  # how often /query checks for client disconnects
+
+    # multiple ollama backends (requests go to the least busy healthy one)
+    ollama_base_urls: list[str] = []  # e.g. '["http://gpu1:11434", "http://gpu2:11434"]'; [] = ollama_base_url only
+    llm_breaker_failures: int = 3  # consecutive failures before a backend is taken out of rotation
+    llm_breaker_cooldown: float = 30.0  # seconds before a failed backend gets a trial request
+    llm_health_interval: float = 15.0  # seconds between /api/tags probes; 0 disables
+    llm_hedge_enabled: bool = False  # resend slow requests to a second backend after its p95 latency
+    llm_hedge_min_delay: float = 2.0  # never hedge earlier than this (seconds)
+
+    # prompt-prefix reuse
+    llm_keep_alive: str = "30m"  # how long Ollama keeps the model (and its KV cache) loaded after a call
+    llm_session_max_entries: int = 256  # chat sessions remembered for follow-up questions
+    llm_session_ttl: float = 1800.0  # seconds of inactivity before a session starts over
+    llm_session_max_tokens: int = 8192  # sessions longer than this start over (stay inside num_ctx)
+
+    # llm context packing
+    context_token_budget: int = 1536  # max prompt tokens spent on retrieved chunks; 0 = legacy unbounded format
+    # tokenizer.json path or HF repo id matching extraction_model (ungated Llama 3 copy); "" = length estimate
+    context_tokenizer: str = "NousResearch/Meta-Llama-3-8B-Instruct"
+
+    # batch questions (/query/batch)
+    batch_pack_size: int = 8  # max questions answered by one structured LLM call
+    batch_context_token_budget: int = 4096  # shared context budget for one packed call
+    batch_max_concurrency: int = 4  # LLM calls in flight per batch request
+
+    # spec-driven extraction (/extract); specs are read from extraction_specs_folder
+    spec_fields_per_call: int = 6  # fields answered by one structured LLM call
+    spec_max_concurrency: int = 4
+    spec_context_token_budget: int = 2048
+
+    # answer cache (repeated questions per document)
+    answer_cache_enabled: bool = True
+    answer_cache_max_entries: int = 2048
+    answer_cache_similarity: float = 0.95  # cosine threshold for near-duplicate queries; 0 disables
+
+    # annotated PDF cache (storage/annotated_pdfs)
+    annotated_cache_max_bytes: int = 512 * 1024 * 1024
+    annotated_cache_policy: str = "lru"  # "lru" or "lfu"
+    # keep a gzip copy of stored originals when it is at least 10% smaller (served to gzip clients)
+    pdf_precompress: bool = False
+    # line-level highlights: minimum weighted overlap with the answer to keep a line
+    # (a word found only on that line counts 1, a number 2)
+    highlight_line_min_score: float = 1.0
+
+    # bounded executors (core/executors.py); requests beyond workers + max_queue get 503 + Retry-After
+    ocr_workers: int = 2  # processes extracting pages in parallel
+    ocr_max_queue: int = 64  # pages waiting for an OCR worker
+    ocr_process_pool: bool = True  # False = threads (no process start-up, but OCR holds the GIL in places)
+    ocr_start_method: str = "spawn"  # "spawn" is safe with threads and loaded models; "fork" starts faster
+    vector_workers: int = 4  # embedding and Chroma calls
+    vector_max_queue: int = 32
+    render_workers: int = 2  # PyMuPDF annotation and overlay rendering
+    render_max_queue: int = 16
+
+    response_gzip_min_bytes: int = 1024  # gzip JSON responses at least this large (Accept-Encoding: gzip); 0 = off
+
+    # several API workers (uvicorn --workers N): share one embedding model and one Chroma instead of one per worker
+    embedding_socket: str = ""  # Unix socket of the embedding sidecar (python -m core.embedding_service); "" = in-process
+    embedding_max_batch: int = 64  # sidecar: texts encoded together at most
+    embedding_max_wait_ms: float = 5.0  # sidecar: how long a request waits for others to batch with
+    chroma_server_url: str = ""  # e.g. http://localhost:8001 (chroma run --path vector_db --port 8001); "" = db_path
+
+    # load the embedding model, Chroma and the OCR workers in the background at start-up; /readyz is 503 until done
+    # (False: nothing is loaded until the first request that needs it)
+    warmup: bool = True
+
+    # admin endpoints (/api/v1/admin/...; send the token as X-Admin-Token); "" disables them
+    admin_token: str = ""
+    profiles_dir: Path = BACKEND_ROOT / "storage" / "profiles"  # on-demand profiles (utils/profiling.py)
+    profile_max_seconds: float = 300.0  # longest capture allowed
+
     seed: int = random.randint(0, 1000000)
     extraction_specs_folder: Path = REPO_ROOT / "llm4qi" / "config" / "extraction_specs"
 
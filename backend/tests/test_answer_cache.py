@@ -0,0 +1,64 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from core.answer_cache import AnswerCache, document_fingerprint, normalize_query
+
+ANSWER = {"result": "12.5 mg/kg", "evidence": {"doc_name": ["a.pdf"], "chunk_id": ["chunk_2"]},
+          "chunk_ids": [2], "context_chunk_count": 5}
+
+
+def test_exact_hit_uses_normalized_query():
+    cache = AnswerCache()
+    cache.put("a.pdf", "dochash", "prompthash", "llama3", (5, 1536), "What is the certified value of lead?", ANSWER)
+
+    hit = cache.get("dochash", "prompthash", "llama3", (5, 1536), "  what is the CERTIFIED value of lead ")
+    assert hit["result"] == "12.5 mg/kg"
+    assert hit["cache_similarity"] == 1.0
+    assert normalize_query("Lead   content?!") == "lead content"
+
+
+def test_key_includes_document_prompt_model_and_retrieval():
+    cache = AnswerCache()
+    cache.put("a.pdf", "dochash", "prompthash", "llama3", (5, 1536), "q", ANSWER)
+    assert cache.get("otherdoc", "prompthash", "llama3", (5, 1536), "q") is None
+    assert cache.get("dochash", "newprompt", "llama3", (5, 1536), "q") is None
+    assert cache.get("dochash", "prompthash", "mistral", (5, 1536), "q") is None
+    assert cache.get("dochash", "prompthash", "llama3", (10, 1536), "q") is None  # more chunks retrieved
+    assert cache.get("dochash", "prompthash", "llama3", (5, 4096), "q") is None
+
+
+def test_similar_query_matches_above_threshold():
+    cache = AnswerCache(similarity_threshold=0.9)
+    cache.put("a.pdf", "d", "p", "m", (5, 1536), "certified lead value", ANSWER,
+              query_embedding=np.array([1.0, 0.0, 0.0]))
+
+    hit = cache.get_similar("d", "p", "m", (5, 1536), np.array([0.99, 0.05, 0.0]))
+    assert hit is not None and hit["cache_similarity"] > 0.9
+    assert cache.get_similar("d", "p", "m", (5, 1536), np.array([0.0, 1.0, 0.0])) is None
+    assert cache.get_similar("other", "p", "m", (5, 1536), np.array([1.0, 0.0, 0.0])) is None
+
+
+def test_lru_eviction_and_document_invalidation():
+    cache = AnswerCache(max_entries=2)
+    cache.put("a.pdf", "d", "p", "m", (5, 1536), "q1", ANSWER)
+    cache.put("a.pdf", "d", "p", "m", (5, 1536), "q2", ANSWER)
+    cache.get("d", "p", "m", (5, 1536), "q1")  # q1 becomes most recently used
+    cache.put("b.pdf", "e", "p", "m", (5, 1536), "q3", ANSWER)
+    assert cache.get("d", "p", "m", (5, 1536), "q2") is None
+    assert cache.get("d", "p", "m", (5, 1536), "q1") is not None
+
+    assert cache.invalidate_document("a.pdf") == 1
+    assert len(cache) == 1
+
+
+def test_document_fingerprint_tracks_content(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"first")
+    first = document_fingerprint(str(path))
+    assert first == document_fingerprint(str(path))
+    path.write_bytes(b"second version")
+    assert document_fingerprint(str(path)) != first
+    assert document_fingerprint(str(tmp_path / "missing.pdf")) is None
@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+
+from core import assistant as assistant_module
+from core.assistant import OllamaExtractor
+from settings import settings
+
+
+def _extractor(handler):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return OllamaExtractor(settings, base_url="http://ollama.test", async_client=client)
+
+
+def test_aextract_from_document_posts_to_generate():
+    """The async path posts the formatted prompt and parses the JSON answer."""
+    seen = {}
+
+    def handler(request):
+        seen["url"] = str(request.url)
+        seen["payload"] = json.loads(request.content)
+        answer = {"result": "BAM", "evidence": {"doc_name": ["a.pdf"], "chunk_id": ["chunk_1"]}}
+        return httpx.Response(200, json={"response": json.dumps(answer), "done": True})
+
+    extractor = _extractor(handler)
+    data = asyncio.run(extractor.aextract_from_document("Who issued this?", "DOC_NAME a.pdf CHUNK_ID 1:\nBAM\n---\n"))
+
+    assert data["result"] == "BAM"
+    assert seen["url"] == "http://ollama.test/api/generate"
+    assert seen["payload"]["stream"] is False
+    assert "Who issued this?" in seen["payload"]["prompt"]
+    assert seen["payload"]["format"] == extractor.response_schema
+
+
+def test_aextract_from_document_reports_http_errors():
+    def handler(request):
+        return httpx.Response(500, text="model crashed")
+
+    data = asyncio.run(_extractor(handler).aextract_from_document("q", "ctx"))
+    assert data["result"].startswith("Error:")
+    assert data["evidence"] == {"doc_name": [], "chunk_id": []}
+
+
+def test_acall_llm_is_cancellable():
+    """Cancelling the awaiting task aborts the request instead of waiting for the model."""
+    async def handler(request):
+        await asyncio.sleep(30)
+        return httpx.Response(200, json={"response": "{}"})
+
+    async def run():
+        task = asyncio.ensure_future(_extractor(handler).acall_llm("prompt"))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(asyncio.wait_for(run(), timeout=5))
+
+
+def test_shared_async_client_uses_configured_limits():
+    async def run():
+        client = assistant_module.get_async_client(settings)
+        try:
+            assert client is assistant_module.get_async_client(settings)
+            assert client.timeout.connect == settings.llm_connect_timeout
+            assert client.timeout.read == settings.llm_read_timeout
+        finally:
+            await assistant_module.aclose_async_client()
+
+    asyncio.run(run())
+
+
+def test_prompt_keeps_instructions_and_context_before_the_query():
+    extractor = OllamaExtractor(settings, base_url="http://ollama.test")
+    first = extractor._format_prompt("What is the lead content?", "[chunk_1] Pb 12 mg/kg")
+    second = extractor._format_prompt("Who issued it?", "[chunk_1] Pb 12 mg/kg")
+    assert first.index("[chunk_1]") < first.index("What is the lead content?")
+    prefix = first[:first.index("What is the lead content?")]
+    assert second.startswith(prefix)
+    assert extractor._build_payload(first)["keep_alive"] == settings.llm_keep_alive
+
+
+def test_prompt_fingerprint_reads_the_template_only_when_it_changes(tmp_path, monkeypatch):
+    extractor = OllamaExtractor(settings, base_url="http://ollama.test")
+    prompt = tmp_path / "assistant_prompt.txt"
+    prompt.write_text("Context: {context}\nQuery: {query}")
+    monkeypatch.setattr(extractor, "_prompt_path", str(prompt))
+    reads = []
+    read_prompt_file = extractor._read_prompt_file
+    monkeypatch.setattr(extractor, "_read_prompt_file", lambda path=None: reads.append(path) or read_prompt_file(path))
+
+    first = extractor.prompt_fingerprint()
+    assert extractor.prompt_fingerprint() == first and len(reads) == 1
+    prompt.write_text("Answer briefly.\nContext: {context}\nQuery: {query}")
+    assert extractor.prompt_fingerprint() != first and len(reads) == 2
+
+
+def test_batch_prompt_does_not_substitute_inside_questions():
+    extractor = OllamaExtractor(settings, base_url="http://ollama.test")
+    prompt = extractor._format_batch_prompt(["What does {context} mean?"], "[chunk_1] Pb {questions}")
+    assert "0. What does {context} mean?" in prompt
+    assert "[chunk_1] Pb {questions}" in prompt
+    assert prompt.count("[chunk_1]") == 1
+
+
+def test_session_follow_up_reuses_context_tokens():
+    payloads = []
+
+    def handler(request):
+        payloads.append(json.loads(request.content))
+        answer = {"result": "ok", "evidence": {"doc_name": [], "chunk_id": []}}
+        return httpx.Response(200, json={"response": json.dumps(answer), "done": True,
+                                         "context": [len(payloads)] * 3, "prompt_eval_duration": 1_000_000})
+
+    extractor = _extractor(handler)
+    session = "test-session-reuse"
+    asyncio.run(extractor.aextract_from_document("q1", "ctx A", session_id=session))
+    assert extractor.last_llm_stats["session_reused"] is False
+    asyncio.run(extractor.aextract_from_document("q2", "ctx A", session_id=session))
+    assert extractor.last_llm_stats["session_reused"] is True
+    asyncio.run(extractor.aextract_from_document("q3", "ctx B", session_id=session))
+
+    assert "context" not in payloads[0] and "ctx A" in payloads[0]["prompt"]
+    # follow-up: previous turn's tokens and only the new question
+    assert payloads[1]["context"] == [1, 1, 1]
+    assert "ctx A" not in payloads[1]["prompt"] and "q2" in payloads[1]["prompt"]
+    # different retrieved context: start over with the full prompt
+    assert "context" not in payloads[2] and "ctx B" in payloads[2]["prompt"]
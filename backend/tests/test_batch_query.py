@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from core.batch_query import BatchQueryRunner
+
+
+class FakeVecDB:
+    """Each question retrieves exactly one chunk: its own index."""
+    context_builder = None
+
+    def __init__(self):
+        self.embed_calls = 0
+        self.query_calls = 0
+
+    def get_query_embeddings(self, queries):
+        self.embed_calls += 1
+        return np.eye(len(queries), 4)
+
+    def query_many(self, doc_name, embeddings, n_results):
+        self.query_calls += 1
+        return [{"metadatas": [[{"source": doc_name, "chunk_idx": i}]], "documents": [[f"text {i}"]]}
+                for i in range(len(embeddings))]
+
+    def build_context(self, hit_dicts, token_budget=None):
+        metadata = [h["metadatas"][0][0] for h in hit_dicts]
+        return " ".join(h["documents"][0][0] for h in hit_dicts), metadata
+
+
+class FakeAssistant:
+    def __init__(self, skip=(), fail_batches=False):
+        self.skip = set(skip)
+        self.fail_batches = fail_batches
+        self.batch_calls = []
+        self.single_calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _track(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+
+    async def aextract_batch(self, questions, context):
+        self.batch_calls.append(list(questions))
+        await self._track()
+        if self.fail_batches:
+            raise RuntimeError("model returned invalid JSON")
+        return {i: {"result": f"packed {q}", "evidence": {"doc_name": ["a.pdf"], "chunk_id": []}}
+                for i, q in enumerate(questions) if q not in self.skip}
+
+    async def aextract_from_document(self, question, context):
+        self.single_calls.append(question)
+        await self._track()
+        return {"result": f"single {question}", "evidence": {"doc_name": ["a.pdf"], "chunk_id": [context.split()[-1]]}}
+
+
+QUESTIONS = [f"q{i}" for i in range(5)]
+
+
+def test_packed_mode_groups_questions_and_retrieves_once():
+    vec_db, assistant = FakeVecDB(), FakeAssistant(skip={"q3"})
+    runner = BatchQueryRunner(vec_db, assistant, "a.pdf", pack_size=2)
+    results = asyncio.run(runner.run(QUESTIONS, mode="packed", max_concurrency=4))
+
+    assert vec_db.embed_calls == 1 and vec_db.query_calls == 1
+    assert assistant.batch_calls == [["q0", "q1"], ["q2", "q3"]]
+    # q4 is alone in its group; q3 was skipped by the packed call and answered on its own
+    assert sorted(assistant.single_calls) == ["q3", "q4"]
+    assert [r["question"] for r in results] == QUESTIONS
+    assert results[0]["result"] == "packed q0" and results[3]["result"] == "single q3"
+    assert results[4]["chunk_ids"] == [4]
+    assert runner.llm_calls == 4
+
+
+def test_parallel_mode_respects_concurrency_limit():
+    assistant = FakeAssistant()
+    runner = BatchQueryRunner(FakeVecDB(), assistant, "a.pdf")
+    results = asyncio.run(runner.run(QUESTIONS, mode="parallel", max_concurrency=2))
+
+    assert assistant.max_in_flight == 2
+    assert runner.llm_calls == len(QUESTIONS)
+    assert [r["result"] for r in results] == [f"single {q}" for q in QUESTIONS]
+
+
+def test_failed_packed_call_falls_back_and_is_counted():
+    assistant = FakeAssistant(fail_batches=True)
+    runner = BatchQueryRunner(FakeVecDB(), assistant, "a.pdf", pack_size=5)
+    results = asyncio.run(runner.run(QUESTIONS, mode="packed", max_concurrency=4))
+
+    assert runner.packed_fallbacks == 1
+    assert [r["result"] for r in results] == [f"single {q}" for q in QUESTIONS]
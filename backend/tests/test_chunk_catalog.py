@@ -0,0 +1,65 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.chunk_catalog import ChunkCatalog
+from utils.chunking import split_wordboxes_chunks
+
+
+def _chunk(idx, page, bbox):
+    return {"chunk_idx": idx, "page": page, "header": f"H{idx}", "text": f"chunk {idx}",
+            "bbox": bbox, "line_boxes": [{"text": f"chunk {idx}", "bbox": bbox}]}
+
+
+def test_replace_and_lookup_by_ids_and_page(tmp_path):
+    catalog = ChunkCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.replace_document("a.pdf", [_chunk(0, 0, [1, 2, 3, 4]), _chunk(1, 1, [5, 6, 7, 8]), _chunk(2, 1, None)])
+
+    rows = catalog.get_chunks("a.pdf", [2, 0, 0, 9])
+    assert [r["chunk_idx"] for r in rows] == [0, 2]
+    assert rows[0]["bbox"] == [1, 2, 3, 4] and rows[0]["source"] == "a.pdf"
+    assert rows[0]["line_boxes"] == [{"text": "chunk 0", "bbox": [1, 2, 3, 4]}]
+    assert rows[1]["bbox"] is None
+    assert [r["chunk_idx"] for r in catalog.chunks_on_page("a.pdf", 1)] == [1, 2]
+    assert catalog.get_chunks("b.pdf", [0]) == []
+
+
+def test_reingest_replaces_previous_chunks(tmp_path):
+    path = str(tmp_path / "catalog.sqlite3")
+    catalog = ChunkCatalog(path)
+    catalog.replace_document("a.pdf", [_chunk(i, 0, [0, 0, 1, 1]) for i in range(5)])
+    catalog.replace_document("a.pdf", [_chunk(0, 2, [0, 0, 2, 2])])
+    catalog.add_chunks("a.pdf", [_chunk(0, 3, [0, 0, 3, 3])])
+
+    reopened = ChunkCatalog(path)
+    assert reopened.has_document("a.pdf")
+    assert [(r["chunk_idx"], r["page"]) for r in reopened.get_chunks("a.pdf", range(5))] == [(0, 3)]
+    assert reopened.delete_document("a.pdf") == 1 and not reopened.has_document("a.pdf")
+
+
+def test_chunking_keeps_line_boxes_per_chunk():
+    lines = [
+        {"text": "1. Scope", "bbox": [10, 10, 80, 20], "page": 0},
+        {"text": "first line", "bbox": [10, 25, 90, 35], "page": 0},
+        {"text": "2. Values", "bbox": [10, 50, 80, 60], "page": 0},
+        {"text": "second line", "bbox": [10, 65, 95, 75], "page": 0},
+    ]
+    chunks, _ = split_wordboxes_chunks(lines)
+    assert len(chunks["line_boxes"]) == len(chunks["chunk_text"]) == len(chunks["bboxes"])
+    for line_boxes, bbox in zip(chunks["line_boxes"], chunks["bboxes"]):
+        assert line_boxes
+        assert bbox[0] == min(l["bbox"][0] for l in line_boxes)
+        assert bbox[3] == max(l["bbox"][3] for l in line_boxes)
+
+
+def test_page_text_is_paged_and_replaced_on_reingest(tmp_path):
+    catalog = ChunkCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.replace_pages("a.pdf", ["one\n", "two\n", "three\n"])
+    assert catalog.page_count("a.pdf") == 3
+    assert catalog.get_pages("a.pdf", offset=1, limit=1) == [{"page": 1, "text": "two\n"}]
+    assert [p["page"] for p in catalog.get_pages("a.pdf", offset=1)] == [1, 2]
+
+    catalog.replace_pages("a.pdf", ["only\n"])
+    assert catalog.get_pages("a.pdf") == [{"page": 0, "text": "only\n"}]
+    catalog.delete_document("a.pdf")
+    assert catalog.page_count("a.pdf") == 0
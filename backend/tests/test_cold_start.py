@@ -0,0 +1,36 @@
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+
+from benchmarks.import_time import import_once
+from core import warmup as warmup_module
+from core.warmup import Warmup
+
+
+def test_importing_the_app_loads_no_heavy_library():
+    result = import_once("main")
+    assert result["heavy"] == [], f"imported at start-up: {result['heavy']}"
+    assert "code" not in result["cumulative"]
+
+
+def test_ready_only_after_every_warmup_step(monkeypatch):
+    async def ocr_workers(settings):
+        raise RuntimeError("tesseract missing")
+
+    monkeypatch.setattr(warmup_module, "_load_vector_db", lambda settings: None)
+    monkeypatch.setattr(warmup_module, "_start_ocr_workers", ocr_workers)
+    monkeypatch.setattr(warmup_module, "_import_pdf", lambda: None)
+
+    warmup = Warmup()
+    assert not warmup.ready
+    asyncio.run(warmup.run(SimpleNamespace()))
+    steps = warmup.status()["steps"]
+    assert steps["vector_db"]["status"] == "done" and steps["pdf"]["status"] == "done"
+    assert steps["ocr_workers"] == {"status": "failed", "seconds": steps["ocr_workers"]["seconds"],
+                                    "error": "RuntimeError: tesseract missing"}
+    assert not warmup.ready
+
+    assert Warmup(enabled=False).ready  # settings.warmup=False: libraries load on first use
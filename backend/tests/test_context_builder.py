@@ -0,0 +1,50 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.context_builder import ContextBuilder, collect_hits, estimate_tokens
+from core.vec_db import concatenate_documents
+
+
+def _hits(rows):
+    """Build a Chroma-style query result from (chunk_idx, header, text, distance) rows."""
+    return {
+        "documents": [[text for _, _, text, _ in rows]],
+        "metadatas": [[{"source": "a.pdf", "chunk_idx": idx, "header": header, "bbox": "[0, 0, 1, 1]", "page": 0}
+                       for idx, header, _, _ in rows]],
+        "distances": [[dist for *_, dist in rows]],
+    }
+
+
+ROWS = [
+    (4, "Certified Values", "Certified Values Lead 12.5 mg/kg Cadmium 0.8 mg/kg", 0.1),
+    (5, "Certified Values", "Certified Values Zinc 44 mg/kg " + "filler " * 200, 0.5),
+    (2, "Material Description", "Material Description Lead alloy chips", 0.3),
+]
+
+
+def test_duplicate_hits_keep_best_distance():
+    hits = collect_hits([_hits(ROWS[:1]), _hits([(4, "Certified Values", ROWS[0][2], 0.05)])])
+    assert len(hits) == 1 and hits[0]["distance"] == 0.05
+
+
+def test_packing_respects_budget_and_ranks_by_score():
+    builder = ContextBuilder(token_budget=60)
+    context, metadata, stats = builder.build([_hits(ROWS)])
+
+    # the long, worst-scoring chunk does not fit; the other two do
+    assert [m["chunk_idx"] for m in metadata] == [2, 4]
+    assert stats["chunks_packed"] == 2 and stats["chunks_retrieved"] == 3
+    assert stats["context_tokens"] <= 60
+    assert metadata[0]["bbox"] == [0, 0, 1, 1]
+
+
+def test_compact_format_collapses_headers():
+    context, _, _ = ContextBuilder(token_budget=0).build([_hits(ROWS)])
+
+    assert context.count("DOC_NAME a.pdf") == 1
+    assert context.count("## Certified Values") == 1
+    assert "[chunk_4] Lead 12.5 mg/kg" in context
+    assert "(Header:" not in context
+    legacy, _ = concatenate_documents([_hits(ROWS)])
+    assert estimate_tokens(context) < estimate_tokens(legacy)
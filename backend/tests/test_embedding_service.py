@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from core.embedding_service import EmbeddingClient, EmbeddingServer, EmbeddingServiceError
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True, **kwargs):
+        self.calls.append(list(texts))
+        time.sleep(0.02)  # a forward pass, long enough for other requests to queue up
+        return np.array([[len(t), i] for i, t in enumerate(texts)], dtype=np.float32)
+
+
+@pytest.fixture
+def sidecar(tmp_path):
+    model = FakeModel()
+    server = EmbeddingServer(model, "mini", str(tmp_path / "embed.sock"), max_batch=64, max_wait_ms=20)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    task = loop.create_task(server.serve(ready))
+    thread = threading.Thread(target=lambda: loop.run_until_complete(asyncio.gather(task, return_exceptions=True)),
+                              daemon=True)
+    thread.start()
+    assert ready.wait(5)
+    yield server, model
+    loop.call_soon_threadsafe(task.cancel)
+    thread.join(5)
+    assert not thread.is_alive()  # open client connections do not keep the sidecar up
+    loop.close()
+
+
+def test_client_encodes_like_sentence_transformer(sidecar):
+    server, _ = sidecar
+    client = EmbeddingClient(server.socket_path, "mini")
+    assert client.encode("abc").tolist() == [3.0, 0.0]
+    assert client.encode(["a", "bb"]).tolist() == [[1.0, 0.0], [2.0, 1.0]]
+    assert client.encode([]).shape == (0, 2)
+    with pytest.raises(EmbeddingServiceError):
+        EmbeddingClient(server.socket_path, "other-model").encode("x")
+
+
+def test_concurrent_requests_share_batches(sidecar):
+    server, model = sidecar
+    client = EmbeddingClient(server.socket_path, "mini")
+    texts = [f"query {'x' * i}" for i in range(16)]
+    with ThreadPoolExecutor(16) as pool:
+        results = list(pool.map(client.encode, texts))
+    assert [r[0] for r in results] == [len(t) for t in texts]  # every caller gets its own row back
+    stats = client.stats()
+    assert stats["texts"] == 16 and stats["requests"] == 16
+    assert stats["batches"] < 16 and max(len(c) for c in model.calls) > 1
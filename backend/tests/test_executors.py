@@ -0,0 +1,111 @@
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from core.executors import BoundedExecutor, ExecutorSaturated
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+
+def test_saturated_executor_rejects_with_retry_after():
+    gate = threading.Event()
+    executor = BoundedExecutor("test", workers=1, max_queue=1)
+    try:
+        running = executor.submit(gate.wait, 5)
+        queued = executor.submit(lambda: "queued")
+        with pytest.raises(ExecutorSaturated) as excinfo:
+            executor.submit(lambda: "rejected")
+        assert excinfo.value.retry_after >= 1
+        # background work waits instead of being rejected
+        waiting = executor.submit(lambda: "waited", admit=False)
+
+        gate.set()
+        assert running.result(5) is True
+        assert queued.result(5) == "queued" and waiting.result(5) == "waited"
+        stats = executor.stats()
+        assert stats["rejected"] == 1 and stats["completed"] == 3 and stats["in_flight"] == 0
+        assert stats["queue_wait_ms"]["max"] > 0
+    finally:
+        gate.set()
+        executor.shutdown()
+
+
+def test_saturation_is_answered_with_503_and_retry_after():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from main import executor_saturated
+
+    app = FastAPI()
+    app.add_exception_handler(ExecutorSaturated, executor_saturated)
+
+    @app.get("/busy")
+    async def busy():
+        raise ExecutorSaturated("ocr", 7)
+
+    response = TestClient(app).get("/busy")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    assert "ocr workers saturated" in response.json()["detail"]
+
+
+def test_batch_is_admitted_whole_or_not_at_all():
+    gate = threading.Event()
+    executor = BoundedExecutor("test", workers=1, max_queue=2)
+    try:
+        executor.submit(gate.wait, 5)
+        with pytest.raises(ExecutorSaturated):
+            executor.submit_many(pow, [(2, i) for i in range(3)])
+        assert executor.stats()["in_flight"] == 1
+        assert [f.result(5) for f in executor.submit_many(pow, [(2, i) for i in range(2)])] == [1, 2]
+    finally:
+        gate.set()
+        executor.shutdown()
+
+
+def test_batch_larger_than_the_queue_runs_when_nothing_waits():
+    gate = threading.Event()
+    executor = BoundedExecutor("test", workers=1, max_queue=2)
+    try:
+        # idle: a 10-page document is admitted although only 3 tasks fit
+        assert [f.result(5) for f in executor.submit_many(pow, [(2, i) for i in range(10)])][-1] == 512
+        executor.submit(gate.wait, 5)
+        executor.submit(lambda: "queued")
+        with pytest.raises(ExecutorSaturated):
+            executor.submit_many(pow, [(2, i) for i in range(10)])  # others are waiting
+    finally:
+        gate.set()
+        executor.shutdown()
+
+
+def test_cancelling_a_queued_task_frees_its_slot():
+    gate = threading.Event()
+    ran = []
+    executor = BoundedExecutor("test", workers=1, max_queue=1)
+    try:
+        executor.submit(gate.wait, 5)
+        queued = executor.submit(ran.append, "queued")
+        assert queued.cancel()
+        gate.set()
+        assert executor.submit(lambda: "next").result(5) == "next"
+        assert ran == [] and executor.stats()["in_flight"] == 0
+    finally:
+        gate.set()
+        executor.shutdown()
+
+
+def test_run_keeps_context_variables():
+    executor = BoundedExecutor("test", workers=2, max_queue=2)
+
+    async def handler():
+        request_id.set("req-1")
+        return await executor.run(request_id.get)
+
+    try:
+        assert asyncio.run(handler()) == "req-1"
+    finally:
+        executor.shutdown()
@@ -0,0 +1,71 @@
+import os
+import sys
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from utils.file_cache import FileCache
+
+
+def test_lru_eviction_keeps_within_budget(tmp_path):
+    cache = FileCache(str(tmp_path), max_bytes=250)
+    cache.put_bytes("a.pdf__annotated_1.pdf", b"x" * 100)
+    cache.put_bytes("a.pdf__annotated_2.pdf", b"x" * 100)
+    assert cache.get("a.pdf__annotated_1.pdf")  # 1 is now more recently used than 2
+    cache.put_bytes("b.pdf__annotated_1.pdf", b"x" * 100)
+
+    assert sorted(os.listdir(tmp_path)) == ["a.pdf__annotated_1.pdf", "b.pdf__annotated_1.pdf"]
+    stats = cache.stats()
+    assert stats["bytes"] == 200 and stats["evictions"] == 1 and stats["evicted_bytes"] == 100
+    assert stats["hits"] == 1
+    assert cache.get("a.pdf__annotated_2.pdf") is None and cache.stats()["misses"] == 1
+
+
+def test_lfu_evicts_least_used(tmp_path):
+    cache = FileCache(str(tmp_path), max_bytes=250, policy="lfu")
+    cache.put_bytes("one", b"x" * 100)
+    cache.put_bytes("two", b"x" * 100)
+    for _ in range(3):
+        cache.get("one")
+    cache.get("two")
+    cache.put_bytes("three", b"x" * 100)
+    assert cache.get("two") is None and cache.get("one") and cache.get("three")
+
+
+def test_failed_write_leaves_nothing_behind(tmp_path):
+    cache = FileCache(str(tmp_path), max_bytes=1000)
+    with pytest.raises(RuntimeError):
+        with cache.writing("broken.pdf") as tmp:
+            with open(tmp, "wb") as f:
+                f.write(b"half")
+            raise RuntimeError("render failed")
+    assert os.listdir(tmp_path) == [] and len(cache) == 0
+
+
+def test_concurrent_writes_publish_complete_files(tmp_path):
+    cache = FileCache(str(tmp_path), max_bytes=10_000_000)
+    payloads = [bytes([i]) * 200_000 for i in range(8)]
+    threads = [threading.Thread(target=cache.put_bytes, args=("same.pdf", p)) for p in payloads]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    data = open(cache.get("same.pdf"), "rb").read()
+    assert data in payloads
+    assert os.listdir(tmp_path) == ["same.pdf"] and cache.stats()["bytes"] == 200_000
+
+
+def test_invalidate_prefix_and_rescan(tmp_path):
+    cache = FileCache(str(tmp_path), max_bytes=1000)
+    cache.put_bytes("a.pdf__annotated_1.pdf", b"1")
+    cache.put_bytes("a.pdf__annotated_2.pdf", b"2")
+    cache.put_bytes("ab.pdf__annotated_1.pdf", b"3")
+    (tmp_path / ".tmp-stale").write_bytes(b"partial")
+
+    assert cache.invalidate_prefix("a.pdf__annotated_") == 2
+    assert sorted(os.listdir(tmp_path)) == [".tmp-stale", "ab.pdf__annotated_1.pdf"]
+
+    reopened = FileCache(str(tmp_path), max_bytes=1000)
+    assert sorted(os.listdir(tmp_path)) == ["ab.pdf__annotated_1.pdf"]
+    assert reopened.stats()["entries"] == 1 and reopened.stats()["bytes"] == 1
@@ -0,0 +1,102 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pymupdf
+
+from utils import highlighting
+from utils.file_cache import FileCache
+
+METADATA = {
+    1: {"chunk_idx": 1, "page": 0, "bbox": "[72, 100, 300, 140]", "header": "Certified Values"},
+    2: {"chunk_idx": 2, "page": 1, "bbox": "[50, 60, 70, 80]", "header": ""},
+    3: {"chunk_idx": 3, "page": 1, "bbox": "[]", "header": ""},
+}
+
+
+def _setup(tmp_path, monkeypatch):
+    doc = pymupdf.open()
+    doc.new_page(width=595, height=842)
+    doc.new_page(width=842, height=595)
+    doc.save(tmp_path / "a.pdf")
+    doc.close()
+    monkeypatch.setattr(highlighting, "ORIGINAL_DIR", str(tmp_path))
+    monkeypatch.setattr(highlighting, "_fetch_chunk_metadata",
+                        lambda doc_name, ids: [dict(METADATA[i]) for i in ids if i in METADATA])
+
+
+def test_overlays_are_grouped_per_page_without_writing_files(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    result = highlighting.build_highlight_overlays("a.pdf", [2, 1, 3, 1])
+
+    assert result["success"] and result["chunk_ids"] == [1, 2, 3]
+    assert [(p["page"], p["width"], p["height"]) for p in result["pages"]] == [(0, 595, 842), (1, 842, 595)]
+    assert result["pages"][0]["rects"] == [{"chunk_id": 1, "bbox": [72, 100, 300, 140], "header": "Certified Values"}]
+    assert "svg" not in result["pages"][0]
+    assert os.listdir(tmp_path) == ["a.pdf"]
+
+
+def test_svg_overlay_uses_pdf_coordinates(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    result = highlighting.build_highlight_overlays("a.pdf", [2], color=[1, 0, 0], svg=True)
+    svg = result["pages"][0]["svg"]
+    assert 'viewBox="0 0 842 595"' in svg
+    assert '<rect x="50.00" y="60.00" width="20.00" height="20.00" data-chunk-id="2"/>' in svg
+    assert 'fill="rgb(255,0,0)"' in svg
+
+
+def test_overlays_report_missing_document(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    assert highlighting.build_highlight_overlays("missing.pdf", [1])["error"] == "Original document not found"
+
+
+def test_export_can_keep_only_evidence_pages(tmp_path, monkeypatch):
+    doc = pymupdf.open()
+    for i in range(6):
+        doc.new_page(width=595, height=842).insert_text((72, 72), f"page {i} " * 40)
+    doc.save(tmp_path / "long.pdf")
+    doc.close()
+    monkeypatch.setattr(highlighting, "ORIGINAL_DIR", str(tmp_path))
+    monkeypatch.setattr(highlighting, "_annotated_cache", FileCache(str(tmp_path / "annotated"), 10 ** 8))
+    monkeypatch.setattr(highlighting, "_fetch_chunk_metadata", lambda doc_name, ids: [
+        {"chunk_idx": 7, "page": 3, "bbox": "[72, 60, 300, 80]", "header": ""}])
+
+    full = highlighting.generate_highlight_pdf("long.pdf", [7])
+    subset = highlighting.generate_highlight_pdf("long.pdf", [7], evidence_pages_only=True, neighbor_pages=1)
+
+    assert full["page_map"] == list(range(6))
+    assert subset["page_map"] == [2, 3, 4]
+    with pymupdf.open(stream=subset["pdf_bytes"], filetype="pdf") as out:
+        assert len(out) == 3
+        assert len(list(out[1].annots())) == 1
+    assert len(subset["pdf_bytes"]) < len(full["pdf_bytes"])
+    assert subset["annotated_pdf"] != full["annotated_pdf"]
+
+    again = highlighting.generate_highlight_pdf("long.pdf", [7], evidence_pages_only=True, neighbor_pages=1)
+    assert again["cached"] and again["pdf_bytes"] is None and again["page_map"] == [2, 3, 4]
+
+
+def test_overlays_draw_one_rect_per_matching_line(tmp_path, monkeypatch):
+    _setup(tmp_path, monkeypatch)
+    lines = [{"text": "Cadmium 12.5 mg/kg", "bbox": [72, 100, 300, 112]},
+             {"text": "Lead 41.2 mg/kg", "bbox": [72, 120, 280, 132]}]
+    monkeypatch.setattr(highlighting, "_fetch_chunk_metadata", lambda doc_name, ids: [
+        {"chunk_idx": 1, "page": 0, "bbox": [72, 100, 300, 132], "header": "", "line_boxes": lines}])
+
+    every_line = highlighting.build_highlight_overlays("a.pdf", [1])
+    assert [r["bbox"] for r in every_line["pages"][0]["rects"]] == [[72.0, 100.0, 300.0, 112.0], [72.0, 120.0, 280.0, 132.0]]
+
+    narrowed = highlighting.build_highlight_overlays("a.pdf", [1], answer="Lead: 41.2 mg/kg")
+    assert [r["bbox"] for r in narrowed["pages"][0]["rects"]] == [[72.0, 120.0, 280.0, 132.0]]
+    assert narrowed["highlights"][0]["bbox"] == [72.0, 120.0, 280.0, 132.0]
+
+
+def test_unknown_ids_of_a_catalogued_document_skip_the_vector_store(tmp_path, monkeypatch):
+    from core.chunk_catalog import ChunkCatalog
+    catalog = ChunkCatalog(str(tmp_path / "catalog.sqlite3"))
+    catalog.replace_document("a.pdf", [{"chunk_idx": 0, "page": 0, "header": "", "text": "t", "bbox": [1, 2, 3, 4],
+                                        "line_boxes": []}])
+    monkeypatch.setattr(highlighting, "get_chunk_catalog", lambda path: catalog)
+    monkeypatch.setitem(sys.modules, "core.vec_db", None)  # importing VecDB would raise
+
+    assert [c["chunk_idx"] for c in highlighting._fetch_chunk_metadata("a.pdf", [0, 7, 99])] == [0]
@@ -21,6 +21,7 @@ def test_process_pdf_endpoint():
     with open(test_pdf_path, "rb") as pdf_file:
         response = client.post(
             "/api/v1/process-pdf",
+            params={"fields": "extracted_text"},  # summary only by default
             files={"file": ("Certificate-BAM-A001.pdf", pdf_file, "application/pdf")}
         )
     
@@ -36,6 +37,10 @@ def test_process_pdf_endpoint():
     assert "text_length" in data
     assert "document_name" in data
     assert data["document_name"] == "Certificate-BAM-A001.pdf"
+    assert data["page_count"] > 0
+
+    pages = client.get(data["pages_url"], params={"limit": 1}).json()
+    assert pages["page_count"] == data["page_count"] and len(pages["pages"]) == 1
     
     print(f"Extracted text length: {data['text_length']}")
     print(f"First 200 characters: {data['extracted_text'][:200]}")
@@ -67,3 +72,11 @@ if __name__ == "__main__":
     test_process_pdf_invalid_file()
     test_process_pdf_endpoint()
     print("All tests passed!")
+
+
+def test_content_disposition_has_ascii_fallback_for_unicode_names():
+    from endpoints.ingest_pdf import _content_disposition
+    header = _content_disposition('Zertifikat_Größe "1".pdf__annotated_ab12.pdf')
+    header.encode("latin-1")  # must be a valid header value
+    assert header == ("inline; filename=\"Zertifikat_Gr__e _1_.pdf__annotated_ab12.pdf\"; "
+                      "filename*=UTF-8''Zertifikat_Gr%C3%B6%C3%9Fe%20%221%22.pdf__annotated_ab12.pdf")
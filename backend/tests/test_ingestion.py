@@ -0,0 +1,107 @@
+import asyncio
+import hashlib
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from core import answer_cache
+from core.ingestion import publish_upload, receive_upload
+from utils.highlighting import ORIGINAL_DIR
+
+SETTINGS = SimpleNamespace(pdf_precompress=False)
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def _store(data: bytes, name: str = "a.pdf"):
+    part_path, sha = asyncio.run(receive_upload(_chunks(data, 7), name))
+    return publish_upload(part_path, name, SETTINGS), sha
+
+
+def test_upload_is_stored_and_hashed_while_streaming(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data = b"%PDF-1.4\n" + b"x" * 100 + b"\n%%EOF\n"
+    path, sha = _store(data)
+    assert path == os.path.join(ORIGINAL_DIR, "a.pdf")
+    assert open(path, "rb").read() == data
+    assert sha == hashlib.sha256(data).hexdigest()
+    assert os.listdir(ORIGINAL_DIR) == ["a.pdf"]  # no temp file left behind
+
+    # the hash computed while streaming is reused instead of reading the file again
+    monkeypatch.setattr(answer_cache, "file_sha256", lambda p: (_ for _ in ()).throw(AssertionError(p)))
+    assert answer_cache.document_fingerprint(path) == sha
+
+
+def test_reupload_replaces_changed_content_only(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    path, first = _store(b"%PDF-1.4 one")
+    mtime = os.stat(path).st_mtime_ns
+    assert _store(b"%PDF-1.4 one") == (path, first)
+    assert os.stat(path).st_mtime_ns == mtime
+
+    _, second = _store(b"%PDF-1.4 two")
+    assert second != first and open(path, "rb").read() == b"%PDF-1.4 two"
+    assert os.listdir(ORIGINAL_DIR) == ["a.pdf"]
+
+
+def _line(text, page=0, y=0):
+    return {"text": text, "bbox": [0, y, 100, y + 10], "page": page, "position_in_text": 0, "line_no": 0}
+
+
+class StubEmbeddingModel:
+    """Fixed-size vectors from the text length, so VecDB runs without loading SentenceTransformer."""
+
+    def encode(self, sentences, convert_to_numpy=True, **kwargs):
+        texts = [sentences] if isinstance(sentences, str) else list(sentences)
+        vectors = np.array([[len(t), 1.0, 0.0, 0.0] for t in texts], dtype=np.float32)
+        return vectors[0] if isinstance(sentences, str) else vectors
+
+
+def test_changed_upload_replaces_the_indexed_chunks(tmp_path, monkeypatch):
+    from core import vec_db as vec_db_module
+    from core.chunk_catalog import get_chunk_catalog
+    from core.vec_db import VecDB
+    from settings import settings
+    monkeypatch.setitem(vec_db_module._embedding_models, "all-MiniLM-L6-v2", StubEmbeddingModel())
+    local = settings.model_copy(update={"db_path": tmp_path / "vdb", "catalog_path": tmp_path / "catalog.sqlite3",
+                                     "context_tokenizer": ""})
+    vec_db = VecDB(settings=local)
+    catalog = get_chunk_catalog(local.catalog_path)
+
+    assert vec_db.add_document("a.pdf", [_line(f"old text {i}", page=i) for i in range(3)], fingerprint="one")
+    old_count = len(vec_db.collection.get(where={"source": "a.pdf"})["ids"])
+    assert not vec_db.add_document("a.pdf", [_line("ignored")], fingerprint="one")  # same content: skipped
+
+    assert vec_db.add_document("a.pdf", [_line("new text")], fingerprint="two")
+    stored = vec_db.collection.get(where={"source": "a.pdf"}, include=["documents", "metadatas"])
+    assert old_count > 1 and stored["documents"] == ["new text"]
+    assert stored["metadatas"][0]["sha256"] == "two"
+    assert [c["text"] for c in catalog.get_chunks("a.pdf", range(old_count))] == ["new text"]
+
+
+def test_failed_ingestion_keeps_the_previous_original(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from endpoints import ingest_pdf as endpoint
+    monkeypatch.chdir(tmp_path)
+    path, first = _store(b"%PDF-1.4 one")
+
+    def failing_ingest(*args, **kwargs):
+        raise RuntimeError("OCR failed")
+
+    monkeypatch.setattr(endpoint, "ingest_pdf", failing_ingest)
+    app = FastAPI()
+    app.include_router(endpoint.router)
+    response = TestClient(app).post("/process-pdf", params={"filename": "a.pdf"}, content=b"%PDF-1.4 two",
+                                    headers={"Content-Type": "application/pdf"})
+    assert response.status_code == 500
+    assert open(path, "rb").read() == b"%PDF-1.4 one"
+    assert answer_cache.document_fingerprint(path) == first
+    assert os.listdir(ORIGINAL_DIR) == ["a.pdf"]  # the part file is gone too
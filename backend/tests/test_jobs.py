@@ -0,0 +1,148 @@
+import os
+import sys
+import threading
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobQueue, JobStore
+
+
+def _wait(store, job_id, statuses, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = store.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job stuck in {store.get(job_id)['status']}")
+
+
+def _pages_handler(gate=None):
+    def handler(params, reporter):
+        reporter.stage("ocr")
+        for page in range(1, params["pages"] + 1):
+            if gate is not None:
+                gate.wait(5)
+            reporter.pages(page, params["pages"])
+        reporter.stage("indexing")
+        return {"document_name": params["doc_name"]}
+    return handler
+
+
+def test_job_reports_progress_and_result(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    queue = JobQueue(store, {"ingest": _pages_handler()})
+    queue.start()
+    try:
+        job = queue.submit("ingest", {"pages": 3, "doc_name": "a.pdf"})
+        assert job["status"] == QUEUED
+        done = _wait(store, job["id"], (DONE,))
+    finally:
+        queue.stop()
+    assert done["result"] == {"document_name": "a.pdf"}
+    assert (done["stage"], done["pages_done"], done["pages_total"]) == ("done", 3, 3)
+
+
+def test_running_job_stops_at_next_page_when_cancelled(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    gate = threading.Event()
+    finished = []
+    queue = JobQueue(store, {"ingest": _pages_handler(gate)}, on_finished=finished.append)
+    queue.start()
+    try:
+        job = queue.submit("ingest", {"pages": 50, "doc_name": "a.pdf"})
+        _wait(store, job["id"], (RUNNING,))
+        assert queue.cancel(job["id"])["cancel_requested"]
+        gate.set()
+        cancelled = _wait(store, job["id"], (CANCELLED,))
+    finally:
+        queue.stop()
+    assert cancelled["pages_done"] == 1 and cancelled["result"] is None
+    assert [j["id"] for j in finished] == [job["id"]]
+
+
+def test_queued_jobs_survive_restart_and_cancel_immediately(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path)
+    interrupted = store.create("ingest", {"pages": 1, "doc_name": "a.pdf"})
+    store.claim(interrupted["id"])  # a previous process died while running it
+    waiting = store.create("ingest", {"pages": 1, "doc_name": "b.pdf"})
+    dropped = store.create("ingest", {"pages": 1, "doc_name": "c.pdf"})
+
+    restarted = JobQueue(JobStore(path), {"ingest": _pages_handler()})
+    assert restarted.cancel(dropped["id"])["status"] == CANCELLED
+    restarted.start()
+    try:
+        assert _wait(store, interrupted["id"], (DONE,))["attempts"] == 2
+        assert _wait(store, waiting["id"], (DONE,))["result"] == {"document_name": "b.pdf"}
+    finally:
+        restarted.stop()
+    assert store.get(dropped["id"])["status"] == CANCELLED
+
+
+def test_failing_job_records_error(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+
+    def broken(params, reporter):
+        raise RuntimeError("tesseract missing")
+
+    queue = JobQueue(store, {"ingest": broken})
+    queue.start()
+    try:
+        job = _wait(store, queue.submit("ingest", {})["id"], (FAILED,))
+    finally:
+        queue.stop()
+    assert job["error"] == "tesseract missing"
+    assert store.counts() == {FAILED: 1}
+
+
+def test_restart_leaves_jobs_of_live_workers_running(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job = store.create("ingest", {"pages": 1, "doc_name": "a.pdf"})
+    store.claim(job["id"], owner="other-host:4242")  # another worker, still heartbeating
+
+    queue = JobQueue(store, {"ingest": _pages_handler()}, stale_after=60)
+    queue.start()
+    try:
+        time.sleep(0.1)
+        assert store.get(job["id"])["status"] == RUNNING
+        assert store.requeue_stale(60) == []
+        store.update(job["id"], heartbeat_at=time.time() - 61)
+        assert store.requeue_stale(60) == [job["id"]]
+        assert store.get(job["id"])["status"] == QUEUED
+    finally:
+        queue.stop()
+
+
+def test_stop_leaves_queued_jobs_in_the_store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    gate = threading.Event()
+    queue = JobQueue(store, {"ingest": _pages_handler(gate)})
+    queue.start()
+    running = queue.submit("ingest", {"pages": 1, "doc_name": "a.pdf"})
+    waiting = [queue.submit("ingest", {"pages": 1, "doc_name": f"{i}.pdf"}) for i in range(3)]
+    _wait(store, running["id"], (RUNNING,))
+    stopper = threading.Thread(target=queue.stop)
+    stopper.start()
+    time.sleep(0.05)
+    gate.set()
+    stopper.join(5)
+
+    assert store.get(running["id"])["status"] == DONE
+    assert [store.get(j["id"])["status"] for j in waiting] == [QUEUED] * 3
+
+
+def test_job_interrupted_too_often_is_failed(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job = store.create("ingest", {"pages": 1, "doc_name": "a.pdf"})
+    for _ in range(2):
+        store.claim(job["id"])  # each previous worker died while running it
+        store.requeue_stale(60)
+
+    queue = JobQueue(store, {"ingest": _pages_handler()}, max_attempts=2)
+    queue.start()
+    try:
+        failed = _wait(store, job["id"], (FAILED,))
+    finally:
+        queue.stop()
+    assert failed["attempts"] == 3 and "2 interrupted attempts" in failed["error"]
@@ -0,0 +1,49 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_text_format_of_counters_gauges_and_histograms():
+    registry = Registry()
+    pages = registry.register(Counter("pages_total", "Pages", ["method"]))
+    dpi = registry.register(Gauge("dpi", "DPI"))
+    seconds = registry.register(Histogram("stage_seconds", "Stage time", ["stage"], buckets=(0.1, 1.0)))
+    pages.inc(method="text")
+    pages.inc(2, method="ocr")
+    dpi.set(600)
+    for value in (0.05, 0.5, 3.0):
+        seconds.observe(value, stage='ocr "page"')
+
+    text = registry.render()
+    assert "# TYPE pages_total counter" in text
+    assert 'pages_total{method="text"} 1' in text and 'pages_total{method="ocr"} 2' in text
+    assert "# TYPE dpi gauge\ndpi 600" in text
+    # buckets are cumulative, labels escaped
+    assert 'stage_seconds_bucket{stage="ocr \\"page\\"",le="0.1"} 1' in text
+    assert 'stage_seconds_bucket{stage="ocr \\"page\\"",le="1"} 2' in text
+    assert 'stage_seconds_bucket{stage="ocr \\"page\\"",le="+Inf"} 3' in text
+    assert 'stage_seconds_sum{stage="ocr \\"page\\""} 3.55' in text
+    assert 'stage_seconds_count{stage="ocr \\"page\\""} 3' in text
+
+
+def test_registering_twice_returns_the_same_metric_and_collectors_run_on_scrape():
+    registry = Registry()
+    first = registry.register(Counter("hits_total", "Hits"))
+    assert registry.register(Counter("hits_total", "Hits")) is first
+    calls = []
+
+    def collector():
+        calls.append(1)
+        gauge = Gauge("queued", "Queued")
+        gauge.set(len(calls))
+        return [gauge]
+
+    def broken():
+        raise RuntimeError("backend gone")
+
+    registry.add_collector(collector)
+    registry.add_collector(broken)
+    assert calls == []
+    assert "queued 1" in registry.render() and "queued 2" in registry.render()
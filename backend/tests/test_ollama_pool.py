@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+
+from core.ollama_pool import OPEN, CLOSED, OllamaBackendPool
+
+
+def _stub_server(delay=0.0, status=200):
+    """Local Ollama stand-in on an ephemeral port; records every request path."""
+    calls = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _reply(self, body):
+            calls.append(self.path)
+            time.sleep(delay)
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._reply({"models": []})
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            self._reply({"response": json.dumps({"port": self.server.server_port}), "done": True})
+
+    class Server(ThreadingHTTPServer):
+        def handle_error(self, request, client_address):
+            pass  # hedged losers are cancelled mid-response
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}", calls
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server, url, calls = _stub_server(**kwargs)
+        started.append(server)
+        return url, calls
+
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+def _dead_url():
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}"
+
+
+def _run(pool_kwargs, urls, body):
+    async def main():
+        async with httpx.AsyncClient(timeout=10) as client:
+            pool = OllamaBackendPool(urls, client=client, health_interval=0, **pool_kwargs)
+            return pool, await body(pool)
+    return asyncio.run(main())
+
+
+def test_least_outstanding_spreads_concurrent_requests(servers):
+    (url_a, calls_a), (url_b, calls_b) = servers(delay=0.2), servers(delay=0.2)
+
+    async def body(pool):
+        return await asyncio.gather(*(pool.post("/api/generate", {}) for _ in range(4)))
+
+    _, responses = _run({}, [url_a, url_b], body)
+    assert all(r.status_code == 200 for r in responses)
+    assert len(calls_a) == 2 and len(calls_b) == 2
+
+
+def test_failing_backend_is_opened_and_requests_fail_over(servers):
+    (bad_url, bad_calls), (good_url, good_calls) = servers(status=500), servers()
+
+    async def body(pool):
+        return [await pool.post("/api/generate", {}) for _ in range(5)]
+
+    pool, responses = _run({"failure_threshold": 2, "cooldown": 60}, [bad_url, good_url], body)
+    assert all(r.status_code == 200 for r in responses)
+    assert pool.backends[0].state == OPEN
+    assert len(bad_calls) == 2  # out of rotation after the threshold
+    assert len(good_calls) == 5
+
+
+def test_health_check_opens_dead_backend_and_half_open_trial_closes(servers):
+    good_url, _ = servers()
+
+    async def body(pool):
+        await pool.check_health()
+        states = [b.state for b in pool.backends]
+        pool.backends[0].url = good_url  # "recovers"
+        pool.backends[0].opened_at -= 1  # cooldown elapsed -> one trial request allowed
+        await pool.post("/api/generate", {})
+        await pool.post("/api/generate", {})
+        return states
+
+    pool, states = _run({"cooldown": 0.5}, [_dead_url(), good_url], body)
+    assert states == [OPEN, CLOSED]
+    assert pool.backends[0].state == CLOSED
+
+
+def test_hedged_request_is_answered_by_the_fast_backend(servers):
+    (slow_url, _), (fast_url, fast_calls) = servers(delay=1.5), servers()
+
+    async def body(pool):
+        pool.backends[1].outstanding = 1  # make the slow backend the primary pick
+        started = time.monotonic()
+        response = await pool.post("/api/generate", {})
+        return response, time.monotonic() - started
+
+    _, (response, elapsed) = _run({"hedge": True, "hedge_min_delay": 0.1}, [slow_url, fast_url], body)
+    assert json.loads(response.json()["response"])["port"] == int(fast_url.rsplit(":", 1)[1])
+    assert elapsed < 1.0
+    assert len(fast_calls) == 1
+
+
+def test_stream_uses_pool_and_releases_outstanding(servers):
+    url, calls = servers()
+
+    async def body(pool):
+        async with pool.stream("/api/generate", {}) as response:
+            assert pool.backends[0].outstanding == 1
+            lines = [line async for line in response.aiter_lines()]
+        return lines
+
+    pool, lines = _run({}, [url], body)
+    assert json.loads(lines[0])["done"] is True
+    assert pool.backends[0].outstanding == 0 and calls == ["/api/generate"]
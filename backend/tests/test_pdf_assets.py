@@ -0,0 +1,76 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils.pdf_assets import IMMUTABLE, REVALIDATE, PDFStaticFiles, hashed_url, precompress
+
+# repetitive content so the gzip copy is worth keeping
+PDF = b"%PDF-1.4\n" + b"1 0 obj << /Type /Page >> endobj\n" * 2000 + b"%%EOF\n"
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / "a.pdf").write_bytes(PDF)
+    app = FastAPI()
+    app.mount("/pdfs/original", PDFStaticFiles(directory=str(tmp_path), precompressed=True))
+    with TestClient(app) as c:
+        yield c, tmp_path
+
+
+def test_hashed_url_is_immutable_and_revalidates_with_304(client):
+    c, tmp_path = client
+    url = hashed_url("/pdfs/original", str(tmp_path), "a.pdf")
+    assert url.count("/") == 4
+
+    first = c.get(url)
+    assert first.status_code == 200 and first.content == PDF
+    assert first.headers["cache-control"] == IMMUTABLE
+    etag = first.headers["etag"]
+    assert not etag.startswith("W/")
+
+    again = c.get(url, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+
+    plain = c.get("/pdfs/original/a.pdf")
+    assert plain.headers["cache-control"] == REVALIDATE and plain.headers["etag"] == etag
+
+
+def test_stale_hash_is_not_served(client):
+    c, tmp_path = client
+    url = hashed_url("/pdfs/original", str(tmp_path), "a.pdf")
+    (tmp_path / "a.pdf").write_bytes(PDF + b"% changed\n")
+    assert c.get(url).status_code == 404
+    assert c.get(hashed_url("/pdfs/original", str(tmp_path), "a.pdf")).status_code == 200
+
+
+def test_range_request_returns_partial_content(client):
+    c, _ = client
+    response = c.get("/pdfs/original/a.pdf", headers={"Range": "bytes=0-99"})
+    assert response.status_code == 206
+    assert response.content == PDF[:100]
+    assert response.headers["content-range"] == f"bytes 0-99/{len(PDF)}"
+
+
+def test_precompressed_copy_is_served_to_gzip_clients_only(client):
+    c, tmp_path = client
+    gz_path = precompress(str(tmp_path / "a.pdf"))
+    assert gz_path and os.path.getsize(gz_path) < len(PDF) / 10
+
+    response = c.get("/pdfs/original/a.pdf", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and response.content == PDF
+    assert response.headers["etag"].endswith('-gz"')
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    ranged = c.get("/pdfs/original/a.pdf", headers={"Accept-Encoding": "gzip", "Range": "bytes=0-9"})
+    assert "content-encoding" not in ranged.headers and ranged.content == PDF[:10]
+
+
+def test_precompress_skips_incompressible_files(tmp_path):
+    path = tmp_path / "random.pdf"
+    path.write_bytes(os.urandom(4096))
+    assert precompress(str(path)) is None
+    assert sorted(os.listdir(tmp_path)) == ["random.pdf"]
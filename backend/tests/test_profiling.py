@@ -0,0 +1,70 @@
+import asyncio
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils import profiling
+from utils.profiling import ProfilingMiddleware, capture_status, start_capture, stop_capture
+
+
+def busy_loop(seconds: float):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def test_sampling_capture_stops_after_its_time_and_writes_collapsed_stacks(tmp_path):
+    async def scenario():
+        capture = start_capture("sample", str(tmp_path), seconds=0.3, interval_ms=2)
+        await asyncio.to_thread(busy_loop, 0.2)
+        await asyncio.sleep(0.3)
+        return capture
+
+    capture = asyncio.run(scenario())
+    assert profiling._active is None and capture.stop_reason == "time"
+    folded = (tmp_path / f"{capture.id}.folded").read_text().splitlines()
+    assert any("busy_loop (test_profiling.py:" in line for line in folded)
+    stack, count = folded[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+
+
+def test_request_limited_cprofile_capture(tmp_path):
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/api/v1/work")
+    async def work():
+        busy_loop(0.01)
+        return {}
+
+    @app.post("/api/v1/admin/start")
+    async def start():
+        start_capture("cprofile", str(tmp_path), requests=2)
+        return {}
+
+    with TestClient(app) as client:
+        client.post("/api/v1/admin/start")  # admin calls are not counted
+        client.get("/api/v1/work")
+        assert capture_status()["active"] and capture_status()["requests_left"] == 1
+        client.get("/api/v1/work")
+    status = capture_status()
+    assert not status["active"] and status["stop_reason"] == "requests"
+    assert sorted(status["files"]) == [f"{status['id']}.prof", f"{status['id']}.txt"]
+    assert "busy_loop" in (tmp_path / f"{status['id']}.txt").read_text()
+
+
+def test_tracemalloc_capture_weights_stacks_by_bytes(tmp_path):
+    async def scenario():
+        start_capture("tracemalloc", str(tmp_path))
+        kept = [bytearray(1 << 20)]
+        capture = stop_capture()
+        return capture, kept
+
+    capture, _ = asyncio.run(scenario())
+    folded = (tmp_path / f"{capture.id}.folded").read_text().splitlines()
+    assert "test_profiling.py" in folded[0] and int(folded[0].rsplit(" ", 1)[1]) >= 1 << 20
+    assert (tmp_path / f"{capture.id}.tracemalloc").exists()
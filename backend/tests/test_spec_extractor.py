@@ -0,0 +1,107 @@
+import asyncio
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+
+from core.spec_extractor import RetrievalCache, SpecExtractor, SpecRegistry, coerce_value, write_record
+
+SPEC = {
+    "name": "crm",
+    "description": "Reference material certificate",
+    "fields": [
+        {"name": "lead", "type": "number", "unit": "mg/kg", "description": "Certified lead content"},
+        {"name": "lead_again", "type": "number", "description": "Certified lead content"},
+        {"name": "expiry_date", "type": "date", "description": "Validity end", "retrieval_hints": ["valid until"]},
+    ],
+}
+
+
+class FakeVecDB:
+    context_builder = None
+
+    def __init__(self):
+        self.embedded = []
+
+    def get_query_embeddings(self, queries):
+        self.embedded.append(list(queries))
+        return np.ones((len(queries), 3))
+
+    def query_many(self, doc_name, embeddings, n_results):
+        return [{"metadatas": [[{"source": doc_name, "chunk_idx": 7}]], "documents": [["Pb 12.5 mg/kg"]]}
+                for _ in range(len(embeddings))]
+
+    def build_context(self, hit_dicts, token_budget=None):
+        return "[chunk_7] Pb 12.5 mg/kg", [{"source": "a.pdf", "chunk_idx": 7}]
+
+
+class FakeAssistant:
+    model = "llama3"
+
+    def __init__(self):
+        self.prompts = []
+
+    async def acall_llm(self, prompt, response_format=None):
+        self.prompts.append(prompt)
+        return {
+            "lead": {"value": "12.5 mg/kg", "chunk_id": ["chunk_7"]},
+            "lead_again": {"value": 12.5, "chunk_id": []},
+            "expiry_date": {"value": "31.12.2030", "chunk_id": ["chunk_7", "chunk_99"]},
+        }
+
+
+def _registry(tmp_path, fields_per_call=2):
+    (tmp_path / "crm.json").write_text(json.dumps(SPEC))
+    (tmp_path / "broken.json").write_text("{not json")
+    return SpecRegistry(tmp_path, fields_per_call=fields_per_call)
+
+
+def test_coerce_value_types():
+    assert coerce_value("1,234.5 mg", "number") == (1234.5, None)
+    assert coerce_value("12,5", "number") == (12.5, None)
+    assert coerce_value("3", "integer") == (3, None)
+    assert coerce_value("2.5", "integer")[1] is not None
+    assert coerce_value("yes", "boolean") == (True, None)
+    assert coerce_value("December 2030", "date") == ("2030-12-01", None)
+    assert coerce_value("soon", "date")[0] is None
+    assert coerce_value(None, "number") == (None, None)
+
+
+def test_registry_compiles_groups_and_skips_invalid_files(tmp_path):
+    specs = _registry(tmp_path).load()
+    assert list(specs) == ["crm"]
+    compiled = specs["crm"]
+    assert [[f.name for f in g] for g in compiled.groups] == [["lead", "lead_again"], ["expiry_date"]]
+    assert "lead (number in mg/kg)" in compiled.prompts[0]
+    assert "{context}" in compiled.prompts[0]
+    assert compiled.schemas[1]["required"] == ["expiry_date"]
+
+
+def test_extract_dedupes_retrievals_and_validates(tmp_path):
+    compiled = _registry(tmp_path).get("crm")
+    vec_db, assistant, cache = FakeVecDB(), FakeAssistant(), RetrievalCache()
+    extractor = SpecExtractor(vec_db, assistant, cache)
+
+    record = asyncio.run(extractor.extract(compiled, "a.pdf", "hash1"))
+    fields = record["fields"]
+    assert fields["lead"] == {"value": 12.5, "type": "number", "unit": "mg/kg", "chunk_ids": [7], "valid": True, "error": None}
+    assert fields["expiry_date"]["value"] == "2030-12-31"
+    assert fields["expiry_date"]["chunk_ids"] == [7]
+    assert record["llm_calls"] == 2 and len(assistant.prompts) == 2
+    # "lead" and "lead_again" share a retrieval query: embedded once
+    assert len(vec_db.embedded) == 1 and len(vec_db.embedded[0]) == 2
+
+    asyncio.run(extractor.extract(compiled, "a.pdf", "hash1"))
+    assert len(vec_db.embedded) == 1  # second run served from the retrieval cache
+
+
+def test_write_record_stays_inside_the_output_dir(tmp_path):
+    out_dir = tmp_path / "extractions"
+    path = write_record({"doc_name": "../../etc/cert.pdf", "spec": "crm", "fields": {}}, str(out_dir))
+    assert path == str(out_dir / "cert.pdf__crm.json")
+    assert os.listdir(out_dir) == ["cert.pdf__crm.json"]
+    with pytest.raises(ValueError):
+        write_record({"doc_name": "..", "spec": "crm"}, str(out_dir))
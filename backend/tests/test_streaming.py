@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.streaming import PartialJSONStringField, sse_event
+from utils.evidence import highlights_from_metadata, parse_chunk_id, resolve_chunk_ids
+
+
+def _feed_in_pieces(text, size):
+    field = PartialJSONStringField("result")
+    deltas = [field.feed(text[i:i + size]) for i in range(0, len(text), size)]
+    return field, deltas
+
+
+def test_partial_result_is_decoded_incrementally():
+    answer = {"result": 'Lead: 12.5 "mg/kg"\nµ \\ ok', "evidence": {"doc_name": ["a.pdf"], "chunk_id": ["chunk_3"]}}
+    raw = json.dumps(answer)  # escapes quotes, newline, backslash and non-ascii (\\u00b5)
+    for size in (1, 2, 5, 64):
+        field, deltas = _feed_in_pieces(raw, size)
+        assert field.complete
+        assert field.value == answer["result"]
+        assert ''.join(deltas) == answer["result"]
+
+
+def test_surrogate_pairs_are_combined_across_feeds():
+    raw = json.dumps({"result": "ok \U0001F600 done"})  # "\\ud83d\\ude00"
+    for size in (1, 3, 7, 64):
+        field, deltas = _feed_in_pieces(raw, size)
+        assert ''.join(deltas) == "ok \U0001F600 done"
+    assert PartialJSONStringField().feed('{"result": "a\\ud83d b"}') == "a\ufffd b"
+
+
+def test_partial_result_waits_for_key():
+    field = PartialJSONStringField("result")
+    assert field.feed('{"res') == ""
+    assert field.feed('ult": "Hel') == "Hel"
+    assert field.feed('lo", "evidence": {}}') == "lo"
+    assert field.complete
+
+
+def test_sse_event_format():
+    assert sse_event("token", {"delta": "hi"}) == 'event: token\ndata: {"delta": "hi"}\n\n'
+
+
+def test_resolve_chunk_ids_against_retrieved_metadata():
+    metadata = [{"source": "a.pdf", "chunk_idx": 1}, {"source": "a.pdf", "chunk_idx": 3}]
+    evidence = {"doc_name": ["a.pdf"] * 4, "chunk_id": ["chunk_3", "1", 3, "chunk_99"]}
+    assert resolve_chunk_ids(evidence, metadata, "a.pdf") == [3, 1]
+    assert parse_chunk_id("CHUNK_ID 7") == 7
+    assert parse_chunk_id("none") is None
+
+
+def test_highlights_from_metadata_uses_retrieved_geometry():
+    metadata = [
+        {"source": "a.pdf", "chunk_idx": 1, "page": 0, "bbox": "[10, 20, 110, 40]", "header": "Intro"},
+        {"source": "a.pdf", "chunk_idx": 3, "page": 2, "bbox": [5.0, 6.0, 7.0, 8.0]},
+        {"source": "a.pdf", "chunk_idx": 4, "page": 2, "bbox": "not a bbox"},
+    ]
+    highlights = highlights_from_metadata([3, 1, 4, 99], metadata, "a.pdf")
+    assert highlights == [
+        {"chunk_id": 3, "page": 2, "bbox": [5.0, 6.0, 7.0, 8.0], "header": "", "rects": [[5.0, 6.0, 7.0, 8.0]]},
+        {"chunk_id": 1, "page": 0, "bbox": [10.0, 20.0, 110.0, 40.0], "header": "Intro",
+         "rects": [[10.0, 20.0, 110.0, 40.0]]},
+    ]
+
+
+def test_line_boxes_narrow_highlights_to_the_answer():
+    metadata = [{"source": "a.pdf", "chunk_idx": 2, "page": 1, "bbox": "[10, 10, 200, 60]"}]
+    lines = {2: [
+        {"text": "Certified Values", "bbox": [10, 10, 120, 20]},
+        {"text": "Cadmium 12.5 ± 0.3 mg/kg", "bbox": [10, 30, 200, 40]},
+        {"text": "Lead 41.2 ± 1.1 mg/kg", "bbox": [10, 50, 190, 60]},
+    ]}
+    [full] = highlights_from_metadata([2], metadata, "a.pdf", line_boxes=lines)
+    assert len(full["rects"]) == 3 and full["bbox"] == [10.0, 10.0, 200.0, 60.0]
+
+    [narrow] = highlights_from_metadata([2], metadata, "a.pdf", line_boxes=lines,
+                                        answer="The cadmium mass fraction is 12.5 mg/kg.")
+    assert narrow["rects"] == [[10.0, 30.0, 200.0, 40.0]] and narrow["bbox"] == [10.0, 30.0, 200.0, 40.0]
+
+    [unmatched] = highlights_from_metadata([2], metadata, "a.pdf", line_boxes=lines, answer="not stated")
+    assert len(unmatched["rects"]) == 3
@@ -0,0 +1,32 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+
+import cv2
+
+from core.thread_budget import apply_thread_budget, per_worker, thread_budget
+
+
+def _settings(**overrides):
+    values = {"n_threads": 8, "vector_workers": 4, "ocr_workers": 3, "ocr_process_pool": True}
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+def test_budget_is_split_across_workers():
+    assert thread_budget(_settings()) == {"total": 8, "torch": 2, "ocr": 2}
+    assert per_worker(8, 16) == 1 and per_worker(8, 0) == 8
+    assert thread_budget(_settings(n_threads=0))["total"] == (os.cpu_count() or 1)
+
+
+def test_ocr_worker_limits_opencv_and_tesseract(monkeypatch):
+    monkeypatch.delenv("OMP_THREAD_LIMIT", raising=False)
+    previous = cv2.getNumThreads()
+    try:
+        apply_thread_budget(_settings(n_threads=4, ocr_workers=2), role="ocr")
+        assert os.environ["OMP_THREAD_LIMIT"] == "2"
+        assert cv2.getNumThreads() == 2
+    finally:
+        cv2.setNumThreads(previous)
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.testclient import TestClient
+
+from core.executors import BoundedExecutor
+from utils.metrics import stage
+from utils.timings import ServerTimingMiddleware, timings_block
+
+
+def _work(name: str, seconds: float):
+    with stage(name):
+        time.sleep(seconds)
+
+
+def _client():
+    executor = BoundedExecutor("test", workers=1, max_queue=4)
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get("/api/run")
+    async def run():
+        await run_in_threadpool(_work, "extraction", 0.02)
+        await executor.run(_work, "embedding", 0.01)
+        await executor.run(_work, "embedding", 0.01)
+        return {"timings": timings_block()}
+
+    @app.get("/other")
+    async def other():
+        return {"timings": timings_block()}
+
+    return TestClient(app)
+
+
+def test_stages_from_threads_and_executors_reach_the_request():
+    response = _client().get("/api/run")
+    timings = response.json()["timings"]
+    assert list(timings) == ["extraction", "embedding", "total"]
+    assert timings["extraction"] >= 20 and timings["embedding"] >= 20
+    assert timings["total"] >= timings["extraction"] + timings["embedding"]
+
+    header = response.headers["server-timing"]
+    assert header.startswith("extraction;dur=") and ", embedding;dur=" in header and ", total;dur=" in header
+    assert response.headers["timing-allow-origin"] == "*"
+
+
+def test_only_api_paths_are_timed():
+    response = _client().get("/other")
+    assert response.json()["timings"] is None
+    assert "server-timing" not in response.headers
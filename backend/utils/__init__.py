@@ -1,4 +1,12 @@
-from .preprocess_pdf import crop_right_rect
 from settings import settings
 
+
+def __getattr__(name):
+    # preprocess_pdf pulls in OpenCV; only the OCR code needs it
+    if name == "crop_right_rect":
+        from .preprocess_pdf import crop_right_rect
+        return crop_right_rect
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = ['crop_right_rect']
@@ -50,7 +50,7 @@ def split_into_chunks(text):
     return chunks, headers
 
 def split_wordboxes_chunks(line_boxes):
-    chunks_data = {'chunk_text': [], 'bboxes': [], 'pages': []}
+    chunks_data = {'chunk_text': [], 'bboxes': [], 'pages': [], 'line_boxes': []}
 
     current = []
     headers = []
@@ -58,6 +58,7 @@ def split_wordboxes_chunks(line_boxes):
     start_page = None
     
     bboxes = []
+    lines = []  # per-line {'text', 'bbox'} of the current chunk
 
     for i, line_box in enumerate(line_boxes):
         line_text = line_box['text'].strip()
@@ -77,8 +78,10 @@ def split_wordboxes_chunks(line_boxes):
                 chunks_data['chunk_text'].append(' '.join([wd['text'] for wd in current]))
                 chunks_data['bboxes'].append(merge_bboxes(bboxes))
                 chunks_data['pages'].append(start_page)
+                chunks_data['line_boxes'].append(lines)
                 headers.append(curr_header.strip())
                 bboxes = []
+                lines = []
 
             # Start new chunk
             if header_check == -1:
@@ -87,11 +90,13 @@ def split_wordboxes_chunks(line_boxes):
             else:
                 curr_header = line_text if header_check else ""
                 bboxes.append(bbox)
+                lines.append({'text': line_text, 'bbox': bbox})
                 current = [word_data]
                 start_page = page
         else:
         # Add to current chunk
             bboxes.append(bbox)
+            lines.append({'text': line_text, 'bbox': bbox})
             start_page = page
             current.append(word_data)
 
@@ -100,6 +105,7 @@ def split_wordboxes_chunks(line_boxes):
         chunks_data['chunk_text'].append(' '.join([wd['text'] for wd in current]))
         chunks_data['bboxes'].append(merge_bboxes(bboxes))
         chunks_data['pages'].append(start_page)
+        chunks_data['line_boxes'].append(lines)
         headers.append(curr_header.strip())
         
     return chunks_data, headers
@@ -0,0 +1,141 @@
+"""Resolve LLM evidence references back to stored chunks.
+
+The model cites chunks as strings like "chunk_3", "3" or plain integers.
+These helpers normalise them to integer chunk indices, keep only the
+ones that were actually part of the retrieved context, and turn them into
+page/bbox highlights from the metadata that was retrieved with them.
+
+When the per-line boxes of a chunk are known, a highlight is the set of its
+line rectangles instead of one merged box, optionally narrowed to the lines
+whose words appear in the answer.
+"""
+from __future__ import annotations
+import ast
+import re
+from typing import List, Optional
+
+_CHUNK_ID_PATTERN = re.compile(r'(\d+)\s*$')
+# words and numbers ("12.5", "1,250") as single tokens
+_TOKEN_PATTERN = re.compile(r'\w+(?:[.,]\w+)*')
+# a matching line must score at least this share of the best line's score
+_BEST_LINE_RATIO = 0.5
+
+
+def parse_chunk_id(raw) -> Optional[int]:
+    """Turn an evidence chunk id ("chunk_3", "3", 3) into an int, or None."""
+    if isinstance(raw, bool):
+        return None
+    if isinstance(raw, int):
+        return raw
+    match = _CHUNK_ID_PATTERN.search(str(raw))
+    return int(match.group(1)) if match else None
+
+
+def resolve_chunk_ids(evidence: dict, metadata: List[dict], doc_name: str = None) -> List[int]:
+    """Return de-duplicated chunk indices from evidence that exist in the retrieved metadata.
+
+    If metadata is empty the parsed ids are returned unfiltered.
+    """
+    raw_ids = (evidence or {}).get("chunk_id", []) or []
+    known = {
+        m.get("chunk_idx") for m in metadata
+        if doc_name is None or m.get("source") in (None, doc_name)
+    }
+    resolved = []
+    for raw in raw_ids:
+        cid = parse_chunk_id(raw)
+        if cid is None or cid in resolved:
+            continue
+        if metadata and cid not in known:
+            continue
+        resolved.append(cid)
+    return resolved
+
+
+def parse_bbox(raw):
+    """[x0, y0, x1, y1] as floats from a stored bbox (list or its string form); None if unusable."""
+    if isinstance(raw, str):
+        try:
+            raw = ast.literal_eval(raw)
+        except (ValueError, SyntaxError):
+            return None
+    if not isinstance(raw, (list, tuple)) or len(raw) < 4:
+        return None
+    return [float(v) for v in raw[:4]]
+
+
+def _tokens(text: str) -> set:
+    return set(_TOKEN_PATTERN.findall((text or "").lower()))
+
+
+def select_lines(line_boxes: List[dict], answer: Optional[str] = None, min_score: float = 1.0) -> List[dict]:
+    """Lines of a chunk that best match the answer text.
+
+    A line scores the tokens it shares with the answer, each weighted by
+    1 / (number of lines of the chunk containing it), doubled for numbers, so
+    values count more than units or labels repeated on every row. Lines
+    scoring at least min_score and close to the best line are kept. Without
+    an answer, or if no line qualifies, all lines are returned (the chunk was
+    cited as a whole).
+    """
+    answer_tokens = _tokens(answer) if answer else None
+    if not answer_tokens:
+        return list(line_boxes)
+    line_tokens = [_tokens(line.get("text")) for line in line_boxes]
+    df = {}
+    for tokens in line_tokens:
+        for t in tokens:
+            df[t] = df.get(t, 0) + 1
+    scores = [
+        sum((2.0 if any(ch.isdigit() for ch in t) else 1.0) / df[t] for t in tokens & answer_tokens)
+        for tokens in line_tokens
+    ]
+    cutoff = max(min_score, _BEST_LINE_RATIO * max(scores, default=0.0))
+    matched = [line for line, score in zip(line_boxes, scores) if score >= cutoff]
+    return matched or list(line_boxes)
+
+
+def line_geometry(bbox: List[float], line_boxes: Optional[List[dict]], answer: Optional[str] = None,
+                  min_score: float = 1.0):
+    """(bbox, rects) of a highlight: the chosen line rectangles and their enclosing box.
+
+    Falls back to the merged chunk bbox when no line boxes are stored.
+    """
+    rects = [parse_bbox(line.get("bbox")) for line in select_lines(line_boxes or [], answer, min_score)]
+    rects = [r for r in rects if r is not None and r[2] > r[0] and r[3] > r[1]]
+    if not rects:
+        return bbox, [bbox]
+    enclosing = [min(r[0] for r in rects), min(r[1] for r in rects), max(r[2] for r in rects), max(r[3] for r in rects)]
+    return enclosing, rects
+
+
+def highlights_from_metadata(chunk_ids: List[int], metadata: List[dict], doc_name: str = None,
+                             line_boxes: Optional[dict] = None, answer: Optional[str] = None,
+                             min_score: float = 1.0) -> List[dict]:
+    """Page and bbox of each chunk id, looked up in already retrieved metadata.
+
+    Same shape as the /highlight response entries: {chunk_id, page, bbox, header, rects}.
+    line_boxes maps chunk_idx -> [{'text', 'bbox'}] (from the chunk catalog);
+    with it, rects are the line rectangles, narrowed to the answer if given.
+    Chunks without a page or a valid bbox are skipped.
+    """
+    by_idx = {}
+    for m in metadata:
+        if doc_name is None or m.get("source") in (None, doc_name):
+            by_idx.setdefault(m.get("chunk_idx"), m)
+    highlights = []
+    for cid in chunk_ids:
+        m = by_idx.get(cid)
+        if m is None:
+            continue
+        bbox = parse_bbox(m.get("bbox"))
+        page = m.get("page")
+        if bbox is None or page is None:
+            continue
+        bbox, rects = line_geometry(bbox, (line_boxes or {}).get(cid), answer, min_score)
+        highlights.append({"chunk_id": cid, "page": int(page), "bbox": bbox, "header": m.get("header", ""),
+                           "rects": rects})
+    return highlights
+
+
+__all__ = ["parse_chunk_id", "parse_bbox", "resolve_chunk_ids", "select_lines", "line_geometry", "highlights_from_metadata"]
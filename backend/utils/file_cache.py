@@ -0,0 +1,163 @@
+"""Size-bounded on-disk cache for generated files (e.g. annotated PDFs).
+
+- Byte budget with LRU (default) or LFU eviction.
+- Writes go to a temporary file in the same directory and are published
+  with ``os.replace``, so concurrent readers never see a half-written file.
+- Counters for hits, misses, evictions and bytes.
+- ``invalidate_prefix`` drops all outputs derived from one source document.
+
+The index lives in memory and is rebuilt from the directory on start-up
+(file mtime stands in for the last access time).
+"""
+from __future__ import annotations
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+_TMP_PREFIX = ".tmp-"
+
+
+class FileCache:
+    def __init__(self, directory: str, max_bytes: int, policy: str = "lru"):
+        if policy not in ("lru", "lfu"):
+            raise ValueError(f"Unknown eviction policy '{policy}' (use 'lru' or 'lfu')")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self._entries = {}  # name -> {"size", "last_used", "uses"}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.invalidations = 0
+        self.bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith(_TMP_PREFIX):
+                # left over from an interrupted write
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if not os.path.isfile(path):
+                continue
+            st = os.stat(path)
+            self._entries[name] = {"size": st.st_size, "last_used": st.st_mtime, "uses": 0}
+            self.bytes += st.st_size
+        with self._lock:
+            self._evict()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def get(self, name: str) -> Optional[str]:
+        """Path of a cached file (marking it used), or None."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and not os.path.exists(self.path(name)):
+                # removed behind our back
+                self.bytes -= entry["size"]
+                del self._entries[name]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            entry["last_used"] = time.time()
+            entry["uses"] += 1
+            self.hits += 1
+            return self.path(name)
+
+    @contextmanager
+    def writing(self, name: str):
+        """Yield a temporary path to write ``name`` to; it is published atomically on success."""
+        fd, tmp_path = tempfile.mkstemp(prefix=_TMP_PREFIX, dir=self.directory)
+        os.close(fd)
+        try:
+            yield tmp_path
+            os.replace(tmp_path, self.path(name))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._add(name, os.path.getsize(self.path(name)))
+
+    def put_bytes(self, name: str, data: bytes) -> str:
+        with self.writing(name) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+        return self.path(name)
+
+    def _add(self, name: str, size: int):
+        with self._lock:
+            previous = self._entries.get(name)
+            if previous is not None:
+                self.bytes -= previous["size"]
+            self._entries[name] = {"size": size, "last_used": time.time(),
+                                   "uses": previous["uses"] if previous else 0}
+            self.bytes += size
+            self._evict(keep=name)
+
+    def _evict(self, keep: str = None):
+        """Remove entries until the byte budget holds (caller holds the lock)."""
+        if self.bytes <= self.max_bytes:
+            return
+        if self.policy == "lfu":
+            order = sorted(self._entries, key=lambda n: (self._entries[n]["uses"], self._entries[n]["last_used"]))
+        else:
+            order = sorted(self._entries, key=lambda n: self._entries[n]["last_used"])
+        for name in order:
+            if self.bytes <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            self.evicted_bytes += self._remove(name)
+            self.evictions += 1
+
+    def _remove(self, name: str) -> int:
+        entry = self._entries.pop(name)
+        self.bytes -= entry["size"]
+        try:
+            os.remove(self.path(name))
+        except FileNotFoundError:
+            pass
+        return entry["size"]
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        """Delete every cached file whose name starts with prefix. Returns number removed."""
+        with self._lock:
+            stale = [n for n in self._entries if n.startswith(prefix)]
+            for name in stale:
+                self._remove(name)
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "policy": self.policy,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+
+__all__ = ["FileCache"]
@@ -1,25 +1,33 @@
 """Reusable PDF highlight generation utilities.
 
 This module centralizes the logic for turning a list of chunk_ids
-into an annotated PDF with semi–transparent rectangle annotations.
+into highlight rectangles, either as lightweight per-page overlays for the
+viewer or as an annotated PDF copy (export).
 
-Public function:
+Public functions:
+    build_highlight_overlays(doc_name, chunk_ids, color=None, svg=False, answer=None) -> dict
     generate_highlight_pdf(doc_name: str, chunk_ids: List[int], color: Optional[List[float]] = None) -> dict
 
-Returns a dict with keys:
+build_highlight_overlays returns:
+    success, doc_name, chunk_ids, color, original_pdf_url, highlights,
+    pages (list of {page, width, height, rects[, svg]}) in PDF coordinates
+
+generate_highlight_pdf returns a dict with keys:
     success, doc_name, chunk_ids, annotated_pdf, annotated_pdf_path,
-    annotated_pdf_url (relative), highlights (list of {chunk_id,page,bbox,header}), cached (bool)
+    annotated_pdf_url (relative), highlights (list of {chunk_id,page,bbox,header,rects}),
+    page_map (original page of each output page), pdf_bytes (fresh renders only), cached (bool)
 """
 from __future__ import annotations
 import os
 import hashlib
-import ast
-from typing import List, Optional
-import pymupdf
-from core.vec_db import VecDB
+import threading
+from typing import List, Optional, Tuple
+from core.chunk_catalog import get_chunk_catalog
 from settings import settings  # fixed import (was from . import settings)
-
-import code
+from utils.file_cache import FileCache
+from utils.evidence import line_geometry, parse_bbox
+from utils.metrics import stage
+from utils.pdf_assets import content_hash, hashed_url
 
 # Storage directories (kept consistent with endpoint definitions)
 ORIGINAL_DIR = os.path.join("storage", "original_pdfs")
@@ -27,64 +35,215 @@ ANNOTATED_DIR = os.path.join("storage", "annotated_pdfs")
 os.makedirs(ORIGINAL_DIR, exist_ok=True)
 os.makedirs(ANNOTATED_DIR, exist_ok=True)
 
+_annotated_cache = None
+_annotated_cache_lock = threading.Lock()
+
+
+def get_annotated_cache() -> FileCache:
+    """Process-wide byte-bounded cache over ANNOTATED_DIR."""
+    global _annotated_cache
+    with _annotated_cache_lock:
+        if _annotated_cache is None:
+            _annotated_cache = FileCache(ANNOTATED_DIR, settings.annotated_cache_max_bytes,
+                                         settings.annotated_cache_policy)
+        return _annotated_cache
+
+
+def annotated_prefix(doc_name: str) -> str:
+    """File name prefix shared by all annotated copies of doc_name."""
+    return f"{doc_name}__annotated_"
+
 
 def _fetch_chunk_metadata(doc_name: str, chunk_ids: List[int]) -> List[dict]:
-    """Fetch metadata for given chunk indices using direct ID lookup."""
+    """Fetch metadata for given chunk indices.
+
+    Reads the chunk catalog (SQLite, no embedding model). Documents missing
+    there entirely (ingested before the catalog existed) are looked up in the
+    vector store once and copied into the catalog; ids missing from a
+    catalogued document are invalid and skipped.
+    """
     if not chunk_ids:
         return []
+    catalog = get_chunk_catalog(settings.catalog_path)
+    found = catalog.get_chunks(doc_name, chunk_ids)
+    missing = sorted(set(int(c) for c in chunk_ids) - {c["chunk_idx"] for c in found})
+    if not missing or catalog.has_document(doc_name):
+        return found
+
+    from core.vec_db import VecDB  # only for the fallback: loads the embedding model
     vec_db = VecDB(settings=settings) # Use centralized path from settings
-    
+
     # Construct the specific IDs to fetch
-    id_names = [f"{doc_name}_{cid}" for cid in chunk_ids]
-    
+    id_names = [f"{doc_name}_{cid}" for cid in missing]
+
     try:
         # Retrieve by specific IDs
-        results = vec_db.collection.get(ids=id_names, include=["metadatas"])
+        results = vec_db.collection.get(ids=id_names, include=["metadatas", "documents"])
     except Exception:
-        return []
-        
-    metadatas = results.get("metadatas", [])
-    
-    # Filter out any potential nulls if some IDs were not found
-    return [m for m in metadatas if m]
+        return found
+
+    backfill = []
+    for md, text in zip(results.get("metadatas") or [], results.get("documents") or []):
+        # Filter out any potential nulls if some IDs were not found
+        if not md:
+            continue
+        backfill.append({"chunk_idx": md.get("chunk_idx"), "page": md.get("page"), "header": md.get("header", ""),
+                         "text": text or "", "bbox": parse_bbox(md.get("bbox")), "line_boxes": []})
+    if backfill:
+        catalog.add_chunks(doc_name, backfill)
+    return sorted(found + [dict(c, source=doc_name) for c in backfill], key=lambda c: c["chunk_idx"])
 
 
-def _prepare_highlights(metadatas: List[dict]) -> List[dict]:
+def _prepare_highlights(metadatas: List[dict], answer: Optional[str] = None) -> List[dict]:
     highlights = []
     for md in metadatas:
         chunk_idx = md.get("chunk_idx")
         page = md.get("page")
-        raw_bbox = md.get("bbox", "[]")
-        invalid = False
-        if isinstance(raw_bbox, str):
-            try:
-                bbox = ast.literal_eval(raw_bbox)
-            except Exception:
-                bbox = []
-                invalid = True
-        else:
-            bbox = raw_bbox
+        bbox = parse_bbox(md.get("bbox"))
         if bbox is None:
-            invalid = True
-            bbox = []
-        if not bbox or len(bbox) < 4:
             # Tag invalid bbox so caller can debug (do not append highlight)
             md["_invalid_bbox"] = True
             continue
+        # per-line rectangles when the catalog has them, narrowed to the answer if given
+        bbox, rects = line_geometry(bbox, md.get("line_boxes"), answer, settings.highlight_line_min_score)
         highlights.append(
             {
                 "chunk_id": chunk_idx,
                 "page": page,
                 "bbox": bbox,
                 "header": md.get("header", ""),
+                "rects": rects,
             }
         )
 
     return highlights
 
 
+_page_sizes_cache = {}  # path -> (mtime_ns, [(width, height), ...])
+_page_sizes_lock = threading.Lock()
+
+
+def _page_sizes(path: str) -> List[Tuple[float, float]]:
+    """Page sizes in PDF points, read once per file version (no rendering)."""
+    mtime = os.stat(path).st_mtime_ns
+    with _page_sizes_lock:
+        cached = _page_sizes_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    import pymupdf
+    with pymupdf.open(path) as doc:
+        sizes = [(round(page.rect.width, 2), round(page.rect.height, 2)) for page in doc]
+    with _page_sizes_lock:
+        _page_sizes_cache[path] = (mtime, sizes)
+    return sizes
+
+
+def _overlay_svg(width: float, height: float, rects: List[dict], rgb) -> str:
+    """Small standalone SVG for one page; viewBox is the page in PDF points."""
+    fill = "rgb({},{},{})".format(*(int(round(c * 255)) for c in rgb))
+    shapes = "".join(
+        f'<rect x="{x0:.2f}" y="{y0:.2f}" width="{x1 - x0:.2f}" height="{y1 - y0:.2f}" data-chunk-id="{r["chunk_id"]}"/>'
+        for r in rects for x0, y0, x1, y1 in [r["bbox"][:4]]
+    )
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width:g} {height:g}" preserveAspectRatio="none">'
+        f'<g fill="{fill}" fill-opacity="0.25" stroke="{fill}" stroke-opacity="0.9">{shapes}</g></svg>'
+    )
+
+
+def build_highlight_overlays(
+    doc_name: str, chunk_ids: List[int], color: Optional[List[float]] = None, svg: bool = False,
+    answer: Optional[str] = None,
+) -> dict:
+    """Highlight rectangles grouped per page, for drawing over the original PDF.
+
+    Nothing is rendered or written: the original PDF stays a single cacheable
+    file and only a few rectangles (optionally as one SVG per page) travel.
+    There is one rectangle per highlighted line; pass the answer text to keep
+    only the lines that match it.
+    """
+    original_path = os.path.join(ORIGINAL_DIR, doc_name)
+    if not os.path.exists(original_path):
+        print(f"Original document not found: {original_path}")
+        return {"success": False, "error": "Original document not found"}
+
+    norm_ids = sorted(set(int(c) for c in chunk_ids))
+    if not norm_ids:
+        return {"success": False, "error": "No chunk IDs provided"}
+    rgb = tuple(color[:3]) if color and len(color) >= 3 else (1, 0.85, 0.2)
+
+    with stage("highlight_overlay"):
+        return _overlays(doc_name, original_path, norm_ids, rgb, svg, answer)
+
+
+def _overlays(doc_name: str, original_path: str, norm_ids: List[int], rgb, svg: bool, answer: Optional[str]) -> dict:
+    highlights = _prepare_highlights(_fetch_chunk_metadata(doc_name, norm_ids), answer)
+    if not highlights:
+        return {
+            "success": False,
+            "error": "No valid highlights found for the provided chunk_ids",
+            "chunk_ids": norm_ids,
+        }
+
+    sizes = _page_sizes(original_path)
+    pages = {}
+    for h in highlights:
+        page_idx = h["page"]
+        if page_idx is None or page_idx >= len(sizes):
+            continue
+        width, height = sizes[page_idx]
+        entry = pages.setdefault(page_idx, {"page": page_idx, "width": width, "height": height, "rects": []})
+        entry["rects"].extend({"chunk_id": h["chunk_id"], "bbox": list(r[:4]), "header": h["header"]} for r in h["rects"])
+    if svg:
+        for entry in pages.values():
+            entry["svg"] = _overlay_svg(entry["width"], entry["height"], entry["rects"], rgb)
+
+    return {
+        "success": True,
+        "doc_name": doc_name,
+        "chunk_ids": norm_ids,
+        "color": list(rgb),
+        "original_pdf_url": hashed_url("/pdfs/original", ORIGINAL_DIR, doc_name),
+        "highlights": highlights,
+        "pages": [pages[p] for p in sorted(pages)],
+        "page": highlights[0]["page"],
+        "bbox": highlights[0]["bbox"],
+    }
+
+
+def _evidence_pages(highlights: List[dict], page_count: int, neighbors: int) -> List[int]:
+    """Pages containing highlights plus ``neighbors`` pages on each side, in order."""
+    keep = set()
+    for h in highlights:
+        page_idx = h["page"]
+        if page_idx is None or page_idx >= page_count:
+            continue
+        keep.update(range(max(0, page_idx - neighbors), min(page_count, page_idx + neighbors + 1)))
+    return sorted(keep)
+
+
+def _render_annotated(original_path: str, highlights: List[dict], rgb, page_subset: Optional[List[int]] = None) -> bytes:
+    """Annotate the original in memory and return the (optionally page-subset) PDF bytes."""
+    import pymupdf
+    with pymupdf.open(original_path) as doc:
+        for h in highlights:
+            page_idx = h["page"]
+            if page_idx is None or page_idx >= len(doc):
+                continue
+            for x0, y0, x1, y1 in (r[:4] for r in h["rects"]):
+                annot = doc[page_idx].add_rect_annot(pymupdf.Rect(x0, y0, x1, y1))
+                annot.set_colors(stroke=rgb, fill=rgb)
+                annot.set_opacity(0.25)
+                annot.update()
+        if page_subset is not None:
+            doc.select(page_subset)
+        # garbage=3 drops objects of removed pages and merges duplicates; deflate compresses streams
+        return doc.tobytes(garbage=3, deflate=True)
+
+
 def generate_highlight_pdf(
-    doc_name: str, chunk_ids: List[int], color: Optional[List[float]] = None
+    doc_name: str, chunk_ids: List[int], color: Optional[List[float]] = None,
+    evidence_pages_only: bool = False, neighbor_pages: int = 1, answer: Optional[str] = None,
 ) -> dict:
     """Create (or reuse cached) highlighted PDF for given chunks.
 
@@ -92,9 +251,14 @@ def generate_highlight_pdf(
         doc_name: Exact document name used at ingestion (filename).
         chunk_ids: List of integer chunk indices.
         color: Optional RGB list values 0-1.
+        evidence_pages_only: Keep only pages with highlights (plus neighbors).
+        neighbor_pages: Pages kept on each side of an evidence page.
+        answer: Optional answer text; only the lines matching it are highlighted.
 
     Returns:
-        Dict with highlight metadata (see module docstring).
+        Dict with highlight metadata (see module docstring). ``page_map`` lists
+        the original page index of every page in the output; a freshly rendered
+        result also carries the PDF in ``pdf_bytes``.
     """
     original_path = os.path.join(ORIGINAL_DIR, doc_name)
     if not os.path.exists(original_path):
@@ -109,18 +273,24 @@ def generate_highlight_pdf(
     # Determine color early for cache key
     rgb = tuple(color[:3]) if color and len(color) >= 3 else (1, 0.85, 0.2)
 
-    # Build a cache key based on doc, chunk set, and color so different
-    # highlight requests produce distinct annotated files but can be reused
-    key = f"{doc_name}|{','.join(map(str, norm_ids))}|{','.join(map(lambda x: f'{x:.3f}', rgb))}"
+    # Build a cache key based on doc (and its content), chunk set, color and page subset so
+    # different highlight requests produce distinct annotated files but can be reused; the
+    # names are content-addressed, so the files can be served as immutable
+    key = f"{doc_name}|{content_hash(original_path)}|{','.join(map(str, norm_ids))}|{','.join(map(lambda x: f'{x:.3f}', rgb))}"
+    if evidence_pages_only:
+        key += f"|evidence+{neighbor_pages}"
+    if answer:
+        key += f"|answer:{settings.highlight_line_min_score}:{answer}"
     key_hash = hashlib.md5(key.encode("utf-8")).hexdigest()[:10]
 
-    annotated_name = f"{doc_name}__annotated_{key_hash}.pdf"
-    annotated_path = os.path.join(ANNOTATED_DIR, annotated_name)
+    annotated_name = f"{annotated_prefix(doc_name)}{key_hash}.pdf"
+    cache = get_annotated_cache()
+    annotated_path = cache.path(annotated_name)
 
-    needs_render = not os.path.exists(annotated_path)
+    needs_render = cache.get(annotated_name) is None
 
     metadatas = _fetch_chunk_metadata(doc_name, norm_ids)
-    highlights = _prepare_highlights(metadatas)
+    highlights = _prepare_highlights(metadatas, answer)
 
     if not highlights:
         return {
@@ -129,21 +299,18 @@ def generate_highlight_pdf(
             "chunk_ids": norm_ids,
         }
 
+    page_count = len(_page_sizes(original_path))
+    page_map = list(range(page_count))
+    if evidence_pages_only:
+        page_map = _evidence_pages(highlights, page_count, neighbor_pages) or page_map
+
+    pdf_bytes = None
     if needs_render:
         try:
-            doc = pymupdf.open(original_path)
-            for h in highlights:
-                page_idx = h["page"]
-                if page_idx is None or page_idx >= len(doc):
-                    continue
-                x0, y0, x1, y1 = h["bbox"][:4]
-                rect = pymupdf.Rect(x0, y0, x1, y1)
-                annot = doc[page_idx].add_rect_annot(rect)
-                annot.set_colors(stroke=rgb, fill=rgb)
-                annot.set_opacity(0.25)
-                annot.update()
-            doc.save(annotated_path)
-            doc.close()
+            subset = page_map if evidence_pages_only and len(page_map) < page_count else None
+            with stage("highlight_render"):
+                pdf_bytes = _render_annotated(original_path, highlights, rgb, subset)
+            cache.put_bytes(annotated_name, pdf_bytes)
         except Exception as e:
             return {"success": False, "error": f"Failed rendering PDF: {e}"}
 
@@ -156,9 +323,11 @@ def generate_highlight_pdf(
         "annotated_pdf_path": annotated_path,
         "annotated_pdf_url": rel_url,
         "highlights": highlights,
+        "page_map": page_map,
+        "pdf_bytes": pdf_bytes,
         "cached": not needs_render,
         "page": highlights[0]["page"] if highlights else None,
         "bbox": highlights[0]["bbox"] if highlights else None,
     }
 
-__all__ = ["generate_highlight_pdf"]
+__all__ = ["build_highlight_overlays", "generate_highlight_pdf", "get_annotated_cache", "annotated_prefix"]
@@ -0,0 +1,285 @@
+"""Counters, gauges and histograms rendered in the Prometheus text format.
+
+Recording is a dict lookup and an addition under a lock; nothing is formatted
+until ``GET /metrics`` is scraped. Numbers other components already keep
+(answer and annotated PDF caches, executor queues, job counts) are not
+duplicated: collectors read them at scrape time.
+
+Usage:
+    with stage("embedding"):
+        model.encode(...)
+    CHUNKS_EMBEDDED.inc(len(chunks))
+"""
+from __future__ import annotations
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from utils.timings import record_timing
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds; spans a cached lookup (ms) to OCR of a long scan (minutes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> Iterable[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, _labels(self.labelnames, key), value) for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._values.items()]
+        samples = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                samples.append((f"{self.name}_bucket", _labels(self.labelnames, key, f'le="{_number(bound)}"'),
+                                cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.labelnames, key), total))
+            samples.append((f"{self.name}_count", _labels(self.labelnames, key), count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[_Metric]]):
+        """collector() returns freshly filled metrics each scrape."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collector in collectors:
+            try:
+                metrics.extend(collector())
+            except Exception as e:
+                # a broken collector must not hide the other metrics
+                print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# Pipeline metrics
+STAGE_SECONDS = histogram(
+    "agentqi_stage_seconds",
+    "Time spent in a pipeline stage (upload, extraction, ocr_page, chunking, embedding, indexing, query_embedding, "
+    "retrieval, context_packing, prompt, evidence, highlight_overlay, highlight_render)", ["stage"])
+OCR_PAGES = counter("agentqi_ocr_pages_total", "Pages extracted, by method (text layer or Tesseract)", ["method"])
+OCR_DPI = gauge("agentqi_ocr_dpi", "Resolution of the last page rendered for Tesseract")
+CHUNKS_EMBEDDED = counter("agentqi_chunks_embedded_total", "Chunks embedded at ingestion")
+DOCUMENTS_INGESTED = counter("agentqi_documents_ingested_total", "Documents ingested")
+JOBS_REQUEUED = counter("agentqi_jobs_requeued_total", "Running jobs taken over from a worker that stopped heartbeating")
+LLM_SECONDS = histogram("agentqi_llm_request_seconds", "Ollama generation latency, end to end", ["mode"])
+LLM_TOKENS = counter("agentqi_llm_tokens_total", "Tokens reported by Ollama", ["type"])
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as pipeline stage name (also added to the current request's Server-Timing)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        record_timing(name, elapsed)
+
+
+def record_llm(mode: str, seconds: float, stats: dict):
+    """Latency and token counts of one finished generation (stats from OllamaExtractor._llm_stats)."""
+    LLM_SECONDS.observe(seconds, mode=mode)
+    record_timing("llm", seconds)
+    for kind in ("prompt", "completion"):
+        if stats.get(f"{kind}_tokens"):
+            LLM_TOKENS.inc(stats[f"{kind}_tokens"], type=kind)
+
+
+def _filled(metric: _Metric, samples: Iterable[Tuple[dict, float]]) -> _Metric:
+    for labels, value in samples:
+        if isinstance(metric, Gauge):
+            metric.set(value, **labels)
+        else:
+            metric.inc(value, **labels)
+    return metric
+
+
+def _app_state() -> List[_Metric]:
+    """Caches, executors and jobs, read when scraped (imported lazily: core modules import this one)."""
+    from core.answer_cache import get_answer_cache
+    from core.executors import executor_stats
+    from core.jobs import get_job_queue
+    from utils.highlighting import get_annotated_cache
+
+    answers = get_answer_cache()
+    annotated = get_annotated_cache().stats()
+    executors = executor_stats()
+    jobs = get_job_queue().store.counts()
+    return [
+        _filled(Counter("agentqi_cache_requests_total", "Cache lookups by result", ["cache", "result"]), [
+            ({"cache": "answer", "result": "hit"}, answers.hits),
+            ({"cache": "answer", "result": "semantic_hit"}, answers.semantic_hits),
+            ({"cache": "answer", "result": "miss"}, answers.misses),
+            ({"cache": "annotated_pdf", "result": "hit"}, annotated["hits"]),
+            ({"cache": "annotated_pdf", "result": "miss"}, annotated["misses"]),
+        ]),
+        _filled(Gauge("agentqi_cache_entries", "Entries held per cache", ["cache"]), [
+            ({"cache": "answer"}, len(answers)), ({"cache": "annotated_pdf"}, annotated["entries"])]),
+        _filled(Gauge("agentqi_annotated_cache_bytes", "Bytes of annotated PDFs on disk"), [({}, annotated["bytes"])]),
+        _filled(Counter("agentqi_annotated_cache_evictions_total", "Annotated PDFs evicted"),
+                [({}, annotated["evictions"])]),
+        _filled(Gauge("agentqi_executor_in_flight", "Tasks running or queued per executor", ["executor"]),
+                [({"executor": name}, s["in_flight"]) for name, s in executors.items()]),
+        _filled(Gauge("agentqi_executor_queued", "Tasks waiting for a worker per executor", ["executor"]),
+                [({"executor": name}, s["queued"]) for name, s in executors.items()]),
+        _filled(Counter("agentqi_executor_tasks_total", "Executor tasks by outcome", ["executor", "outcome"]),
+                [({"executor": name, "outcome": outcome}, s[outcome])
+                 for name, s in executors.items() for outcome in ("submitted", "completed", "rejected")]),
+        _filled(Gauge("agentqi_jobs", "Ingestion jobs by status", ["status"]),
+                [({"status": status}, n) for status, n in jobs.items()]),
+    ]
+
+
+REGISTRY.add_collector(_app_state)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+__all__ = ["Counter", "Gauge", "Histogram", "Registry", "REGISTRY", "counter", "gauge", "histogram", "stage",
+           "record_llm", "render", "CONTENT_TYPE", "STAGE_SECONDS", "OCR_PAGES", "OCR_DPI", "CHUNKS_EMBEDDED",
+           "DOCUMENTS_INGESTED", "LLM_SECONDS", "LLM_TOKENS"]
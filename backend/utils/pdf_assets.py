@@ -0,0 +1,136 @@
+"""Serving stored PDFs with HTTP caching.
+
+- Strong ETags from the file content (sha256), so a reload of the viewer costs
+  a 304 instead of a full download.
+- Content-hash URLs ``/pdfs/original/<hash>/<name>``: the hash pins the bytes,
+  so those responses are ``Cache-Control: immutable``. Plain ``<name>`` URLs
+  stay valid and are revalidated on every use (``no-cache``).
+- Byte ranges (``Accept-Ranges: bytes``) come from Starlette's FileResponse,
+  which PDF.js uses to load large documents progressively.
+- Optional precompressed ``<file>.gz`` siblings, served to clients that accept
+  gzip (never for range requests, whose offsets refer to the plain file).
+"""
+from __future__ import annotations
+import gzip
+import os
+import re
+import shutil
+import tempfile
+from typing import Optional
+from urllib.parse import quote
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from core.answer_cache import document_fingerprint
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+HASH_LENGTH = 16  # hex characters of the sha256 used in URLs
+
+_HASH_SEGMENT = re.compile(r"^[0-9a-f]{%d}$" % HASH_LENGTH)
+
+
+def content_hash(path: str) -> Optional[str]:
+    """Content hash of a stored file (cached per mtime/size), or None if missing."""
+    return document_fingerprint(path)
+
+
+def hashed_url(prefix: str, directory: str, name: str) -> str:
+    """Content-addressed URL of directory/name under prefix (plain URL if the file is missing)."""
+    digest = content_hash(os.path.join(directory, name))
+    if digest is None:
+        return f"{prefix}/{quote(name)}"
+    return f"{prefix}/{digest[:HASH_LENGTH]}/{quote(name)}"
+
+
+def precompress(path: str, min_saving: float = 0.1) -> Optional[str]:
+    """Write path + '.gz' if it is at least min_saving smaller than the file.
+
+    Most PDFs are already deflate-compressed, so small gains are not worth a
+    second copy; a stale or useless .gz is removed. Returns the .gz path or None.
+    """
+    gz_path = path + ".gz"
+    if os.path.exists(gz_path) and os.path.getmtime(gz_path) >= os.path.getmtime(path):
+        return gz_path
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", suffix=".gz", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=9, mtime=0) as gz, \
+                open(path, "rb") as src:
+            shutil.copyfileobj(src, gz, 1 << 20)
+        if os.path.getsize(tmp_path) > os.path.getsize(path) * (1 - min_saving):
+            os.remove(tmp_path)
+            if os.path.exists(gz_path):
+                os.remove(gz_path)
+            return None
+        os.replace(tmp_path, gz_path)
+        return gz_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class PDFStaticFiles(StaticFiles):
+    """StaticFiles with content ETags, content-hash URLs and optional .gz variants.
+
+    immutable=True marks every file as immutable (for directories whose file
+    names already encode their content, e.g. annotated copies).
+    """
+
+    def __init__(self, *args, immutable: bool = False, precompressed: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.immutable = immutable
+        self.precompressed = precompressed
+
+    @staticmethod
+    def _split_hash(path: str):
+        """('<hash>', '<name>') for content-hash paths, (None, path) otherwise."""
+        head, _, rest = path.replace(os.sep, "/").partition("/")
+        if rest and _HASH_SEGMENT.match(head):
+            return head, rest
+        return None, path
+
+    def lookup_path(self, path: str):
+        head, rest = self._split_hash(path)
+        if head:
+            full_path, stat_result = super().lookup_path(rest)
+            digest = content_hash(full_path) if stat_result is not None else None
+            if digest is None or not digest.startswith(head):
+                # the file changed since the URL was issued
+                return "", None
+            return full_path, stat_result
+        return super().lookup_path(path)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        hashed = self._split_hash(self.get_path(scope))[0] is not None
+        digest = content_hash(str(full_path))
+        headers = {"cache-control": IMMUTABLE if (self.immutable or hashed) else REVALIDATE}
+        if digest:
+            headers["etag"] = f'"{digest}"'
+
+        response = None
+        if self.precompressed:
+            headers["vary"] = "Accept-Encoding"
+            gz_path = f"{full_path}.gz"
+            if ("gzip" in request_headers.get("accept-encoding", "") and "range" not in request_headers
+                    and os.path.exists(gz_path) and os.path.getmtime(gz_path) >= stat_result.st_mtime):
+                if digest:
+                    headers["etag"] = f'"{digest}-gz"'
+                headers["content-encoding"] = "gzip"
+                response = FileResponse(gz_path, status_code=status_code, headers=headers,
+                                        media_type="application/pdf", stat_result=os.stat(gz_path))
+                # ranges refer to the uncompressed bytes
+                del response.headers["accept-ranges"]
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+__all__ = ["PDFStaticFiles", "hashed_url", "content_hash", "precompress", "IMMUTABLE", "REVALIDATE"]
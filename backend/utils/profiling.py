@@ -0,0 +1,241 @@
+"""On-demand profiling of the running server (admin endpoints ``/api/v1/admin/profile``).
+
+One capture at a time, stopped after ``seconds`` or after ``requests`` API
+requests, whichever comes first. Modes:
+
+- ``sample``:      a thread reads every thread's stack (``sys._current_frames``)
+                   every ``interval_ms``; written as collapsed stacks
+                   (``<id>.folded``: ``thread;outer;...;inner count``), which
+                   speedscope, flamegraph.pl and inferno read directly. Covers
+                   the event loop and the executor threads, not OCR processes.
+- ``cprofile``:    cProfile on the event loop thread (handlers, JSON, awaits);
+                   ``<id>.prof`` for snakeviz / ``python -m pstats`` and a
+                   ``<id>.txt`` summary sorted by cumulative time.
+- ``tracemalloc``: allocations made during the capture and still alive at the
+                   end, as collapsed stacks weighted by bytes (``<id>.folded``)
+                   plus the raw snapshot (``<id>.tracemalloc``).
+
+Nothing runs while no capture is active: ProfilingMiddleware only checks a
+module global per request.
+"""
+from __future__ import annotations
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+MODES = ("sample", "cprofile", "tracemalloc")
+
+_active: Optional["ProfileCapture"] = None
+_last: Optional["ProfileCapture"] = None
+_lock = threading.Lock()
+
+
+def _frame_label(code) -> str:
+    # ';' separates frames in the collapsed format
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+class _Sampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)).replace(";", ":"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+
+class ProfileCapture:
+    def __init__(self, mode: str, directory: str, seconds: Optional[float] = None,
+                 requests: Optional[int] = None, interval_ms: float = 5.0, frames: int = 25):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.mode = mode
+        self.directory = str(directory)
+        self.seconds = seconds
+        self.requests_left = requests
+        self.requests = 0
+        self.interval_ms = interval_ms
+        self.frames = frames
+        now = time.time()
+        self.id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}-{mode}"
+        self.started_at = None
+        self.stopped_at = None
+        self.stop_reason = None
+        self.files = []
+        self._sampler = None
+        self._profiler = None
+        self._owns_tracemalloc = False
+        self._timer = None
+
+    def start(self):
+        self.started_at = time.time()
+        if self.mode == "sample":
+            self._sampler = _Sampler(self.interval_ms / 1000)
+            self._sampler.start()
+        elif self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._owns_tracemalloc = not tracemalloc.is_tracing()
+            if self._owns_tracemalloc:
+                tracemalloc.start(self.frames)
+
+    def stop(self, reason: str):
+        self.stop_reason = reason
+        self.stopped_at = time.time()
+        if self._timer is not None:
+            self._timer.cancel()
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, self.id)
+        if self.mode == "sample":
+            self._sampler.stop()
+            self._write_folded(base + ".folded", self._sampler.stacks)
+        elif self.mode == "cprofile":
+            self._profiler.disable()
+            self._profiler.dump_stats(base + ".prof")
+            summary = io.StringIO()
+            pstats.Stats(self._profiler, stream=summary).sort_stats("cumulative").print_stats(60)
+            with open(base + ".txt", "w") as f:
+                f.write(summary.getvalue())
+            self.files += [base + ".prof", base + ".txt"]
+        else:
+            snapshot = tracemalloc.take_snapshot()
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+            snapshot.dump(base + ".tracemalloc")
+            self.files.append(base + ".tracemalloc")
+            stacks = Counter()
+            for stat in snapshot.statistics("traceback"):
+                # tracemalloc lists the innermost frame first
+                frames = [f"{os.path.basename(f.filename)}:{f.lineno}".replace(";", ":") for f in stat.traceback]
+                stacks[";".join(reversed(frames))] += stat.size
+            self._write_folded(base + ".folded", stacks)
+
+    def _write_folded(self, path: str, stacks: Counter):
+        with open(path, "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.files.append(path)
+
+    def request_done(self) -> bool:
+        """Count a finished request; True once the request budget is used up."""
+        self.requests += 1
+        if self.requests_left is None:
+            return False
+        self.requests_left -= 1
+        return self.requests_left <= 0
+
+    def status(self) -> dict:
+        end = self.stopped_at or time.time()
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "active": self.stopped_at is None,
+            "seconds": self.seconds,
+            "requests_left": self.requests_left,
+            "requests_seen": self.requests,
+            "elapsed_s": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "samples": self._sampler.samples if self._sampler else None,
+            "stop_reason": self.stop_reason,
+            "files": [os.path.basename(p) for p in self.files],
+        }
+
+
+def start_capture(mode: str, directory: str, seconds: Optional[float] = None, requests: Optional[int] = None,
+                  interval_ms: float = 5.0, frames: int = 25) -> ProfileCapture:
+    """Start a capture from the event loop (cProfile is bound to the thread that starts it).
+
+    Raises RuntimeError if one is already running.
+    """
+    global _active
+    capture = ProfileCapture(mode, directory, seconds, requests, interval_ms, frames)
+    with _lock:
+        if _active is not None:
+            raise RuntimeError(f"Capture {_active.id} is already running")
+        _active = capture
+    capture.start()
+    if seconds:
+        # stop on the event loop, the thread cProfile was enabled in
+        capture._timer = asyncio.get_running_loop().call_later(seconds, stop_capture, "time")
+    return capture
+
+
+def stop_capture(reason: str = "stopped") -> Optional[ProfileCapture]:
+    """Stop the active capture and write its files; None if nothing was running."""
+    global _active, _last
+    with _lock:
+        capture, _active = _active, None
+    if capture is None:
+        return None
+    capture.stop(reason)
+    _last = capture
+    print(f"Profile {capture.id} written: {capture.files}")
+    return capture
+
+
+def capture_status() -> Optional[dict]:
+    capture = _active or _last
+    return capture.status() if capture else None
+
+
+def list_profiles(directory: str) -> list:
+    if not os.path.isdir(directory):
+        return []
+    entries = [(name, os.stat(os.path.join(directory, name))) for name in os.listdir(directory)]
+    return [{"name": name, "bytes": st.st_size, "modified": st.st_mtime}
+            for name, st in sorted(entries, key=lambda e: e[1].st_mtime, reverse=True)]
+
+
+class ProfilingMiddleware:
+    """Counts finished API requests for captures limited to N requests."""
+
+    def __init__(self, app, path_prefix: str = "/api/", exclude_prefix: str = "/api/v1/admin/"):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.exclude_prefix = exclude_prefix
+
+    async def __call__(self, scope, receive, send):
+        if _active is None or scope["type"] != "http" or not scope["path"].startswith(self.path_prefix) \
+                or scope["path"].startswith(self.exclude_prefix):
+            await self.app(scope, receive, send)
+            return
+        capture = _active
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if capture is _active and capture.request_done():
+                stop_capture("requests")
+
+
+__all__ = ["MODES", "ProfileCapture", "ProfilingMiddleware", "start_capture", "stop_capture", "capture_status",
+           "list_profiles"]
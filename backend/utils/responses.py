@@ -0,0 +1,24 @@
+"""JSON responses encoded with orjson (a required dependency, see requirements.txt).
+
+orjson serializes the large dict/list payloads of this API (highlights,
+evidence, page text) several times faster than Starlette's stdlib encoder.
+The output is not identical to Starlette's:
+
+- NaN and +/-Infinity become null (Starlette raises ValueError).
+- numpy arrays and scalars, dates and datetimes are serialized natively
+  (Starlette raises TypeError).
+- Integers beyond 64 bits raise orjson.JSONEncodeError.
+"""
+from __future__ import annotations
+from typing import Any
+
+import orjson
+from starlette.responses import JSONResponse as _StdlibJSONResponse
+
+
+class JSONResponse(_StdlibJSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+__all__ = ["JSONResponse"]
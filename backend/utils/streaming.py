@@ -0,0 +1,92 @@
+"""Helpers for streaming LLM answers to the browser as server-sent events.
+
+Ollama streams the structured JSON answer a few characters at a time, e.g.
+``{"result": "The cert`` ... ``ified value is", "evidence": {...}}``.
+PartialJSONStringField pulls the decoded text of one top-level string field
+out of that growing buffer so the answer can be shown while it is generated.
+"""
+from __future__ import annotations
+import json
+import re
+from typing import Optional
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def sse_event(event: str, data) -> str:
+    """Format one server-sent event with a JSON payload."""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class PartialJSONStringField:
+    """Incrementally decode the value of a JSON string field from partial text.
+
+    feed() returns only the newly decoded characters, so callers can forward
+    deltas directly. Escape sequences split across feeds are held back until
+    complete, including a ``\\uD83D`` high surrogate waiting for its low half;
+    unpaired surrogates decode to U+FFFD.
+    """
+
+    def __init__(self, field: str = "result"):
+        self._key_pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(field))
+        self._buffer = ""
+        self._pos: Optional[int] = None  # index of next undecoded char inside the value
+        self.value = ""
+        self.complete = False
+
+    def feed(self, text: str) -> str:
+        self._buffer += text
+        if self.complete:
+            return ""
+        if self._pos is None:
+            match = self._key_pattern.search(self._buffer)
+            if not match:
+                return ""
+            self._pos = match.end()
+
+        out = []
+        buf = self._buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if ch == '"':
+                self.complete = True
+                i += 1
+                break
+            if ch != '\\':
+                out.append(ch)
+                i += 1
+                continue
+            # escape sequence; wait for more input if it is cut off
+            if i + 1 >= len(buf):
+                break
+            esc = buf[i + 1]
+            if esc == 'u':
+                if i + 6 > len(buf):
+                    break
+                code = int(buf[i + 2:i + 6], 16)
+                if 0xD800 <= code < 0xDC00:
+                    # high surrogate: combine with the \uDC00-\uDFFF escape that should follow
+                    low = buf[i + 6:i + 12]
+                    if len(low) < 6 and "\\u".startswith(low[:2]):
+                        break  # partner not here yet
+                    if low[:2] == "\\u" and 0xDC00 <= int(low[2:], 16) < 0xE000:
+                        out.append(chr(0x10000 + ((code - 0xD800) << 10) + (int(low[2:], 16) - 0xDC00)))
+                        i += 12
+                        continue
+                    code = 0xFFFD
+                elif 0xDC00 <= code < 0xE000:
+                    code = 0xFFFD  # lone low surrogate
+                out.append(chr(code))
+                i += 6
+            else:
+                out.append(_ESCAPES.get(esc, esc))
+                i += 2
+        self._pos = i
+        delta = ''.join(out)
+        self.value += delta
+        return delta
+
+
+__all__ = ["sse_event", "PartialJSONStringField"]
@@ -0,0 +1,90 @@
+"""Per-request stage timings for the Server-Timing header and the ``timings`` field.
+
+ServerTimingMiddleware starts a RequestTimings for every ``/api`` request and
+keeps it in a context variable. The pipeline's ``stage()`` blocks
+(utils/metrics.py) add to it from whatever thread runs them in the request's
+context: FastAPI's threadpool and the thread executors copy the context, and
+OCR pages from worker processes are covered by the ``extraction`` stage
+around them. Stages repeated within a request are summed.
+"""
+from __future__ import annotations
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from starlette.datastructures import MutableHeaders
+
+_current: ContextVar[Optional["RequestTimings"]] = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}  # name -> seconds, in first-seen order
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def as_dict(self) -> dict:
+        """Milliseconds per stage plus ``total`` (wall time of the request so far)."""
+        with self._lock:
+            timings = {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000, 1)
+        return timings
+
+    def header(self) -> str:
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.as_dict().items())
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def record_timing(name: str, seconds: float):
+    """Add to the current request's stage (no-op outside a request)."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+def timings_block() -> Optional[dict]:
+    """The ``timings`` JSON field for the current request."""
+    timings = _current.get()
+    return timings.as_dict() if timings is not None else None
+
+
+class ServerTimingMiddleware:
+    """Adds ``Server-Timing`` (and ``Timing-Allow-Origin`` for cross-origin devtools) to API responses.
+
+    The header goes out with the response start, so for streamed responses it
+    only covers the work done before the first byte.
+    """
+
+    def __init__(self, app, path_prefix: str = "/api/"):
+        self.app = app
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+
+        async def send_with_timings(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timings.header())
+                headers.append("Timing-Allow-Origin", "*")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timings)
+        finally:
+            _current.reset(token)
+
+
+__all__ = ["RequestTimings", "ServerTimingMiddleware", "current_timings", "record_timing", "timings_block"]